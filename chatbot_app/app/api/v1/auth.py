@@ -4,7 +4,7 @@ from jose import jwt
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from app.core.config import settings
-from app.db.session import get_db
+from app.db.session import get_read_db
 from app.db.models.user import User
 from app.services.security import verify_password
 
@@ -31,7 +31,7 @@ def create_access_token(subject: str) -> str:
 
 
 @router.post("/token", summary="Login and get JWT token")
-async def login(data: LoginRequest, db: Session = Depends(get_db)):
+async def login(data: LoginRequest, db: Session = Depends(get_read_db)):
     """
     Authenticate user from database and return JWT token.
     """
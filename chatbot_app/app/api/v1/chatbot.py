@@ -1,49 +1,151 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import asyncio
+from typing import Dict, Tuple
+from fastapi import APIRouter, Depends, Header, Query, HTTPException, Request, Response
+from langchain_core.runnables import RunnableConfig
 from sqlalchemy.orm import Session
-from jose import jwt, JWTError
+from app.api.v1.dependencies import require_admin, verify_token
 from app.core.config import settings
-from app.services.gemini_client import gemini_client
+from app.services.graph_builder import build_graph
+from app.services.degradation import LEVEL_NAMES, load_monitor
+from app.services.guardrails import guardrail_stats
+from app.services.context_cache import context_cache
+from app.services.model_router import pool_status
+from app.services.parallel_stage import stage_stats
+from app.utils.prompt_registry import prompt_registry
 from app.utils.langfuse_traces import langfuse_client
-from app.db.session import get_db
-from app.db.models.conversation import Conversation
+from app.db.session import ReadSessionLocal, get_db
+from app.services.usage import record_turn
+from app.services.task_queue import task_queue
+from app.services.deadline import (
+    ClientDisconnected,
+    DeadlineExceeded,
+    cancellation_stats,
+    deadline_config,
+    resolve_timeout,
+    run_until_disconnect,
+)
+from app.services.idempotency import (
+    IdempotencyConflict,
+    idempotency_store,
+    request_fingerprint,
+)
 
 router = APIRouter(prefix="/api/v1/chatbot", tags=["Chatbot"])
-security = HTTPBearer()
 
-
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
-    """
-    Verify JWT token from Authorization header.
-    """
-    token = credentials.credentials
-    try:
-        payload = jwt.decode(
-            token, settings.secret_key, algorithms=[settings.algorithm]
-        )
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return username
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+# Compile the LangGraph once per process and reuse it for every request
+chat_graph = build_graph()
 
 
 @router.post("/", summary="Chat endpoint (requires Bearer token)")
 async def chatbot(
+    request: Request,
+    response: Response,
     message: str = Query(..., description="User message for the chatbot"),
+    prompt: str | None = Query(
+        None, description="Prompt name (defaults to 'assistant')"
+    ),
+    prompt_version: str | None = Query(
+        None, description="Prompt version (defaults to the latest)"
+    ),
+    idempotency_key: str | None = Header(
+        None,
+        alias="Idempotency-Key",
+        description="Retries with the same key replay the first response",
+    ),
+    request_timeout: float | None = Header(
+        None,
+        alias="X-Request-Timeout",
+        description="Seconds the client will wait (capped by the server maximum)",
+    ),
     username: str = Depends(verify_token),
     db: Session = Depends(get_db),
 ):
     """
     Chatbot endpoint:
     - Requires Bearer token.
+    - Applies the selected prompt (persona, few-shot, output-length cap).
     - Records Langfuse spans/generations.
-    - Invokes Gemini model and returns response.
-    - Stores conversation in SQLite (message + response).
+    - Runs the LangGraph flow (routed to a model tier) and returns the response.
+    - Stores conversation in SQLite (message, response, usage) and updates rollups.
+    - With an Idempotency-Key, retries attach to the running request or replay
+      the stored response (no new generation, no duplicate conversation row).
+    - Cancels the graph and model call at the deadline (504) or when the client
+      disconnects (499); nothing is stored for cancelled turns. Keyed turns are
+      only bounded by the deadline, since retries may attach to them.
+    - Reports the degradation level applied to the turn in X-Degradation-Level.
+    """
+    try:
+        compiled = prompt_registry.get(prompt, prompt_version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+
+    try:
+        config = deadline_config(resolve_timeout(request_timeout))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Short-lived read session, closed before the model call so the turn does
+    # not hold a read-pool connection while it waits for the model
+    user_id = await asyncio.to_thread(_lookup_user_id, username)
+
+    # A keyed turn may be shared with retries that attach to it, so the first
+    # client leaving must not cancel it: only the deadline applies
+    watched = None if idempotency_key else request
+
+    async def run_turn() -> Tuple[dict, Dict[str, str]]:
+        return await _run_chat_turn(
+            message, compiled, username, user_id, db, watched, config
+        )
+
+    if not idempotency_key:
+        body, headers = await run_turn()
+        response.headers.update(headers)
+        return body
+
+    if len(idempotency_key) > settings.idempotency_max_key_length:
+        raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+    fingerprint = request_fingerprint(message, compiled.key)
+    try:
+        body, headers, replayed = await idempotency_store.run(
+            user_id,
+            idempotency_key,
+            fingerprint,
+            run_turn,
+            db,
+        )
+    except IdempotencyConflict:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used with different parameters",
+        )
+    response.headers.update(headers)
+    response.headers["Idempotency-Replayed"] = "true" if replayed else "false"
+    return body
+
+
+async def _run_chat_turn(
+    message: str,
+    compiled,
+    username: str,
+    user_id: int,
+    db: Session,
+    request: Request | None,
+    config: RunnableConfig,
+) -> Tuple[dict, Dict[str, str]]:
+    """
+    Run one graph turn (bounded by the deadline in `config`, cancelled if the
+    client of `request` leaves), persist it and build the response body.
+    Returns (body, headers); the headers describe the degradation level applied.
     """
     try:
         response_text = None
+        initial_state = {
+            "current_input": message,
+            "messages": [],
+            "user_id": user_id,
+            "prompt_name": compiled.name,
+            "prompt_version": compiled.version,
+        }
 
         if langfuse_client:
             with langfuse_client.start_as_current_observation(
@@ -56,38 +158,151 @@ async def chatbot(
                     model=settings.gemini_model,
                     metadata={"temperature": settings.llm_temperature},
                 ) as gen:
-                    response_text = gemini_client.invoke_model(message)
-                    gen.update(input=message, output=response_text)
-                span.update(output=response_text)
+                    try:
+                        result = await run_until_disconnect(
+                            request, chat_graph.ainvoke(initial_state, config), config
+                        )
+                    except (DeadlineExceeded, ClientDisconnected) as e:
+                        span.update(
+                            level="WARNING",
+                            status_message=f"Cancelled: {e}",
+                            metadata={"cancelled": type(e).__name__},
+                        )
+                        gen.update(level="WARNING", status_message=f"Cancelled: {e}")
+                        raise
+                    response_text = result.get("llm_response", "")
+                    routing = _routing_metadata(result)
+                    gen.update(
+                        input=message,
+                        output=response_text,
+                        model=routing["model"],
+                        metadata=routing,
+                    )
+                span.update(output=response_text, metadata=routing)
                 langfuse_client.update_current_trace(
-                    metadata={"endpoint": "/api/v1/chatbot"}
+                    metadata={"endpoint": "/api/v1/chatbot", **routing}
                 )
         else:
-            response_text = gemini_client.invoke_model(message)
+            result = await run_until_disconnect(
+                request, chat_graph.ainvoke(initial_state, config), config
+            )
+            response_text = result.get("llm_response", "")
 
-        # Persist conversation in SQLite
-        convo = Conversation(
-            user_id=_resolve_user_id(username, db),
-            message=message,
-            response=response_text,
-        )
-        db.add(convo)
-        db.commit()
-        db.refresh(convo)
+        level = _degradation_level(result)
+        headers = {
+            "X-Degradation-Level": str(level),
+            "X-Degradation-Mode": LEVEL_NAMES[level],
+        }
 
-        return {
+        # Persist conversation (with token usage/latency) and update the hourly
+        # rollup in a worker thread, off the event loop
+        stored = await asyncio.to_thread(record_turn, db, user_id, message, result)
+
+        body = {
             "user": username,
             "message": message,
             "response": response_text,
-            "conversation_id": convo.id,
+            "prompt": compiled.key,
+            "usage": {
+                "model": stored["model"],
+                "input_tokens": stored["input_tokens"],
+                "output_tokens": stored["output_tokens"],
+                "latency_ms": stored["latency_ms"],
+            },
+            "conversation_id": stored["conversation_id"],
         }
+        return body, headers
 
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
+    except ClientDisconnected:
+        # Nobody is listening; 499 is what access logs conventionally show
+        raise HTTPException(status_code=499, detail="Client closed request")
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error generating response: {str(e)}"
         )
 
 
+@router.get("/prompts", summary="List available prompts (requires Bearer token)")
+async def chatbot_prompts(username: str = Depends(verify_token)):
+    """
+    List registered prompts with their versions and generation profiles.
+    """
+    return prompt_registry.describe()
+
+
+@router.get(
+    "/guardrails", summary="Guardrail short-circuit counters (requires Bearer token)"
+)
+async def chatbot_guardrails(username: str = Depends(verify_token)):
+    """
+    Report how many turns were answered locally (upstream model calls saved).
+    """
+    return guardrail_stats.snapshot()
+
+
+@router.get("/pool", summary="Gemini API key pool state (admin only)")
+async def chatbot_pool(admin: str = Depends(require_admin)):
+    """
+    Expose per-key load, RPM/TPM usage and cooldowns for each model tier.
+    """
+    return pool_status()
+
+
+@router.get("/tasks", summary="Background task queue metrics (requires Bearer token)")
+async def chatbot_tasks(username: str = Depends(verify_token)):
+    """
+    Per task type: queue depth, running, succeeded/failed/retried counts, dead tasks.
+    """
+    return task_queue.snapshot()
+
+
+@router.get(
+    "/cancellations",
+    summary="Deadline/disconnect cancellations (requires Bearer token)",
+)
+async def chatbot_cancellations(username: str = Depends(verify_token)):
+    """
+    Turns by outcome (completed, deadline, disconnected, ...) with time spent and
+    the budget left when cancelled (time saved).
+    """
+    return cancellation_stats.snapshot()
+
+
+@router.get(
+    "/load", summary="Load signal and degradation level (requires Bearer token)"
+)
+async def chatbot_load(username: str = Depends(verify_token)):
+    """
+    Current degradation level and mode, load pressure, signals (in-flight calls,
+    p95 latency, 429 rate) and the number of level transitions.
+    """
+    return load_monitor.snapshot()
+
+
+@router.get(
+    "/stages", summary="Parallel graph stage branch metrics (requires Bearer token)"
+)
+async def chatbot_stages(username: str = Depends(verify_token)):
+    """
+    Per stage branch: completed, timed-out and failed runs with average time spent.
+    """
+    return stage_stats.snapshot()
+
+
+@router.get(
+    "/context-cache",
+    summary="Prompt prefix context cache state (requires Bearer token)",
+)
+async def chatbot_context_cache(username: str = Depends(verify_token)):
+    """
+    Backend, registered prefix handles per model and prompt, hits/misses and the
+    estimated input tokens not resent.
+    """
+    return context_cache.snapshot()
+
+
 def _resolve_user_id(username: str, db: Session) -> int:
     """
     Resolve a user's database ID given the username in the JWT.
@@ -95,7 +310,41 @@ def _resolve_user_id(username: str, db: Session) -> int:
     """
     from app.db.models.user import User
 
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
+    user_id = db.query(User.id).filter(User.username == username).scalar()
+    if user_id is None:
         raise HTTPException(status_code=404, detail="User not found for token subject")
-    return user.id
+    return user_id
+
+
+def _lookup_user_id(username: str) -> int:
+    """
+    `_resolve_user_id` with its own read session, closed right away (blocking:
+    run it in a worker thread).
+    """
+    db = ReadSessionLocal()
+    try:
+        return _resolve_user_id(username, db)
+    finally:
+        db.close()
+
+
+def _routing_metadata(result: dict) -> dict:
+    """
+    Extract the model routing decision from the graph result for tracing.
+    """
+    return {
+        "model_tier": result.get("model_tier"),
+        "model": result.get("model_name") or settings.gemini_model,
+        "route_reason": result.get("route_reason"),
+        "prompt": f"{result.get('prompt_name')}@{result.get('prompt_version')}",
+        "degradation_level": _degradation_level(result),
+    }
+
+
+def _degradation_level(result: dict) -> int:
+    """
+    Degradation level applied to the turn (turns ended by a guardrail never reach
+    the router, so they report the current level).
+    """
+    level = result.get("degradation_level")
+    return load_monitor.level if level is None else level
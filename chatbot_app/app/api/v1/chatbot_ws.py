@@ -0,0 +1,294 @@
+"""
+WebSocket chat channel: authenticate once per connection, keep the principal and
+conversation thread in memory, and stream model tokens back over the socket.
+The token's expiry still applies: once it passes, the next turn closes the
+connection (1008) and the client reconnects with a fresh token.
+
+Protocol (JSON frames):
+    client -> {"message": "...", "prompt": "assistant", "prompt_version": "1.0.1",
+               "timeout": 30}                                  (seconds, optional)
+    server -> {"type": "ready", "user": "..."}
+              {"type": "token", "text": "..."}               (zero or more per turn)
+              {"type": "done", "response": "...", "conversation_id": 1, ...}
+              {"type": "error", "detail": "..."}
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from langchain_core.messages import AIMessageChunk, HumanMessage
+from app.api.v1.chatbot import chat_graph, _lookup_user_id, _routing_metadata
+from app.api.v1.dependencies import decode_claims
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.services.deadline import (
+    DeadlineExceeded,
+    cancellation_stats,
+    deadline_config,
+    remaining,
+    resolve_timeout,
+)
+from app.services.graph_builder import LLM_NODE_NAMES
+from app.services.standard_logger import logger
+from app.services.usage import record_turn
+from app.utils.prompt_registry import prompt_registry
+
+router = APIRouter(prefix="/api/v1/chatbot", tags=["Chatbot"])
+
+# Bounds concurrent generations per worker; extra turns wait here, not in the model
+_turn_slots = asyncio.Semaphore(settings.ws_max_concurrent_turns)
+
+
+class ChatSession:
+    """
+    Per-connection state: authenticated principal and conversation history.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        username: str,
+        user_id: int,
+        expires_at: Optional[float] = None,
+    ) -> None:
+        self.websocket = websocket
+        self.username = username
+        self.user_id = user_id
+        self.expires_at = expires_at  # token `exp` (epoch seconds), if any
+        self.history: List[Any] = []
+        self.busy = False
+        self.inbox: asyncio.Queue = asyncio.Queue(
+            maxsize=settings.ws_max_pending_messages
+        )
+
+    async def send(self, payload: Dict[str, Any]) -> None:
+        # Awaiting the send applies backpressure: a slow reader slows its own stream
+        await self.websocket.send_json(payload)
+
+    @property
+    def token_expired(self) -> bool:
+        return self.expires_at is not None and time.time() >= self.expires_at
+
+    async def close_expired(self) -> None:
+        await self.websocket.close(
+            code=status.WS_1008_POLICY_VIOLATION, reason="Token expired"
+        )
+
+
+def _capped_history(result: Dict[str, Any], fallback: List[Any]) -> List[Any]:
+    """
+    Keep the prompt prefix and the last `ws_max_history_messages` conversation
+    messages, starting at a user turn, so the context does not grow without bound.
+    """
+    messages = result.get("messages")
+    if not messages:
+        return fallback
+    prefix_size = result.get("prefix_size", 0)
+    prefix, turns = messages[:prefix_size], messages[prefix_size:]
+    turns = turns[-settings.ws_max_history_messages :] if turns else turns
+    while turns and not isinstance(turns[0], HumanMessage):
+        turns = turns[1:]
+    return [*prefix, *turns]
+
+
+def _authenticate(websocket: WebSocket) -> tuple[str, int, Optional[float]]:
+    """
+    Resolve the principal once per connection (token from query or Authorization
+    header); returns (username, user id, token expiry).
+    """
+    token = websocket.query_params.get("token")
+    auth_header = websocket.headers.get("authorization", "")
+    if not token and auth_header.lower().startswith("bearer "):
+        token = auth_header[7:]
+    if not token:
+        raise HTTPException(status_code=401, detail="Missing token")
+
+    claims = decode_claims(token)
+    username = claims["sub"]
+    user_id = _lookup_user_id(username)
+    expires_at = claims.get("exp")
+    return username, user_id, None if expires_at is None else float(expires_at)
+
+
+def _persist_turn(user_id: int, message: str, result: Dict[str, Any]) -> int:
+    """
+    Store one turn (and its usage rollup) with a short-lived write session.
+    """
+    db = SessionLocal()
+    try:
+        return record_turn(db, user_id, message, result)["conversation_id"]
+    finally:
+        db.close()
+
+
+async def _run_turn(session: ChatSession, frame: Dict[str, Any]) -> None:
+    """
+    Run one chat turn through the graph, streaming tokens to the client.
+    """
+    message = str(frame.get("message") or "").strip()
+    if not message:
+        await session.send({"type": "error", "detail": "Empty message"})
+        return
+    try:
+        compiled = prompt_registry.get(frame.get("prompt"), frame.get("prompt_version"))
+    except KeyError as e:
+        await session.send({"type": "error", "detail": str(e.args[0])})
+        return
+
+    state = {
+        "messages": session.history,
+        "current_input": message,
+        "user_id": session.user_id,
+        "prompt_name": compiled.name,
+        "prompt_version": compiled.version,
+    }
+    try:
+        timeout = frame.get("timeout")
+        config = deadline_config(
+            resolve_timeout(None if timeout is None else float(timeout))
+        )
+    except (TypeError, ValueError):
+        await session.send({"type": "error", "detail": "Invalid timeout"})
+        return
+
+    result: Dict[str, Any] = state
+    started = time.time()
+
+    async def stream_tokens() -> None:
+        nonlocal result
+        async for mode, payload in chat_graph.astream(
+            state, config, stream_mode=["messages", "values"]
+        ):
+            if mode == "values":
+                result = payload
+                continue
+            chunk, metadata = payload
+            if (
+                isinstance(chunk, AIMessageChunk)
+                and metadata.get("langgraph_node") in LLM_NODE_NAMES
+                and chunk.text
+            ):
+                await session.send({"type": "token", "text": chunk.text})
+
+    async def generate() -> None:
+        # Waiting for a slot counts against the deadline too
+        async with _turn_slots:
+            await stream_tokens()
+
+    try:
+        await asyncio.wait_for(generate(), timeout=remaining(config))
+    except (DeadlineExceeded, asyncio.TimeoutError):
+        cancellation_stats.record("deadline", time.time() - started)
+        await session.send({"type": "error", "detail": "Request deadline exceeded"})
+        return
+    except asyncio.CancelledError:
+        # Connection closed mid-turn: the graph and model call stop here
+        cancellation_stats.record(
+            "disconnected", time.time() - started, remaining(config) or 0.0
+        )
+        raise
+    cancellation_stats.record("completed", time.time() - started)
+
+    response_text = result.get("llm_response") or ""
+    session.history = _capped_history(result, session.history)
+    conversation_id = await asyncio.to_thread(
+        _persist_turn, session.user_id, message, result
+    )
+    await session.send(
+        {
+            "type": "done",
+            "response": response_text,
+            "conversation_id": conversation_id,
+            **_routing_metadata(result),
+        }
+    )
+
+
+async def _turn_worker(session: ChatSession) -> None:
+    """
+    Process queued messages one at a time (turns of a conversation are ordered).
+    """
+    while True:
+        frame = await session.inbox.get()
+        if session.token_expired:
+            # Queued while the token was still valid; it expired before its turn
+            await session.close_expired()
+            return
+        session.busy = True
+        try:
+            await _run_turn(session, frame)
+        except (WebSocketDisconnect, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            logger.exception(f"WebSocket turn failed for {session.username}: {e}")
+            try:
+                await session.send(
+                    {"type": "error", "detail": "Error generating response"}
+                )
+            except Exception:
+                # The socket is gone; the receive loop notices and closes the session
+                return
+        finally:
+            session.busy = False
+
+
+@router.websocket("/ws")
+async def chatbot_ws(websocket: WebSocket):
+    """
+    WebSocket chat endpoint (token via `?token=` or Authorization header).
+    """
+    try:
+        username, user_id, expires_at = await asyncio.to_thread(
+            _authenticate, websocket
+        )
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+        return
+
+    await websocket.accept()
+    session = ChatSession(websocket, username, user_id, expires_at)
+    worker = asyncio.create_task(_turn_worker(session))
+    await session.send({"type": "ready", "user": username})
+    logger.info(f"WebSocket session opened for {username}.")
+
+    try:
+        while True:
+            if worker.done():
+                # The turn worker stopped (its socket failed); nothing would answer
+                break
+            try:
+                frame = await asyncio.wait_for(
+                    websocket.receive_json(), timeout=settings.ws_idle_timeout_seconds
+                )
+            except asyncio.TimeoutError:
+                # Only idle when nothing is queued or being generated
+                if worker.done() or session.busy or not session.inbox.empty():
+                    continue
+                await websocket.close(
+                    code=status.WS_1000_NORMAL_CLOSURE, reason="Idle timeout"
+                )
+                break
+            except ValueError:
+                await session.send({"type": "error", "detail": "Invalid JSON"})
+                continue
+            if session.token_expired:
+                await session.close_expired()
+                break
+            if not isinstance(frame, dict):
+                await session.send(
+                    {"type": "error", "detail": "Expected a JSON object"}
+                )
+                continue
+            try:
+                session.inbox.put_nowait(frame)
+            except asyncio.QueueFull:
+                # Backpressure: refuse instead of buffering without bound
+                await session.send(
+                    {"type": "error", "detail": "Too many pending messages"}
+                )
+    except WebSocketDisconnect:
+        pass
+    finally:
+        worker.cancel()
+        logger.info(f"WebSocket session closed for {username}.")
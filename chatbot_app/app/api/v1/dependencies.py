@@ -0,0 +1,49 @@
+from typing import Any, Dict
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from jose import jwt, JWTError
+from app.core.config import settings
+
+security = HTTPBearer()
+
+
+def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+    """
+    Verify JWT token from Authorization header.
+    """
+    return decode_token(credentials.credentials)
+
+
+def decode_token(token: str) -> str:
+    """
+    Decode a JWT and return its subject (username); raise 401 if invalid.
+    """
+    return decode_claims(token)["sub"]
+
+
+def decode_claims(token: str) -> Dict[str, Any]:
+    """
+    Decode a JWT and return its claims (with a subject); raise 401 if invalid
+    or expired.
+    """
+    try:
+        payload = jwt.decode(
+            token, settings.secret_key, algorithms=[settings.algorithm]
+        )
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get("sub") is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return payload
+
+
+def require_admin(username: str = Depends(verify_token)) -> str:
+    """
+    Allow only the users listed in ADMIN_USERNAMES (403 otherwise).
+    """
+    admins = {
+        name.strip() for name in settings.admin_usernames.split(",") if name.strip()
+    }
+    if username not in admins:
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    return username
@@ -0,0 +1,25 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from app.api.v1.chatbot import _resolve_user_id
+from app.api.v1.dependencies import verify_token
+from app.db.session import get_read_db
+from app.services.usage import usage_summary
+
+router = APIRouter(prefix="/api/v1/usage", tags=["Usage"])
+
+
+@router.get("/", summary="Token usage and latency rollups (requires Bearer token)")
+async def get_usage(
+    since: datetime | None = Query(None, description="Start of range (UTC, ISO 8601)"),
+    until: datetime | None = Query(None, description="End of range (UTC, ISO 8601)"),
+    model: str | None = Query(None, description="Filter by model name"),
+    username: str = Depends(verify_token),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Return hourly usage buckets (per model) and totals for the calling user.
+    Reads the incrementally maintained rollup table, not the conversations table.
+    """
+    user_id = _resolve_user_id(username, db)
+    return usage_summary(db, user_id, since=since, until=until, model=model)
@@ -1,13 +1,22 @@
 
-from fastapi import APIRouter, Depends, HTTPException
+import io
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError, OperationalError
 
+from app.api.v1.dependencies import require_admin
 from app.db.session import get_db
 from app.db.models.user import User
 from app.schemas.user import UserCreate, UserOut
 from app.services.security import hash_password
 from app.services.standard_logger import logger
+from app.services.user_provisioning import (
+    FORMATS,
+    detect_format,
+    provision_users,
+    read_rows,
+)
 
 router = APIRouter(prefix="/api/v1/users", tags=["Users"])
 
@@ -48,3 +57,40 @@ def register_user(payload: UserCreate, db: Session = Depends(get_db)):
         logger.exception(f"Unhandled error on register_user: {e}")
         db.rollback()
         raise HTTPException(status_code=500, detail="Unexpected error during registration")
+
+
+@router.post(
+    "/bulk-register", summary="Bulk-register users from CSV or JSONL (admin only)"
+)
+async def bulk_register_users(
+    request: Request,
+    format: str | None = Query(
+        None, description="'csv' or 'jsonl' (defaults to the Content-Type)"
+    ),
+    admin: str = Depends(require_admin),
+):
+    """
+    Register many users from the request body (CSV with a header row, or one JSON
+    object per line; fields: username, password, email):
+    - Check usernames with one query per chunk.
+    - Hash passwords in parallel.
+    - Insert each chunk with one multi-row INSERT in its own transaction.
+    - Return per-row results: created (with id), conflict or invalid.
+    """
+    fmt = format or detect_format(request.headers.get("content-type"))
+    if fmt not in FORMATS:
+        raise HTTPException(
+            status_code=400, detail="Specify format=csv or format=jsonl"
+        )
+    try:
+        body = (await request.body()).decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Body must be UTF-8 text")
+
+    logger.info(f"Bulk registration requested by {admin} ({fmt}).")
+    try:
+        rows = read_rows(io.StringIO(body, newline=""), fmt)
+        return await run_in_threadpool(provision_users, rows)
+    except OperationalError as oe:
+        logger.exception(f"OperationalError on bulk_register_users: {oe}")
+        raise HTTPException(status_code=500, detail="Database operation failed")
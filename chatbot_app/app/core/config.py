@@ -9,12 +9,71 @@ class Settings(BaseSettings):
     secret_key: str
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    admin_usernames: str = ""  # comma-separated users allowed on admin endpoints
+
+    # Bulk user provisioning (admin endpoint and CLI)
+    bulk_register_chunk_size: int = 500  # rows per uniqueness query and insert
+    bulk_register_hash_workers: int = 0  # password hashing threads (0 = CPU count)
 
     # Gemini config
     gemini_api_key: str
     gemini_model: str
     llm_temperature: float
 
+    # Local guardrails (answered without calling the model)
+    enable_guardrails: bool = True
+    guardrail_max_input_chars: int = 4000
+    guardrail_max_input_tokens: int = 1000  # estimated at ~4 characters per token
+
+    # Book catalog retrieval (index built offline with app.services.catalog_index)
+    enable_catalog_retrieval: bool = True  # no-op while the index does not exist
+    catalog_index_dir: str = ""  # defaults to app/data/catalog
+    catalog_top_k: int = 3
+    catalog_min_score: float = 0.15  # cosine similarity of the lexical hashing embedder
+    catalog_branch_timeout_seconds: float = 0.5  # skip retrieval if slower (0 = off)
+
+    # API key pool config (extra keys are comma-separated; each gets its own client)
+    gemini_extra_api_keys: str = ""
+    gemini_pool_strategy: str = "least_loaded"  # or "round_robin"
+    gemini_key_rpm_limit: int = 0  # requests per minute per key (0 = unlimited)
+    gemini_key_tpm_limit: int = 0  # tokens per minute per key (0 = unlimited)
+    gemini_key_cooldown_seconds: float = 30.0  # skip a key this long after a 429
+    gemini_transient_retries: int = 2  # retries of a 5xx / timeout / connection reset
+    gemini_retry_backoff_seconds: float = 0.5  # first retry delay, doubled per retry
+
+    # Model routing config (fast tier for simple turns, full tier for hard ones)
+    enable_model_routing: bool = True
+    gemini_fast_model: str = "gemini-2.5-flash"
+    gemini_fast_temperature: float = 0.7
+    gemini_fast_max_output_tokens: int = 512
+    routing_fast_max_chars: int = 280  # longer inputs go to the full tier
+    routing_fast_max_history: int = 6  # deeper conversations go to the full tier
+
+    # Provider context caching of the prompt prefix (persona + few-shot examples)
+    context_cache: str = "off"  # "off", "gemini" or "local" (offline stand-in)
+    context_cache_ttl_seconds: float = 3600.0
+    context_cache_refresh_margin_seconds: float = 60.0  # re-register before expiry
+    context_cache_min_tokens: int = 1024  # smaller prefixes are sent in full
+
+    # LLM record/replay cassette (offline load tests with recorded Gemini traffic)
+    llm_cassette_mode: str = "off"  # "off", "record" or "replay"
+    llm_cassette_path: str = "./cassettes/gemini.ndjson.gz"
+    llm_cassette_time_scale: float = 1.0  # replayed latency multiplier (0 = no delay)
+    llm_cassette_on_miss: str = "sample"  # unrecorded calls: "sample" or "error"
+
+    # Load-adaptive degradation (pressure 1.0 = a signal at its high watermark)
+    enable_degradation: bool = True
+    degrade_window_seconds: float = 30.0  # window for p95 latency and 429 rate
+    degrade_inflight_high: int = 16  # in-flight model calls
+    degrade_p95_high_ms: float = 15_000  # recent p95 model call latency
+    degrade_rate_limit_high: float = 0.2  # share of upstream calls answered with 429
+    degrade_min_samples: int = 5  # calls in the window before p95/429 rate count
+    degrade_watermarks: str = "1.0,1.5,2.0,3.0"  # pressure entering levels 1..4
+    degrade_recover_ratio: float = 0.7  # leave a level below its watermark * ratio
+    degrade_hold_seconds: float = 30.0  # minimum time in a level before stepping down
+    degrade_max_output_tokens: int = 256  # output cap from the reduced_output level
+    degrade_answer_cache_size: int = 512  # recent answers served at the static level
+
     # Logging config
     log_console_level: str
     silence_warnings: bool
@@ -32,10 +91,63 @@ class Settings(BaseSettings):
     langfuse_debug: bool
     langfuse_sample_rate: float
 
+    # WebSocket chat config
+    ws_idle_timeout_seconds: float = 300.0  # close connections idle for this long
+    ws_max_pending_messages: int = 4  # queued messages per connection before rejecting
+    ws_max_concurrent_turns: int = 32  # concurrent generations per worker
+    ws_max_history_messages: int = 20  # messages kept after the prompt prefix
+
+    # Request deadlines (clients may lower them with the X-Request-Timeout header)
+    chat_request_timeout_seconds: float = 60.0
+    chat_request_timeout_max_seconds: float = 120.0
+    disconnect_poll_interval_seconds: float = 0.5  # client liveness check interval
+
+    # Idempotency-Key replay store (memory LRU + SQLite)
+    idempotency_ttl_seconds: float = 86_400  # how long a completed response is replayed
+    idempotency_max_entries: int = 10_000  # in-memory entries per worker
+    idempotency_max_key_length: int = 255
+
+    # Background task queue (deferred work, run inside the app process)
+    background_tasks_enabled: bool = True
+    background_poll_interval_seconds: float = 1.0  # durable-table poll when idle
+    background_task_concurrency: int = 2  # default per task type
+    background_task_max_attempts: int = 5
+    background_retry_base_seconds: float = 2.0  # doubled per attempt, with jitter
+    background_retry_max_seconds: float = 300.0
+    background_task_lease_seconds: float = 300.0  # crashed worker's task retried after
+    background_drain_seconds: float = 5.0  # grace period for running tasks on shutdown
+
     # SQLite database config
     database_url: str = "sqlite:///./chatbot.db"
     sqlite_check_same_thread: bool = False  # allow cross-thread usage in FastAPI
 
+    # SQLite tuning profile (applied on every connection) and connection pools
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 268_435_456  # bytes
+    sqlite_cache_size: int = -64_000  # negative = KiB
+    sqlite_read_pool_size: int = 5  # query-only connections (writes use their own pool)
+
+    # Conversation retention (archive, delete, incremental vacuum)
+    retention_days: int = 0  # 0 = keep conversations forever
+    retention_user_days: str = ""  # per-user overrides, e.g. "alice=30,bob=7"
+    retention_archive_dir: str = "./archive"
+    retention_archive_format: str = "ndjson"  # "ndjson" (gzip) or "parquet" (pyarrow)
+    retention_chunk_size: int = 500  # rows archived and deleted per write transaction
+    retention_batch_pause_ms: int = 50  # pause between chunks for live writers
+    retention_vacuum_pages: int = 1000  # pages freed per incremental_vacuum step
+    retention_interval_hours: float = 0  # 0 = no scheduled runs (use the CLI)
+
+    # Compressed conversation text (message/response columns, SQLite only)
+    text_compression: str = "zstd"  # "zstd" (zlib without zstandard), "zlib", "none"
+    text_compression_level: int = 3
+    text_compression_min_bytes: int = 256  # shorter values stay plain TEXT
+    text_compression_dict_dir: str = "./zstd_dicts"  # trained dictionaries (<id>.zdict)
+    text_compression_dict_id: int = 0  # dictionary used for new values; 0 = none
+    text_compression_dict_size: int = 16_384  # bytes, when training a dictionary
+    text_compression_batch_size: int = 500  # rows rewritten per migration transaction
+
     class Config:
         env_file = ".env"
 
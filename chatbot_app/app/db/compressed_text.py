@@ -0,0 +1,174 @@
+"""
+Transparent compression for large text columns (conversation message/response).
+
+Values shorter than `text_compression_min_bytes` are stored as plain TEXT; longer ones
+as a BLOB tagged with its codec:
+    b"Z" + zstd frame (optionally built with a trained dictionary; its id is in the frame)
+    b"z" + zlib stream
+Reads accept all three, so rows written before compression stay valid and can be
+rewritten in place by the migration in `app.services.text_compression`.
+"""
+
+from __future__ import annotations
+import threading
+import zlib
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Dict, Optional, Union
+from sqlalchemy import String
+from sqlalchemy.types import TypeDecorator
+from app.core.config import settings
+from app.services.standard_logger import logger
+
+zstandard: Optional[ModuleType]
+try:
+    import zstandard
+except ImportError:  # zlib fallback
+    zstandard = None
+
+ZSTD_TAG = b"Z"
+ZLIB_TAG = b"z"
+DICT_SUFFIX = ".zdict"
+
+
+def dictionary_path(dict_dir: Union[str, Path], dict_id: int) -> Path:
+    return Path(dict_dir) / f"{dict_id}{DICT_SUFFIX}"
+
+
+class TextCodec:
+    """
+    Encode/decode column values. zstd (de)compressors are not thread-safe and
+    expensive to build with a dictionary, so each thread keeps its own.
+    """
+
+    def __init__(
+        self,
+        codec: str,
+        level: int,
+        min_bytes: int,
+        dict_dir: str,
+        dict_id: int = 0,
+    ) -> None:
+        if codec == "zstd" and zstandard is None:
+            logger.warning("zstandard not installed; compressing text with zlib.")
+            codec = "zlib"
+        if codec not in ("zstd", "zlib", "none"):
+            raise ValueError(f"Unknown text compression codec: {codec!r}")
+        self.codec = codec
+        self.level = level
+        self.min_bytes = min_bytes
+        self.dict_dir = Path(dict_dir)
+        self.dict_id = dict_id
+        self._dicts: Optional[Dict[int, Any]] = None
+        self._dicts_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _dictionaries(self) -> Dict[int, Any]:
+        """
+        All dictionaries in `dict_dir`, by id (old ones are kept to read old rows).
+        """
+        if self._dicts is None:
+            with self._dicts_lock:
+                if self._dicts is None:
+                    dicts = {}
+                    if zstandard is not None and self.dict_dir.is_dir():
+                        for path in self.dict_dir.glob(f"*{DICT_SUFFIX}"):
+                            d = zstandard.ZstdCompressionDict(path.read_bytes())
+                            dicts[d.dict_id()] = d
+                    self._dicts = dicts
+        return self._dicts
+
+    def reload_dictionaries(self) -> None:
+        self._dicts = None
+        self._local = threading.local()
+
+    def _compressor(self):
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            dict_data = None
+            if self.dict_id:
+                dict_data = self._dictionaries().get(self.dict_id)
+                if dict_data is None:
+                    raise ValueError(
+                        f"zstd dictionary {self.dict_id} not found in {self.dict_dir}"
+                    )
+            compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dict_data)
+            self._local.compressor = compressor
+        return compressor
+
+    def _decompressor(self, frame: bytes):
+        # Decompressor for the dictionary the zstd frame was written with
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed text")
+        dict_id = zstandard.get_frame_parameters(frame).dict_id
+        cache = getattr(self._local, "decompressors", None)
+        if cache is None:
+            cache = self._local.decompressors = {}
+        decompressor = cache.get(dict_id)
+        if decompressor is None:
+            dict_data = None
+            if dict_id:
+                dict_data = self._dictionaries().get(dict_id)
+                if dict_data is None:
+                    raise ValueError(
+                        f"zstd dictionary {dict_id} not found in {self.dict_dir}"
+                    )
+            decompressor = cache[dict_id] = zstandard.ZstdDecompressor(
+                dict_data=dict_data
+            )
+        return decompressor
+
+    def encode(self, text: str) -> Union[str, bytes]:
+        """
+        Stored form of `text`: the text itself if small (or compression is off or
+        does not pay), else a tagged compressed BLOB.
+        """
+        raw = text.encode("utf-8")
+        if self.codec == "none" or len(raw) < self.min_bytes:
+            return text
+        if self.codec == "zstd":
+            packed = ZSTD_TAG + self._compressor().compress(raw)
+        else:
+            packed = ZLIB_TAG + zlib.compress(raw, min(self.level, 9))
+        return packed if len(packed) < len(raw) else text
+
+    def decode(self, value: Union[str, bytes]) -> str:
+        if isinstance(value, str):
+            return value
+        tag, body = value[:1], value[1:]
+        if tag == ZSTD_TAG:
+            return self._decompressor(body).decompress(body).decode("utf-8")
+        if tag == ZLIB_TAG:
+            return zlib.decompress(body).decode("utf-8")
+        # Untagged BLOB: text written as bytes by another client
+        return value.decode("utf-8")
+
+
+text_codec = TextCodec(
+    settings.text_compression,
+    settings.text_compression_level,
+    settings.text_compression_min_bytes,
+    settings.text_compression_dict_dir,
+    settings.text_compression_dict_id,
+)
+
+
+class CompressedText(TypeDecorator):
+    """
+    String column compressed with `text_codec` on SQLite (SQLite keeps the value's
+    own type, so TEXT and BLOB rows coexist in the same column). Other databases
+    store plain text.
+    """
+
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name != "sqlite":
+            return value
+        return text_codec.encode(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return value
+        return text_codec.decode(value)
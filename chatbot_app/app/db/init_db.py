@@ -1,13 +1,41 @@
+from sqlalchemy import inspect, text
 from app.db.session import Base, engine
 from app.services.standard_logger import logger
 
+
 def init_db():
     """
     Create all tables from ORM models on startup.
     """
     try:
         Base.metadata.create_all(bind=engine)
+        add_missing_columns()
         logger.info("SQLite tables created or already exist.")
     except Exception as e:
         logger.error(f"Error creating SQLite tables: {e}")
         raise
+
+
+def add_missing_columns():
+    """
+    Add nullable columns that exist on the ORM models but not in the database yet.
+    `create_all` only creates missing tables, so new columns on existing tables
+    (e.g. conversation usage fields) are added here with ALTER TABLE.
+    """
+    # Reuse one connection: the SQLite write engine has a single-connection pool
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(
+                    text(
+                        f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {col_type}'
+                    )
+                )
+                logger.info(f"Added column {table.name}.{column.name} ({col_type}).")
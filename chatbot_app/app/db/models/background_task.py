@@ -0,0 +1,32 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import Integer, String, Text, DateTime, Index, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.session import Base
+
+
+class BackgroundTask(Base):
+    """
+    Durable deferred work: a row per pending/running task, deleted once it succeeds
+    (tasks that exhaust their retries stay with status "dead" for inspection).
+    """
+
+    __tablename__ = "background_tasks"
+    __table_args__ = (
+        Index("ix_background_tasks_ready", "task_type", "status", "run_at"),
+    )
+
+    # Typed columns, so queries and loaded values type-check
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    task_type: Mapped[str] = mapped_column(String(100), nullable=False)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)  # JSON
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # UTC; not claimed before this
+    run_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    # Lease of a running task
+    locked_until: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.now(), nullable=False
+    )
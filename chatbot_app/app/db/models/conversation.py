@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, func
+from sqlalchemy.orm import deferred
+from app.db.compressed_text import CompressedText
 from app.db.session import Base
 
 class Conversation(Base):
@@ -6,6 +8,15 @@ class Conversation(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
-    message = Column(String, nullable=False)
-    response = Column(String, nullable=False)
+    # Compressed when large and loaded (and decompressed) only on first access;
+    # use `undefer_group("text")` when a query needs them for every row
+    message = deferred(Column(CompressedText, nullable=False), group="text")
+    response = deferred(Column(CompressedText, nullable=False), group="text")
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    # Per-turn usage accounting (nullable so rows written before these columns stay valid)
+    model = Column(String(100), nullable=True)
+    input_tokens = Column(Integer, nullable=True)
+    output_tokens = Column(Integer, nullable=True)
+    latency_ms = Column(Integer, nullable=True)
+    cache_hit = Column(Boolean, default=False, nullable=True)
@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import (
+    Integer,
+    String,
+    Text,
+    DateTime,
+    ForeignKey,
+    UniqueConstraint,
+    func,
+)
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.session import Base
+
+
+class IdempotencyRecord(Base):
+    """
+    Stored response of a completed request, replayed for retries with the same
+    (user, Idempotency-Key) until it expires.
+    """
+
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_key"),
+    )
+
+    # Typed columns, so queries and loaded values type-check
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    user_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    key: Mapped[str] = mapped_column(String(255), nullable=False)
+    # sha256 of the request parameters
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=False)
+    response_body: Mapped[str] = mapped_column(Text, nullable=False)  # JSON
+    # JSON; response headers replayed with the body (degradation level/mode)
+    response_headers: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.now(), nullable=False
+    )
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
+from app.db.session import Base
+
+
+class UsageRollup(Base):
+    """
+    Usage aggregated per user, model and hour; updated incrementally on each turn.
+    """
+
+    __tablename__ = "usage_rollups"
+    __table_args__ = (
+        UniqueConstraint(
+            "user_id", "model", "bucket_start", name="uq_usage_rollups_bucket"
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    model = Column(String(100), nullable=False)
+    bucket_start = Column(
+        DateTime, nullable=False, index=True
+    )  # UTC, truncated to the hour
+    turns = Column(Integer, nullable=False, default=0)
+    input_tokens = Column(Integer, nullable=False, default=0)
+    output_tokens = Column(Integer, nullable=False, default=0)
+    latency_ms_total = Column(Integer, nullable=False, default=0)
+    cache_hits = Column(Integer, nullable=False, default=0)
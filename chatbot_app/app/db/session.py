@@ -1,24 +1,100 @@
-from sqlalchemy import create_engine
+from dataclasses import replace
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.core.config import settings
+from app.db.sqlite_tuning import SQLiteProfile, apply_pragmas
 
-# Create SQLAlchemy engine
-connect_args = {"check_same_thread": settings.sqlite_check_same_thread} if settings.database_url.startswith("sqlite") else {}
-engine = create_engine(settings.database_url, connect_args=connect_args, echo=False)
+is_sqlite = settings.database_url.startswith("sqlite")
+# In-memory databases use SQLAlchemy's per-thread pool, which takes no size
+is_memory_sqlite = is_sqlite and (
+    ":memory:" in settings.database_url or settings.database_url == "sqlite://"
+)
 
-# Session factory
+# SQLite tuning profile from settings; the read pool additionally rejects writes
+sqlite_profile = SQLiteProfile(
+    journal_mode=settings.sqlite_journal_mode,
+    synchronous=settings.sqlite_synchronous,
+    busy_timeout_ms=settings.sqlite_busy_timeout_ms,
+    mmap_size=settings.sqlite_mmap_size,
+    cache_size=settings.sqlite_cache_size,
+)
+sqlite_read_profile = replace(sqlite_profile, query_only=True)
+
+
+def _create_engine(profile: SQLiteProfile, pool_size: int | None = None):
+    """
+    Create an engine; for SQLite, apply the tuning profile on each new connection.
+    `pool_size` caps the pool (no overflow); None keeps SQLAlchemy's default pool.
+    """
+    if not is_sqlite:
+        return create_engine(settings.database_url, echo=False)
+
+    pool_args = (
+        {}
+        if is_memory_sqlite or pool_size is None
+        else {
+            "pool_size": pool_size,
+            "max_overflow": 0,
+            "pool_timeout": max(settings.sqlite_busy_timeout_ms / 1000, 1),
+        }
+    )
+    new_engine = create_engine(
+        settings.database_url,
+        connect_args={"check_same_thread": settings.sqlite_check_same_thread},
+        echo=False,
+        **pool_args,
+    )
+
+    @event.listens_for(new_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, profile)
+
+    return new_engine
+
+
+# Write engine: a regular pool; concurrent writers wait on the SQLite write lock
+# for up to SQLITE_BUSY_TIMEOUT_MS (busy_timeout) instead of failing on a pool
+# checkout. The lock is only taken at the first INSERT/UPDATE/DELETE and released
+# on commit, so keep write transactions short: do slow work (model calls,
+# hashing) before the first write and commit right after it.
+# Read engine: a separate query-only pool (WAL lets reads run concurrently with
+# the writer). Other databases share one engine.
+engine = _create_engine(sqlite_profile)
+read_engine = (
+    _create_engine(sqlite_read_profile, pool_size=settings.sqlite_read_pool_size)
+    if is_sqlite and not is_memory_sqlite
+    else engine
+)
+
+# Session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 # Declarative base for ORM models
 Base = declarative_base()
 
+
 def get_db():
     """
     Provide a database session per request.
     Close when request is finished.
+    With SQLite, writes hold the database write lock until commit: issue them only
+    once the slow part of the request is done (see the write engine above).
     """
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    """
+    Provide a read-only database session (read pool) per request.
+    Close when request is finished.
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
@@ -5,6 +6,9 @@ from app.routes import api_router
 from app.services.standard_logger import logger
 from fastapi.openapi.utils import get_openapi
 from app.db.init_db import init_db
+from app.core.config import settings
+from app.services.retention import retention_scheduler
+from app.services.task_queue import task_queue
 
 app = FastAPI(
     title="LangGraph Gemini Chatbot API",
@@ -29,6 +33,36 @@ def on_startup():
     init_db()
 
 
+@app.on_event("startup")
+async def start_task_queue():
+    """
+    - Start the background task dispatcher (durable tasks left by a previous run resume).
+    """
+    if settings.background_tasks_enabled:
+        await task_queue.start()
+
+
+@app.on_event("shutdown")
+async def stop_task_queue():
+    await task_queue.stop()
+
+
+@app.on_event("startup")
+async def start_retention_scheduler():
+    """
+    - Run the retention pipeline periodically when an interval is configured.
+    """
+    if settings.retention_interval_hours > 0:
+        app.state.retention_task = asyncio.create_task(retention_scheduler())
+
+
+@app.on_event("shutdown")
+async def stop_retention_scheduler():
+    task = getattr(app.state, "retention_task", None)
+    if task:
+        task.cancel()
+
+
 @app.get("/")
 def root():
     return {"message": "Chatbot API is running. Use chatbot endpoint."}
@@ -1,9 +1,13 @@
 from fastapi import APIRouter
 from app.api.v1.auth import router as auth_router
 from app.api.v1.chatbot import router as chatbot_router
+from app.api.v1.chatbot_ws import router as chatbot_ws_router
 from app.api.v1.users import router as users_router
+from app.api.v1.usage import router as usage_router
 
 api_router = APIRouter()
 api_router.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 api_router.include_router(users_router)
 api_router.include_router(chatbot_router)
+api_router.include_router(chatbot_ws_router)
+api_router.include_router(usage_router)
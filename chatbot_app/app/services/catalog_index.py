@@ -0,0 +1,296 @@
+"""
+Book catalog retrieval backed by a memory-mapped float32 embedding matrix.
+
+On-disk layout (one directory):
+    catalog.json         header: embedder, dim, row count (authoritative)
+    catalog.f32          row-major float32 matrix, one L2-normalized row per book
+    catalog.meta.jsonl   one JSON object per row (title, author, synopsis)
+
+The matrix is opened with `numpy.memmap` (read-only), so loading takes
+milliseconds and every uvicorn worker shares the same OS page cache pages.
+Appends write new rows first and bump the header count last, so readers never
+see a partially written row; the next append first cuts both data files back to
+the header count, dropping whatever an interrupted append left behind.
+
+CLI (offline indexer), from chatbot_app/:
+    python -m app.services.catalog_index build books.jsonl
+    python -m app.services.catalog_index append more_books.csv
+"""
+
+from __future__ import annotations
+import argparse
+import csv
+import json
+import re
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.services.state import ChatbotState
+from app.services.standard_logger import logger
+
+HEADER_FILE = "catalog.json"
+MATRIX_FILE = "catalog.f32"
+META_FILE = "catalog.meta.jsonl"
+DEFAULT_INDEX_DIR = Path(__file__).parent.parent / "data" / "catalog"
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+class HashingEmbedder:
+    """
+    Local embedder: signed feature hashing of words and word bigrams.
+    No model or network call, so indexing and queries cost microseconds.
+    """
+
+    name = "hashing-v1"
+
+    def __init__(self, dim: int = 512) -> None:
+        self.dim = dim
+
+    def embed(self, texts: Iterable[str]) -> np.ndarray:
+        texts = list(texts)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = _TOKEN_RE.findall(text.lower())
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                h = zlib.crc32(feature.encode("utf-8"))
+                matrix[row, h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+def _book_text(book: Dict[str, Any]) -> str:
+    return (
+        f"{book.get('title', '')} {book.get('author', '')} {book.get('synopsis', '')}"
+    )
+
+
+def read_books(path: str) -> List[Dict[str, str]]:
+    """
+    Read books from JSONL or CSV (columns: title, author, synopsis).
+    """
+    file_path = Path(path)
+    with open(file_path, "r", encoding="utf-8") as f:
+        if file_path.suffix.lower() == ".csv":
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    books = [
+        {k: str(row.get(k) or "").strip() for k in ("title", "author", "synopsis")}
+        for row in rows
+    ]
+    return [b for b in books if b["title"]]
+
+
+def _read_header(index_dir: Path) -> Optional[Dict[str, Any]]:
+    header_path = index_dir / HEADER_FILE
+    if not header_path.exists():
+        return None
+    with open(header_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_header(index_dir: Path, header: Dict[str, Any]) -> None:
+    # Write-then-rename so readers see either the old or the new header
+    tmp = index_dir / f"{HEADER_FILE}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(header, f)
+    tmp.replace(index_dir / HEADER_FILE)
+
+
+def _truncate_lines(path: Path, count: int) -> None:
+    # Cut a JSONL file back to its first `count` lines
+    with open(path, "a+b") as f:
+        f.seek(0)
+        size = 0
+        for _ in range(count):
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                raise ValueError(
+                    f"{path.name} has fewer rows than the header; rebuild it."
+                )
+            size += len(line)
+        f.truncate(size)
+
+
+def append_books(
+    index_dir: Path, books: List[Dict[str, str]], embedder: HashingEmbedder
+) -> int:
+    """
+    Append books to the index (creating it if needed). Returns the new row count.
+    """
+    index_dir.mkdir(parents=True, exist_ok=True)
+    header = _read_header(index_dir) or {
+        "embedder": embedder.name,
+        "dim": embedder.dim,
+        "count": 0,
+    }
+    if header["embedder"] != embedder.name or header["dim"] != embedder.dim:
+        raise ValueError("Index was built with a different embedder; rebuild it.")
+
+    count = header["count"]
+    # Drop any partial tail left by an interrupted append before writing new rows
+    with open(index_dir / MATRIX_FILE, "ab") as f:
+        f.truncate(count * embedder.dim * 4)
+        embedder.embed(_book_text(b) for b in books).astype(np.float32).tofile(f)
+    _truncate_lines(index_dir / META_FILE, count)
+    with open(index_dir / META_FILE, "a", encoding="utf-8") as f:
+        for book in books:
+            f.write(json.dumps(book, ensure_ascii=False) + "\n")
+
+    header["count"] = count + len(books)
+    _write_header(index_dir, header)
+    return header["count"]
+
+
+def build_index(
+    index_dir: Path, books: List[Dict[str, str]], embedder: HashingEmbedder
+) -> int:
+    """
+    Build a fresh index, replacing any existing files.
+    """
+    for name in (HEADER_FILE, MATRIX_FILE, META_FILE):
+        (index_dir / name).unlink(missing_ok=True)
+    return append_books(index_dir, books, embedder)
+
+
+class CatalogIndex:
+    """
+    Read side of the index: memory-mapped matrix plus metadata, reloaded when
+    the header changes (e.g. after an incremental append).
+    """
+
+    def __init__(self, index_dir: Path) -> None:
+        self.index_dir = Path(index_dir)
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        # (embedder, matrix, meta), replaced as one object so searches never mix
+        # the rows of one load with the metadata of another
+        self.loaded: Optional[
+            Tuple[HashingEmbedder, np.ndarray, List[Dict[str, str]]]
+        ] = None
+
+    def _refresh(self) -> bool:
+        header_path = self.index_dir / HEADER_FILE
+        try:
+            mtime = header_path.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return self.loaded is not None
+        with self._lock:
+            header = _read_header(self.index_dir)
+            if not header or not header["count"]:
+                return False
+            count, dim = header["count"], header["dim"]
+            # Only map the rows the header vouches for (ignores any partial tail)
+            matrix = np.memmap(
+                self.index_dir / MATRIX_FILE,
+                dtype=np.float32,
+                mode="r",
+                shape=(count, dim),
+            )
+            with open(self.index_dir / META_FILE, "r", encoding="utf-8") as f:
+                meta = [json.loads(line) for _, line in zip(range(count), f)]
+            self.loaded = (HashingEmbedder(dim), matrix, meta)
+            self._mtime = mtime
+            logger.info(f"Catalog index loaded: {count} books, dim={dim}.")
+        return True
+
+    def search(
+        self, query: str, top_k: int = 3, min_score: float = 0.0
+    ) -> List[Dict[str, Any]]:
+        """
+        Vectorized cosine top-k over the whole matrix.
+        """
+        if not self._refresh() or self.loaded is None:
+            return []
+        embedder, matrix, meta = self.loaded
+        q = embedder.embed([query])[0]
+        scores = matrix @ q
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {**meta[i], "score": round(float(scores[i]), 4)}
+            for i in top
+            if scores[i] >= min_score
+        ]
+
+
+def _index_dir() -> Path:
+    return (
+        Path(settings.catalog_index_dir)
+        if settings.catalog_index_dir
+        else DEFAULT_INDEX_DIR
+    )
+
+
+catalog_index = CatalogIndex(_index_dir())
+
+
+def format_snippets(books: List[Dict[str, Any]], max_chars: int = 160) -> str:
+    """
+    Compact catalog context injected next to the user's message.
+    """
+    lines = []
+    for book in books:
+        synopsis = book.get("synopsis", "")
+        if len(synopsis) > max_chars:
+            synopsis = synopsis[: max_chars - 1].rstrip() + "…"
+        lines.append(
+            f"- {book['title']} ({book.get('author') or 'unknown'}): {synopsis}"
+        )
+    return "Catalog matches (prefer these when relevant):\n" + "\n".join(lines)
+
+
+def retrieval_node(state: ChatbotState) -> ChatbotState:
+    """
+    LangGraph node: find the closest catalog books and store a compact snippet
+    block in the state; the LLM node appends it to the current message.
+    """
+    if not settings.enable_catalog_retrieval:
+        return {"catalog_context": None}
+    query = state.get("current_input", "") or ""
+    try:
+        books = catalog_index.search(
+            query, top_k=settings.catalog_top_k, min_score=settings.catalog_min_score
+        )
+    except Exception as e:
+        logger.warning(f"Catalog retrieval failed; continuing without it. Detail: {e}")
+        books = []
+    if not books:
+        return {"catalog_context": None}
+    logger.info(f"Node: Retrieved {len(books)} catalog book(s).")
+    return {"catalog_context": format_snippets(books)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Build or extend the book catalog index."
+    )
+    parser.add_argument("command", choices=("build", "append"))
+    parser.add_argument("source", help="JSONL or CSV with title, author, synopsis")
+    parser.add_argument("--index-dir", default=str(_index_dir()))
+    parser.add_argument("--dim", type=int, default=512)
+    args = parser.parse_args()
+
+    books = read_books(args.source)
+    embedder = HashingEmbedder(args.dim)
+    index_dir = Path(args.index_dir)
+    if args.command == "build":
+        count = build_index(index_dir, books, embedder)
+    else:
+        count = append_books(index_dir, books, embedder)
+    print(
+        f"{args.command}: {len(books)} book(s) written; index now has {count} rows at {index_dir}"
+    )
+
+
+if __name__ == "__main__":
+    main()
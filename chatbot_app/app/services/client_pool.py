@@ -0,0 +1,321 @@
+"""
+Pool of LangChain chat models, one per Gemini API key, with quota-aware selection.
+Tracks per-key RPM/TPM usage and cools down keys that hit upstream 429s.
+"""
+
+from __future__ import annotations
+import asyncio
+import inspect
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Tuple
+from app.services.standard_logger import logger
+
+STRATEGIES = ("least_loaded", "round_robin")
+WINDOW_SECONDS = 60.0
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    """
+    Return True when an exception looks like an upstream 429 / quota error.
+    """
+    text = f"{type(exc).__name__} {exc}"
+    return "429" in text or "ResourceExhausted" in text or "RESOURCE_EXHAUSTED" in text
+
+
+# google-genai 5xx statuses and httpx transport errors, matched by name like 429s
+TRANSIENT_MARKERS = (
+    "ServerError",
+    "INTERNAL",
+    "UNAVAILABLE",
+    "DEADLINE_EXCEEDED",
+    "Bad Gateway",
+    "Timeout",
+    "ConnectError",
+    "ReadError",
+    "RemoteProtocolError",
+    "Connection reset",
+)
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """
+    Return True for upstream errors worth retrying: 5xx, timeouts, dropped connections.
+    """
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    text = f"{type(exc).__name__} {exc}"
+    return any(marker in text for marker in TRANSIENT_MARKERS)
+
+
+def mask_key(api_key: str) -> str:
+    """
+    Return a log-safe identifier for an API key (never log the full secret).
+    """
+    return f"...{api_key[-4:]}" if len(api_key) > 4 else "..."
+
+
+class KeySlot:
+    """
+    One API key with its reusable client and rolling usage counters.
+    """
+
+    def __init__(self, api_key: str, llm: Any) -> None:
+        self.key_id = mask_key(api_key)
+        self.llm = llm
+        self.in_flight = 0
+        self.total_calls = 0
+        self.total_tokens = 0
+        self.rate_limited = 0
+        self.cooldown_until = 0.0
+        # (timestamp, tokens) per completed call inside the rolling window
+        self._window: Deque[Tuple[float, int]] = deque()
+
+    def _trim(self, now: float) -> None:
+        while self._window and now - self._window[0][0] > WINDOW_SECONDS:
+            self._window.popleft()
+
+    def usage(self, now: float) -> Tuple[int, int]:
+        """
+        Return (requests, tokens) used in the last minute.
+        """
+        self._trim(now)
+        # In-flight calls count against RPM even though their tokens are unknown yet
+        return len(self._window) + self.in_flight, sum(t for _, t in self._window)
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        rpm, tpm = self.usage(now)
+        return {
+            "key": self.key_id,
+            "in_flight": self.in_flight,
+            "rpm": rpm,
+            "tpm": tpm,
+            "total_calls": self.total_calls,
+            "total_tokens": self.total_tokens,
+            "rate_limited": self.rate_limited,
+            "cooling_down_s": round(max(self.cooldown_until - now, 0.0), 1),
+        }
+
+
+# Per-call rewrite of (messages, kwargs) for the key slot chosen by the pool
+PrepareCall = Callable[["KeySlot", Any, Dict[str, Any]], Any]
+
+
+class ClientPool:
+    """
+    Spread calls over several API keys using least-loaded or round-robin selection.
+
+    Args:
+        api_keys: Keys to build one client per key for.
+        factory: Callable that builds a chat model for a given key.
+        strategy: "least_loaded" or "round_robin".
+        rpm_limit / tpm_limit: Per-key budgets per minute (0 = unlimited).
+        cooldown_seconds: How long a key is skipped after a 429.
+        transient_retries: Retries of a call failing with a 5xx / timeout / reset.
+        retry_backoff_seconds: First retry delay (doubled on each further retry).
+        on_rate_limited: Optional callback notified of every upstream 429.
+    """
+
+    def __init__(
+        self,
+        api_keys: List[str],
+        factory: Callable[[str], Any],
+        strategy: str = "least_loaded",
+        rpm_limit: int = 0,
+        tpm_limit: int = 0,
+        cooldown_seconds: float = 30.0,
+        transient_retries: int = 2,
+        retry_backoff_seconds: float = 0.5,
+        on_rate_limited: Callable[[KeySlot], None] | None = None,
+    ) -> None:
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown pool strategy: {strategy}")
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._rr = itertools.count()
+        self.strategy = strategy
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.cooldown_seconds = cooldown_seconds
+        self.transient_retries = max(transient_retries, 0)
+        self.retry_backoff_seconds = max(retry_backoff_seconds, 0.0)
+        self.on_rate_limited = on_rate_limited
+        self.slots: List[KeySlot] = []
+        for key in dict.fromkeys(k for k in api_keys if k):  # dedupe, keep order
+            self.add_key(key)
+        if not self.slots:
+            raise ValueError("ClientPool needs at least one API key.")
+
+    def add_key(self, api_key: str) -> KeySlot:
+        """
+        Add a key at runtime; throughput scales with the number of keys.
+        """
+        slot = KeySlot(api_key, self._factory(api_key))
+        with self._lock:
+            self.slots.append(slot)
+        logger.info(f"Client pool: added key {slot.key_id} ({len(self.slots)} total).")
+        return slot
+
+    def _has_budget(self, slot: KeySlot, now: float) -> bool:
+        if slot.cooldown_until > now:
+            return False
+        rpm, tpm = slot.usage(now)
+        if self.rpm_limit and rpm >= self.rpm_limit:
+            return False
+        if self.tpm_limit and tpm >= self.tpm_limit:
+            return False
+        return True
+
+    def _select(self, exclude: set) -> KeySlot:
+        now = time.monotonic()
+        candidates = [s for s in self.slots if id(s) not in exclude] or self.slots
+        ready = [s for s in candidates if self._has_budget(s, now)]
+        if not ready:
+            # Every key is cooling down or over budget: degrade to the one that frees up first
+            logger.warning(
+                "Client pool: all keys busy or over budget; using best effort."
+            )
+            return min(candidates, key=lambda s: (s.cooldown_until, s.in_flight))
+        if self.strategy == "round_robin":
+            return ready[next(self._rr) % len(ready)]
+        return min(ready, key=lambda s: (s.in_flight, s.usage(now)[0]))
+
+    @contextmanager
+    def lease(self, exclude: set | None = None) -> Iterator[KeySlot]:
+        """
+        Reserve a slot for one call; release it (and its in-flight count) afterwards.
+        """
+        with self._lock:
+            slot = self._select(exclude or set())
+            slot.in_flight += 1
+        try:
+            yield slot
+        finally:
+            with self._lock:
+                slot.in_flight -= 1
+
+    def record_success(self, slot: KeySlot, tokens: int) -> None:
+        with self._lock:
+            slot.total_calls += 1
+            slot.total_tokens += tokens
+            slot._window.append((time.monotonic(), tokens))
+
+    def record_rate_limited(self, slot: KeySlot) -> None:
+        with self._lock:
+            slot.rate_limited += 1
+            slot.cooldown_until = time.monotonic() + self.cooldown_seconds
+            slot._window.append((time.monotonic(), 0))
+        logger.warning(
+            f"Client pool: key {slot.key_id} rate limited; cooling down {self.cooldown_seconds}s."
+        )
+        if self.on_rate_limited is not None:
+            self.on_rate_limited(slot)
+
+    def _fail_over(self, slot: KeySlot, tried: set) -> bool:
+        """
+        Cool down a rate-limited key; return False once every key has been tried.
+        """
+        self.record_rate_limited(slot)
+        tried.add(id(slot))
+        return len(tried) < len(self.slots)
+
+    def _can_retry(self, slot: KeySlot, exc: Exception, retries: int) -> bool:
+        if retries >= self.transient_retries or not is_transient_error(exc):
+            return False
+        logger.warning(
+            f"Client pool: transient error on key {slot.key_id} "
+            f"({type(exc).__name__}); retry {retries + 1}/{self.transient_retries}."
+        )
+        return True
+
+    def _backoff(self, retries: int) -> float:
+        return self.retry_backoff_seconds * 2**retries
+
+    def _succeeded(self, slot: KeySlot, response: Any) -> Any:
+        usage = getattr(response, "usage_metadata", None) or {}
+        self.record_success(slot, int(usage.get("total_tokens", 0) or 0))
+        return response
+
+    def invoke(
+        self, messages: Any, prepare: PrepareCall | None = None, **kwargs: Any
+    ) -> Any:
+        """
+        Invoke the chat model on a selected key, failing over to other keys on 429
+        and retrying transient errors (5xx, timeouts, resets) with backoff.
+        `prepare(slot, messages, kwargs)` may rewrite the call for the chosen key.
+        """
+        tried: set = set()
+        retries = 0
+        while True:
+            with self.lease(tried) as slot:
+                try:
+                    call_messages, call_kwargs = messages, kwargs
+                    if prepare is not None:
+                        call_messages, call_kwargs = prepare(slot, messages, kwargs)
+                    response = slot.llm.invoke(call_messages, **call_kwargs)
+                except Exception as e:
+                    if is_rate_limit_error(e):
+                        if not self._fail_over(slot, tried):
+                            raise
+                        continue
+                    if not self._can_retry(slot, e, retries):
+                        raise
+                else:
+                    return self._succeeded(slot, response)
+            # Transient error: back off outside the lease, then try again
+            time.sleep(self._backoff(retries))
+            retries += 1
+
+    async def ainvoke(
+        self, messages: Any, prepare: PrepareCall | None = None, **kwargs: Any
+    ) -> Any:
+        """
+        Async `invoke` (same selection, failover and retries); cancelling the caller
+        cancels the in-flight HTTP call. `prepare` may be a coroutine function.
+        """
+        tried: set = set()
+        retries = 0
+        while True:
+            with self.lease(tried) as slot:
+                try:
+                    call_messages, call_kwargs = messages, kwargs
+                    if prepare is not None:
+                        prepared = prepare(slot, messages, kwargs)
+                        if inspect.isawaitable(prepared):
+                            prepared = await prepared
+                        call_messages, call_kwargs = prepared
+                    response = await slot.llm.ainvoke(call_messages, **call_kwargs)
+                except Exception as e:
+                    if is_rate_limit_error(e):
+                        if not self._fail_over(slot, tried):
+                            raise
+                        continue
+                    if not self._can_retry(slot, e, retries):
+                        raise
+                else:
+                    return self._succeeded(slot, response)
+            await asyncio.sleep(self._backoff(retries))
+            retries += 1
+
+    def next_llm(self) -> Any:
+        """
+        Return the client the pool would pick next (for callers needing a raw model).
+        """
+        with self._lock:
+            return self._select(set()).llm
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Expose pool state for monitoring.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "strategy": self.strategy,
+                "rpm_limit": self.rpm_limit,
+                "tpm_limit": self.tpm_limit,
+                "keys": [s.snapshot(now) for s in self.slots],
+            }
@@ -0,0 +1,349 @@
+"""
+Provider context caching of the static prompt prefix (persona + few-shot examples).
+
+The prefix of each prompt version is registered once per API key and model, and
+its handle is reused until the prompt content changes or the TTL runs out; calls
+then send only the per-turn messages with `cached_content=<handle>`. Each distinct
+prefix (e.g. with and without few-shot examples) has its own handle. Superseded
+handles are left to in-flight calls and only deleted once their TTL has passed.
+
+Backends:
+- gemini: Gemini cached contents (`client.caches`), created with the key's client.
+- local:  offline stand-in with the same registration, hit/miss and TTL behaviour
+          that still sends the full prompt, for testing caching and estimated token
+          savings without network access (e.g. with cassette replay).
+
+Prefixes under `context_cache_min_tokens` (estimated) are not cached: Gemini
+rejects cached contents below the model's minimum size.
+"""
+
+from __future__ import annotations
+import asyncio
+import hashlib
+import itertools
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from langchain_core.messages import BaseMessage
+from app.core.config import settings
+from app.services.guardrails import estimate_tokens
+from app.services.standard_logger import logger
+
+BACKENDS = ("off", "gemini", "local")
+
+
+def prefix_fingerprint(model: str, prefix: Sequence[BaseMessage]) -> str:
+    """
+    Hash of the model and the prefix roles/contents (changes when the prompt does).
+    """
+    digest = hashlib.sha256(model.encode("utf-8"))
+    for message in prefix:
+        digest.update(f"\x00{message.type}\x00{message.content}".encode("utf-8"))
+    return digest.hexdigest()[:24]
+
+
+class GeminiContextCache:
+    """
+    Gemini cached contents: the system message becomes the system instruction and
+    the few-shot pairs the cached conversation contents.
+    """
+
+    name = "gemini"
+
+    def create(
+        self, llm: Any, model: str, prefix: Sequence[BaseMessage], ttl_s: float
+    ) -> str:
+        from google.genai import types
+
+        system = "\n\n".join(str(m.content) for m in prefix if m.type == "system")
+        contents = [
+            types.Content(
+                role="user" if m.type == "human" else "model",
+                parts=[types.Part(text=str(m.content))],
+            )
+            for m in prefix
+            if m.type != "system"
+        ]
+        cache = llm.client.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                system_instruction=system or None,
+                contents=contents or None,
+                ttl=f"{int(ttl_s)}s",
+                display_name=f"prompt-prefix-{prefix_fingerprint(model, prefix)}",
+            ),
+        )
+        return cache.name
+
+    def delete(self, llm: Any, handle: str) -> None:
+        llm.client.caches.delete(name=handle)
+
+    def apply(
+        self, handle: str, messages: List[BaseMessage], prefix_size: int, kwargs: dict
+    ) -> Tuple[List[BaseMessage], dict]:
+        return messages[prefix_size:], {**kwargs, "cached_content": handle}
+
+
+class LocalContextCache:
+    """
+    In-process stand-in: hands out handles and tracks them, but the model still
+    receives the full prompt.
+    """
+
+    name = "local"
+
+    def __init__(self) -> None:
+        self._ids = itertools.count(1)
+        self.live: Dict[str, str] = {}
+
+    def create(
+        self, llm: Any, model: str, prefix: Sequence[BaseMessage], ttl_s: float
+    ) -> str:
+        handle = f"local/{prefix_fingerprint(model, prefix)}-{next(self._ids)}"
+        self.live[handle] = model
+        return handle
+
+    def delete(self, llm: Any, handle: str) -> None:
+        self.live.pop(handle, None)
+
+    def apply(
+        self, handle: str, messages: List[BaseMessage], prefix_size: int, kwargs: dict
+    ) -> Tuple[List[BaseMessage], dict]:
+        return messages, kwargs
+
+
+@dataclass
+class CachedPrefix:
+    slot: Any  # key slot whose client created the handle
+    prompt: str  # id of the first prefix message ("assistant@1.0.1:system")
+    handle: Optional[str]  # None = registration failed or prefix too small
+    expires_at: float
+    tokens: int
+
+
+class ContextCacheRegistry:
+    """
+    Thread-safe registry of prefix handles per (key slot, model, prefix
+    fingerprint), with hit/miss counters and the estimated input tokens not resent.
+    """
+
+    def __init__(
+        self,
+        backend: Any = None,
+        ttl_seconds: float = 3600.0,
+        refresh_margin_seconds: float = 60.0,
+        min_tokens: int = 1024,
+    ) -> None:
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.min_tokens = min_tokens
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple, threading.Lock] = {}
+        self._entries: Dict[Tuple, CachedPrefix] = {}
+        # Refreshed entries whose handles are deleted once their TTL has passed
+        self._retired: List[CachedPrefix] = []
+        self.stats: Counter = Counter()
+
+    @staticmethod
+    def _key(slot: Any, model: str, fingerprint: str) -> Tuple:
+        # The fingerprint tells apart every prefix variant of a prompt version
+        # (e.g. the system message alone at the no_few_shot degradation level)
+        return id(slot), model, fingerprint
+
+    def _fresh(self, key: Tuple) -> Optional[CachedPrefix]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry.expires_at - self.refresh_margin_seconds:
+            return None
+        return entry
+
+    def _count(self, entry: CachedPrefix) -> None:
+        with self._lock:
+            if entry.handle is None:
+                self.stats["uncached_calls"] += 1
+            else:
+                self.stats["hits"] += 1
+                self.stats["saved_input_tokens"] += entry.tokens
+
+    def _register(
+        self, slot: Any, model: str, prefix: Sequence[BaseMessage], fingerprint: str
+    ) -> CachedPrefix:
+        """
+        Create (or refresh) the handle for a prefix; one registration per key at a time.
+        """
+        self._collect()
+        key = self._key(slot, model, fingerprint)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            entry = self._fresh(key)
+            if entry is not None:  # registered by a concurrent call meanwhile
+                self._count(entry)
+                return entry
+            previous = self._entries.get(key)
+            if previous is not None and previous.handle is not None:
+                with self._lock:
+                    self.stats["expired"] += 1
+                    # Calls that picked up the old handle may still be running
+                    self._retired.append(previous)
+            tokens = sum(estimate_tokens(str(m.content)) for m in prefix)
+            handle = None
+            if tokens < self.min_tokens:
+                outcome = "too_small"
+            else:
+                try:
+                    handle = self.backend.create(
+                        slot.llm, model, prefix, self.ttl_seconds
+                    )
+                    outcome = "misses"
+                    logger.info(
+                        f"Context cache: registered {tokens}-token prefix for {model} "
+                        f"on key {slot.key_id} ({handle})."
+                    )
+                except Exception as e:
+                    outcome = "errors"
+                    logger.warning(
+                        f"Context cache: could not register prefix for {model} on key "
+                        f"{slot.key_id}; sending it in full until the TTL. Detail: {e}"
+                    )
+            entry = CachedPrefix(
+                slot=slot,
+                prompt=prefix[0].id or prefix[0].type,
+                handle=handle,
+                expires_at=time.monotonic() + self.ttl_seconds,
+                tokens=tokens,
+            )
+            with self._lock:
+                self._entries[key] = entry
+                self.stats[outcome] += 1
+                if handle is None:
+                    self.stats["uncached_calls"] += 1
+            return entry
+
+    def _collect(self) -> None:
+        """
+        Forget entries past their TTL and delete retired handles whose TTL passed
+        (no call can still be using them).
+        """
+        now = time.monotonic()
+        with self._lock:
+            stale = [e for e in self._retired if e.expires_at <= now]
+            self._retired = [e for e in self._retired if e.expires_at > now]
+            for key in [k for k, e in self._entries.items() if e.expires_at <= now]:
+                stale.append(self._entries.pop(key))
+                self._key_locks.pop(key, None)
+        for entry in stale:
+            if entry.handle is not None:
+                self._delete(entry.slot, entry.handle)
+
+    def _delete(self, slot: Any, handle: str) -> None:
+        try:
+            self.backend.delete(slot.llm, handle)
+        except Exception as e:  # the provider drops it at its TTL anyway
+            logger.debug(f"Context cache: could not delete {handle}: {e}")
+
+    def _split(
+        self, messages: Any, prefix_size: int
+    ) -> Optional[Tuple[List[BaseMessage], Sequence[BaseMessage]]]:
+        if (
+            self.backend is None
+            or isinstance(messages, str)
+            or prefix_size <= 0
+            or prefix_size >= len(messages)
+        ):
+            return None
+        return list(messages), messages[:prefix_size]
+
+    def _apply(
+        self, entry: CachedPrefix, messages: List[BaseMessage], prefix_size: int, kwargs
+    ) -> Tuple[Any, dict]:
+        if entry.handle is None:
+            return messages, kwargs
+        return self.backend.apply(entry.handle, messages, prefix_size, kwargs)
+
+    def prepare(
+        self, slot: Any, model: str, messages: Any, prefix_size: int, kwargs: dict
+    ) -> Tuple[Any, dict]:
+        """
+        Rewrite one call for the chosen key slot: reuse (or register) the prefix
+        handle and send only the per-turn messages.
+        """
+        split = self._split(messages, prefix_size)
+        if split is None:
+            return messages, kwargs
+        messages, prefix = split
+        fingerprint = prefix_fingerprint(model, prefix)
+        entry = self._fresh(self._key(slot, model, fingerprint))
+        if entry is not None:
+            self._count(entry)
+        else:
+            entry = self._register(slot, model, prefix, fingerprint)
+        return self._apply(entry, messages, prefix_size, kwargs)
+
+    async def aprepare(
+        self, slot: Any, model: str, messages: Any, prefix_size: int, kwargs: dict
+    ) -> Tuple[Any, dict]:
+        """
+        Async `prepare`: registration (a network call) runs in a worker thread.
+        """
+        split = self._split(messages, prefix_size)
+        if split is None:
+            return messages, kwargs
+        messages, prefix = split
+        fingerprint = prefix_fingerprint(model, prefix)
+        entry = self._fresh(self._key(slot, model, fingerprint))
+        if entry is not None:
+            self._count(entry)
+        else:
+            entry = await asyncio.to_thread(
+                self._register, slot, model, prefix, fingerprint
+            )
+        return self._apply(entry, messages, prefix_size, kwargs)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Expose the backend, registered handles and counters for monitoring.
+        """
+        now = time.monotonic()
+        with self._lock:
+            calls = self.stats["hits"] + self.stats["misses"]
+            return {
+                "backend": getattr(self.backend, "name", "off"),
+                "ttl_seconds": self.ttl_seconds,
+                "min_tokens": self.min_tokens,
+                "handles": [
+                    {
+                        "model": key[1],
+                        "prompt": entry.prompt,
+                        "handle": entry.handle,
+                        "tokens": entry.tokens,
+                        "expires_in_s": round(max(entry.expires_at - now, 0.0), 1),
+                    }
+                    for key, entry in self._entries.items()
+                ],
+                "hit_ratio": round(self.stats["hits"] / calls, 4) if calls else 0.0,
+                **dict(self.stats),
+            }
+
+
+def _registry_from_settings() -> ContextCacheRegistry:
+    backend_name = settings.context_cache
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Unknown context cache backend: {backend_name!r}")
+    backend = {"gemini": GeminiContextCache, "local": LocalContextCache}.get(
+        backend_name
+    )
+    return ContextCacheRegistry(
+        backend() if backend else None,
+        ttl_seconds=settings.context_cache_ttl_seconds,
+        refresh_margin_seconds=settings.context_cache_refresh_margin_seconds,
+        min_tokens=settings.context_cache_min_tokens,
+    )
+
+
+# Shared by every model tier and key
+context_cache = _registry_from_settings()
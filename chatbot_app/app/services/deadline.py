@@ -0,0 +1,152 @@
+"""
+Per-request deadlines: the absolute deadline travels in the graph config
+(`configurable["deadline"]`, epoch seconds), every node checks it, and the model
+call is bounded by the time left. Requests are also cancelled when the client
+disconnects, so nobody pays for answers that will not be read.
+"""
+
+from __future__ import annotations
+import asyncio
+import threading
+import time
+from collections import Counter
+from typing import Any, Awaitable, Dict, Optional
+from langchain_core.runnables import RunnableConfig
+from app.core.config import settings
+
+DEADLINE_KEY = "deadline"
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    The request's time budget ran out before the graph finished.
+    """
+
+
+class ClientDisconnected(Exception):
+    """
+    The client went away while its request was still running.
+    """
+
+
+def deadline_config(
+    timeout_s: float, config: Optional[RunnableConfig] = None
+) -> RunnableConfig:
+    """
+    Return a graph config carrying an absolute deadline `timeout_s` from now.
+    """
+    base: RunnableConfig = config or {}
+    return {
+        **base,
+        "configurable": {
+            **(base.get("configurable") or {}),
+            DEADLINE_KEY: time.time() + timeout_s,
+        },
+    }
+
+
+def remaining(config: Optional[RunnableConfig]) -> Optional[float]:
+    """
+    Seconds left before the deadline (None when the request has no deadline).
+    """
+    deadline = ((config or {}).get("configurable") or {}).get(DEADLINE_KEY)
+    return None if deadline is None else deadline - time.time()
+
+
+def check_deadline(config: Optional[RunnableConfig], where: str) -> None:
+    """
+    Raise DeadlineExceeded if the deadline already passed (called on node entry).
+    """
+    left = remaining(config)
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Deadline exceeded before {where}")
+
+
+def resolve_timeout(requested: Optional[float]) -> float:
+    """
+    Apply the route default and clamp a client-requested timeout to the maximum.
+    """
+    if requested is None:
+        return settings.chat_request_timeout_seconds
+    if requested <= 0:
+        raise ValueError("Request timeout must be positive")
+    return min(requested, settings.chat_request_timeout_max_seconds)
+
+
+class CancellationStats:
+    """
+    Thread-safe counters of finished vs. cancelled turns and the time they saved
+    (budget left at cancellation: model/worker time that was not spent).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counts: Counter = Counter()
+        self.elapsed_ms: Counter = Counter()
+        self.budget_left_ms: Counter = Counter()
+
+    def record(self, outcome: str, elapsed_s: float, left_s: float = 0.0) -> None:
+        with self._lock:
+            self.counts[outcome] += 1
+            self.elapsed_ms[outcome] += int(elapsed_s * 1000)
+            self.budget_left_ms[outcome] += int(max(left_s, 0) * 1000)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                outcome: {
+                    "count": count,
+                    "elapsed_ms": self.elapsed_ms[outcome],
+                    "budget_left_ms": self.budget_left_ms[outcome],
+                }
+                for outcome, count in self.counts.items()
+            }
+
+
+cancellation_stats = CancellationStats()
+
+
+async def run_until_disconnect(
+    request: Any, work: Awaitable[Any], config: RunnableConfig
+) -> Any:
+    """
+    Run `work` until it finishes, the deadline in `config` passes, or the client
+    disconnects; in the last two cases the work (graph and model call) is cancelled.
+    With `request=None` only the deadline applies.
+    """
+    started = time.time()
+    task = asyncio.ensure_future(work)
+    outcome, left = "completed", None
+    try:
+        while True:
+            left = remaining(config)
+            if left is not None and left <= 0:
+                outcome = "deadline"
+                raise DeadlineExceeded("Deadline exceeded")
+            timeout = settings.disconnect_poll_interval_seconds
+            done, _ = await asyncio.wait(
+                {task}, timeout=timeout if left is None else min(timeout, left)
+            )
+            if done:
+                return task.result()
+            if request is not None and await request.is_disconnected():
+                outcome = "disconnected"
+                raise ClientDisconnected("Client disconnected")
+    except DeadlineExceeded:
+        outcome = "deadline"
+        raise
+    except ClientDisconnected:
+        raise
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    except Exception:
+        outcome = "failed"
+        raise
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        # Only cancellations save time; a finished turn used what it needed
+        saved = left if outcome in ("disconnected", "cancelled") else None
+        cancellation_stats.record(outcome, time.time() - started, saved or 0.0)
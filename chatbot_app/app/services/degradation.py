@@ -0,0 +1,274 @@
+"""
+Load-adaptive degradation: a live load signal (in-flight model calls, recent p95
+latency, upstream 429 rate) drives a degradation level that trades answer quality
+for latency under spikes, and recovers on its own once load drops.
+
+Levels are cumulative:
+    0 normal
+    1 reduced_output  cap max_output_tokens
+    2 no_few_shot     send the system prompt without the few-shot examples
+    3 fast_model      route every turn to the fast tier
+    4 static          no model call: the user's cached answer to the same first-turn
+                      question, or a static reply
+
+The level rises as soon as the pressure crosses a watermark, and steps down one
+level at a time, only after the pressure stayed below `watermark * recover_ratio`
+for the hold time (hysteresis, so the mode does not flap).
+"""
+
+from __future__ import annotations
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+from app.core.config import settings
+from app.services.standard_logger import logger
+from app.utils.language import detect_language
+
+NORMAL = 0
+REDUCED_OUTPUT = 1
+NO_FEW_SHOT = 2
+FAST_MODEL = 3
+STATIC = 4
+LEVEL_NAMES = ("normal", "reduced_output", "no_few_shot", "fast_model", "static")
+
+# The level is re-evaluated at most this often (seconds)
+EVAL_INTERVAL = 1.0
+
+STATIC_REPLIES = {
+    "en": "We're receiving a lot of requests right now. Please try again in a few minutes.",
+    "es": "Ahora mismo estamos recibiendo muchas solicitudes. Inténtalo de nuevo en unos minutos.",
+}
+
+
+def parse_watermarks(raw: str) -> List[float]:
+    """
+    Parse "1.0,1.5,2.0,3.0" (pressure entering levels 1..4) into a sorted list.
+    """
+    marks = sorted(float(part) for part in raw.split(",") if part.strip())
+    if len(marks) != len(LEVEL_NAMES) - 1:
+        raise ValueError(
+            f"Expected {len(LEVEL_NAMES) - 1} degradation watermarks, got {raw!r}"
+        )
+    return marks
+
+
+class LoadMonitor:
+    """
+    Thread-safe load signal and degradation level, shared by every model tier.
+
+    Each signal is normalized by its high watermark and the pressure is the worst
+    of them (1.0 = one signal at its high watermark).
+    """
+
+    def __init__(
+        self,
+        watermarks: List[float],
+        recover_ratio: float,
+        hold_seconds: float,
+        window_seconds: float,
+        inflight_high: int,
+        p95_high_ms: float,
+        rate_limit_high: float,
+        min_samples: int,
+        enabled: bool = True,
+    ) -> None:
+        self.watermarks = watermarks
+        self.recover_ratio = recover_ratio
+        self.hold_seconds = hold_seconds
+        self.window_seconds = window_seconds
+        self.inflight_high = inflight_high
+        self.p95_high_ms = p95_high_ms
+        self.rate_limit_high = rate_limit_high
+        self.min_samples = min_samples
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        # (timestamp, latency_ms) of finished calls and timestamps of 429s in the window
+        self._latencies: Deque[Tuple[float, float]] = deque()
+        self._rate_limited: Deque[float] = deque()
+        self._level = NORMAL
+        self._level_since = time.monotonic()
+        self._evaluated_at = 0.0
+        self._pressure = 0.0
+        self.transitions = 0
+
+    def _trim(self, now: float) -> None:
+        cutoff = now - self.window_seconds
+        while self._latencies and self._latencies[0][0] < cutoff:
+            self._latencies.popleft()
+        while self._rate_limited and self._rate_limited[0] < cutoff:
+            self._rate_limited.popleft()
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """
+        Count one upstream model call as in flight and record its latency, also
+        when it fails or is cancelled (a call that hangs until the deadline is
+        exactly the slowness the p95 signal must see).
+        """
+        with self._lock:
+            self.in_flight += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            now = time.monotonic()
+            with self._lock:
+                self.in_flight -= 1
+                self._latencies.append((now, (now - started) * 1000))
+
+    def record_rate_limited(self, *_: Any) -> None:
+        """
+        Count an upstream 429 (used as the key pool's rate-limit callback).
+        """
+        with self._lock:
+            self._rate_limited.append(time.monotonic())
+
+    def _signals(self, now: float) -> Dict[str, Any]:
+        self._trim(now)
+        latencies = sorted(ms for _, ms in self._latencies)
+        p95 = (
+            latencies[math.ceil(0.95 * len(latencies)) - 1]
+            if len(latencies) >= self.min_samples
+            else None
+        )
+        attempts = len(latencies) + len(self._rate_limited)
+        rate_limited = (
+            len(self._rate_limited) / attempts if attempts >= self.min_samples else None
+        )
+        return {
+            "in_flight": self.in_flight,
+            "p95_ms": None if p95 is None else round(p95, 1),
+            "rate_limited_ratio": (
+                None if rate_limited is None else round(rate_limited, 4)
+            ),
+        }
+
+    def _pressure_of(self, signals: Dict[str, Any]) -> float:
+        ratios = [signals["in_flight"] / max(self.inflight_high, 1)]
+        if signals["p95_ms"] is not None:
+            ratios.append(signals["p95_ms"] / self.p95_high_ms)
+        if signals["rate_limited_ratio"] is not None:
+            ratios.append(signals["rate_limited_ratio"] / self.rate_limit_high)
+        return max(ratios)
+
+    def _evaluate(self, now: float) -> None:
+        pressure = self._pressure_of(self._signals(now))
+        self._pressure = pressure
+        target = sum(1 for mark in self.watermarks if pressure >= mark)
+        previous = self._level
+        if target > self._level:
+            self._level = target
+        elif (
+            self._level > NORMAL
+            and pressure < self.watermarks[self._level - 1] * self.recover_ratio
+            and now - self._level_since >= self.hold_seconds
+        ):
+            self._level -= 1
+        if self._level != previous:
+            self._level_since = now
+            self.transitions += 1
+            log = logger.warning if self._level > previous else logger.info
+            log(
+                f"Degradation level {LEVEL_NAMES[previous]} -> {LEVEL_NAMES[self._level]} "
+                f"(pressure={pressure:.2f})."
+            )
+
+    @property
+    def level(self) -> int:
+        """
+        Current degradation level (re-evaluated at most every EVAL_INTERVAL).
+        """
+        if not self.enabled:
+            return NORMAL
+        now = time.monotonic()
+        with self._lock:
+            if now - self._evaluated_at >= EVAL_INTERVAL:
+                self._evaluated_at = now
+                self._evaluate(now)
+            return self._level
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Expose the level, pressure and signals for monitoring.
+        """
+        level = self.level
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "level": level,
+                "mode": LEVEL_NAMES[level],
+                "pressure": round(self._pressure, 3),
+                "in_level_s": round(now - self._level_since, 1),
+                "transitions": self.transitions,
+                "watermarks": self.watermarks,
+                "signals": self._signals(now),
+            }
+
+
+class AnswerCache:
+    """
+    Bounded LRU of recent model answers by (user, prompt, normalized question),
+    served instead of a static reply at the `static` level. Callers only use it
+    for turns without earlier conversation, whose answer depends on nothing else.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._answers: "OrderedDict[Tuple[Optional[int], str, str], str]" = (
+            OrderedDict()
+        )
+
+    @staticmethod
+    def _key(
+        user_id: Optional[int], prompt: Optional[str], question: str
+    ) -> Tuple[Optional[int], str, str]:
+        return user_id, prompt or "", " ".join(question.lower().split())
+
+    def get(
+        self, user_id: Optional[int], prompt: Optional[str], question: str
+    ) -> Optional[str]:
+        key = self._key(user_id, prompt, question)
+        with self._lock:
+            answer = self._answers.get(key)
+            if answer is not None:
+                self._answers.move_to_end(key)
+            return answer
+
+    def put(
+        self, user_id: Optional[int], prompt: Optional[str], question: str, answer: str
+    ) -> None:
+        if self.max_entries <= 0 or not question.strip():
+            return
+        key = self._key(user_id, prompt, question)
+        with self._lock:
+            self._answers[key] = answer
+            self._answers.move_to_end(key)
+            while len(self._answers) > self.max_entries:
+                self._answers.popitem(last=False)
+
+
+def static_reply(text: str) -> str:
+    """
+    Static "busy" reply in the user's language (English fallback).
+    """
+    return STATIC_REPLIES.get(detect_language(text), STATIC_REPLIES["en"])
+
+
+load_monitor = LoadMonitor(
+    parse_watermarks(settings.degrade_watermarks),
+    recover_ratio=settings.degrade_recover_ratio,
+    hold_seconds=settings.degrade_hold_seconds,
+    window_seconds=settings.degrade_window_seconds,
+    inflight_high=settings.degrade_inflight_high,
+    p95_high_ms=settings.degrade_p95_high_ms,
+    rate_limit_high=settings.degrade_rate_limit_high,
+    min_samples=settings.degrade_min_samples,
+    enabled=settings.enable_degradation,
+)
+answer_cache = AnswerCache(settings.degrade_answer_cache_size)
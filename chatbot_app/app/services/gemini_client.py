@@ -3,15 +3,28 @@ Gemini client wrapper without Langfuse duplication.
 """
 
 from __future__ import annotations
+import time
+from typing import Any, Callable, List, Optional
+from langchain_core.language_models import BaseChatModel
 from langchain_google_genai import ChatGoogleGenerativeAI
+from app.services.client_pool import ClientPool
+from app.services.context_cache import context_cache
+from app.services.degradation import REDUCED_OUTPUT, load_monitor
+from app.services.llm_cassette import CassetteChatModel, cassette
 from app.services.standard_logger import logger
 from app.core.config import settings
 
 
 class GeminiClient:
-    def __init__(self) -> None:
-        model = settings.gemini_model
-        temperature = settings.llm_temperature
+    def __init__(
+        self,
+        model: str | None = None,
+        temperature: float | None = None,
+        max_output_tokens: int | None = None,
+    ) -> None:
+        # Defaults come from settings; model tiers override them per instance
+        model = model or settings.gemini_model
+        temperature = settings.llm_temperature if temperature is None else temperature
         api_key = settings.gemini_api_key
 
         if not api_key:
@@ -22,17 +35,136 @@ class GeminiClient:
         logger.info(
             f"Initializing Gemini client with model: {model}, temperature={temperature}"
         )
-        self.llm = ChatGoogleGenerativeAI(
-            model=model, temperature=temperature, api_key=api_key
+        self.model = model
+        self.temperature = temperature
+        self.max_output_tokens = max_output_tokens
+
+        # One reusable client per API key; calls are spread across them by the pool
+        # (in cassette replay mode, every key is backed by the recorded answers)
+        factory: Callable[[str], BaseChatModel]
+        if settings.llm_cassette_mode == "replay":
+            factory = lambda key: CassetteChatModel(  # noqa: E731
+                cassette=cassette,
+                model_name=model,
+                time_scale=settings.llm_cassette_time_scale,
+            )
+        else:
+            factory = lambda key: ChatGoogleGenerativeAI(  # noqa: E731
+                model=model,
+                temperature=temperature,
+                max_output_tokens=max_output_tokens,
+                api_key=key,
+                # No SDK-level retries: the pool fails over on 429 and retries
+                # transient errors itself (gemini_transient_retries)
+                max_retries=0,
+            )
+        self.pool = ClientPool(
+            [api_key, *_extra_api_keys()],
+            factory=factory,
+            strategy=settings.gemini_pool_strategy,
+            rpm_limit=settings.gemini_key_rpm_limit,
+            tpm_limit=settings.gemini_key_tpm_limit,
+            cooldown_seconds=settings.gemini_key_cooldown_seconds,
+            transient_retries=settings.gemini_transient_retries,
+            retry_backoff_seconds=settings.gemini_retry_backoff_seconds,
+            on_rate_limited=load_monitor.record_rate_limited,
+        )
+
+    @property
+    def llm(self) -> ChatGoogleGenerativeAI:
+        """
+        Client of the primary key (kept for callers that expect a single model).
+        """
+        return self.pool.slots[0].llm
+
+    def get_llm_instance(self) -> ChatGoogleGenerativeAI:
+        """
+        Return the LangChain chat model the pool would use next.
+        """
+        return self.pool.next_llm()
+
+    def invoke(
+        self,
+        messages: Any,
+        prefix_size: int = 0,
+        degradation_level: Optional[int] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Invoke the model through the key pool (load balancing + 429 failover).
+        The call feeds the load signal and honours the degradation level of the
+        turn (the live level when not given).
+        The first `prefix_size` messages (static prompt prefix) are served from
+        the context cache when it is enabled.
+        """
+        params = self._degraded(kwargs, degradation_level)
+        prepare = self._cached_prefix(prefix_size, context_cache.prepare)
+        with load_monitor.track():
+            if cassette is None or settings.llm_cassette_mode != "record":
+                return self.pool.invoke(messages, prepare=prepare, **params)
+            started = time.perf_counter()
+            response = self.pool.invoke(messages, prepare=prepare, **params)
+        cassette.record(
+            self.model, messages, params, response, time.perf_counter() - started
+        )
+        return response
+
+    async def ainvoke(
+        self,
+        messages: Any,
+        prefix_size: int = 0,
+        degradation_level: Optional[int] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Async variant of `invoke` (cancellable).
+        """
+        params = self._degraded(kwargs, degradation_level)
+        prepare = self._cached_prefix(prefix_size, context_cache.aprepare)
+        with load_monitor.track():
+            if cassette is None or settings.llm_cassette_mode != "record":
+                return await self.pool.ainvoke(messages, prepare=prepare, **params)
+            started = time.perf_counter()
+            response = await self.pool.ainvoke(messages, prepare=prepare, **params)
+        cassette.record(
+            self.model, messages, params, response, time.perf_counter() - started
+        )
+        return response
+
+    def _cached_prefix(self, prefix_size: int, prepare):
+        """
+        Per-key rewrite that swaps the prompt prefix for its cached-content handle.
+        """
+        if not prefix_size or context_cache.backend is None:
+            return None
+        return lambda slot, messages, kwargs: prepare(
+            slot, self.model, messages, prefix_size, kwargs
         )
 
+    def _degraded(self, kwargs: dict, level: Optional[int]) -> dict:
+        """
+        Cap the output length while the service is degraded.
+        """
+        if (load_monitor.level if level is None else level) < REDUCED_OUTPUT:
+            return kwargs
+        cap = settings.degrade_max_output_tokens
+        current = kwargs.get("max_output_tokens") or self.max_output_tokens
+        return {**kwargs, "max_output_tokens": min(current, cap) if current else cap}
+
     def invoke_model(self, prompt: str) -> str:
         try:
-            response = self.llm.invoke(prompt)
+            response = self.invoke(prompt)
             return getattr(response, "content", str(response))
         except Exception as e:
             logger.exception(f"Error during Gemini invocation: {e}")
             return "Sorry, I encountered an error while processing your request."
 
 
+def _extra_api_keys() -> List[str]:
+    """
+    Parse the comma-separated extra API keys from settings.
+    """
+    return [k.strip() for k in settings.gemini_extra_api_keys.split(",") if k.strip()]
+
+
 gemini_client = GeminiClient()
@@ -2,11 +2,62 @@
 Build and compile the LangGraph state graph that orchestrates the chatbot flow.
 """
 
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
+from app.core.config import settings
+from app.services.deadline import check_deadline
 from app.services.state import ChatbotState
-from app.services.processing_nodes import process_user_input, llm_response_node
+from app.services.processing_nodes import process_user_input, build_llm_node
+from app.services.model_router import (
+    FAST_TIER,
+    FULL_TIER,
+    route_model_node,
+    select_model_tier,
+)
+from app.services.catalog_index import retrieval_node
+from app.services.guardrails import (
+    BLOCKED,
+    PASS,
+    guardrail_node,
+    select_guardrail_outcome,
+)
+from app.services.parallel_stage import Branch, parallel_stage
 from app.services.standard_logger import logger as default_logger
 
+# Nodes that call the model (their tokens are what streaming clients display)
+LLM_NODE_NAMES = ("llm_fast_executor", "llm_executor")
+
+
+def _with_deadline(name: str, node):
+    """
+    Wrap a node so it refuses to start once the request deadline has passed.
+    """
+
+    def guarded(state: ChatbotState, config: RunnableConfig) -> ChatbotState:
+        check_deadline(config, name)
+        return node(state)
+
+    guarded.__name__ = getattr(node, "__name__", name)
+    return guarded
+
+
+def prepare_turn_branches():
+    """
+    Independent preparation nodes run side by side after the guardrail.
+
+    Retrieval only enriches the prompt, so it is optional: a slow index is skipped
+    for the turn instead of delaying the answer. Routing is required.
+    """
+    return [
+        Branch(
+            "catalog_retriever",
+            retrieval_node,
+            timeout_s=settings.catalog_branch_timeout_seconds or None,
+            optional=True,
+        ),
+        Branch("model_router", route_model_node),
+    ]
+
 
 def build_graph(custom_logger=None):
     """
@@ -26,14 +77,37 @@ def build_graph(custom_logger=None):
         graph_builder: StateGraph[ChatbotState] = StateGraph(ChatbotState)  # type: ignore[type-arg]
 
         # Register the nodes of the pipeline
-        graph_builder.add_node("user_input_processor", process_user_input)
-        graph_builder.add_node("llm_executor", llm_response_node)
+        # (each checks the request deadline carried in the config before running)
+        graph_builder.add_node(
+            "user_input_processor",
+            _with_deadline("user_input_processor", process_user_input),
+        )
+        graph_builder.add_node("guardrail", _with_deadline("guardrail", guardrail_node))
+        # Catalog retrieval and model routing fan out and join into one state update
+        graph_builder.add_node(
+            "prepare_turn", parallel_stage("prepare_turn", prepare_turn_branches())
+        )
+        graph_builder.add_node("llm_fast_executor", build_llm_node(FAST_TIER))
+        graph_builder.add_node("llm_executor", build_llm_node(FULL_TIER))
 
         # Set the entry point of the graph
         graph_builder.set_entry_point("user_input_processor")
 
-        # Define the flow: user input -> LLM -> END
-        graph_builder.add_edge("user_input_processor", "llm_executor")
+        # Define the flow: user input -> guardrail -> (catalog retrieval || router)
+        # -> (fast | full) LLM -> END
+        # (a guardrail that answers the turn ends the graph without a model call)
+        graph_builder.add_edge("user_input_processor", "guardrail")
+        graph_builder.add_conditional_edges(
+            "guardrail",
+            select_guardrail_outcome,
+            {PASS: "prepare_turn", BLOCKED: END},
+        )
+        graph_builder.add_conditional_edges(
+            "prepare_turn",
+            select_model_tier,
+            {FAST_TIER: "llm_fast_executor", FULL_TIER: "llm_executor"},
+        )
+        graph_builder.add_edge("llm_fast_executor", END)
         graph_builder.add_edge("llm_executor", END)
 
         # Compile the graph into an executable app
@@ -0,0 +1,257 @@
+"""
+Local pre-LLM guardrails: cheap checks that short-circuit a turn with a templated
+reply instead of a Gemini round-trip (empty/oversized input, avoided topics,
+unsupported language, obviously vague requests).
+"""
+
+from __future__ import annotations
+import math
+import threading
+from collections import Counter, deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+from langchain_core.messages import AIMessage
+from app.core.config import settings
+from app.models.prompt_config import PromptConfig
+from app.services.state import ChatbotState
+from app.services.standard_logger import logger
+from app.utils.language import detect_language
+from app.utils.prompt_registry import prompt_registry
+
+PASS = "pass"
+BLOCKED = "blocked"
+
+# Single-topic requests too vague to answer without a clarifying question,
+# mapped to the language the clarifying reply should use
+VAGUE_REQUESTS: Dict[str, str] = {
+    **dict.fromkeys(
+        ("book", "books", "a book", "recommend", "recommend me", "recommend a book")
+        + ("recommendation", "something", "help"),
+        "en",
+    ),
+    **dict.fromkeys(
+        ("libro", "libros", "un libro", "recomienda", "recomiéndame", "recomiendame")
+        + ("recomendación", "algo", "ayuda"),
+        "es",
+    ),
+}
+
+# Templated replies per check and language ("en" is the fallback)
+TEMPLATES: Dict[str, Dict[str, str]] = {
+    "empty": {
+        "en": "Please type a question about books, authors or genres.",
+        "es": "Escribe una pregunta sobre libros, autores o géneros.",
+    },
+    "too_long": {
+        "en": "Your message is too long. Please shorten it to the essential question.",
+        "es": "Tu mensaje es demasiado largo. Por favor, resúmelo en la pregunta esencial.",
+    },
+    "avoid_topic": {
+        "en": "Sorry, I can't help with that topic. I'm happy to talk about books instead.",
+        "es": "Lo siento, no puedo ayudar con ese tema. Con gusto hablamos de libros.",
+    },
+    "language": {
+        "en": "I can only answer in {languages}. Please write your question in one of them.",
+        "es": "Solo puedo responder en {languages}. Escribe tu pregunta en uno de ellos.",
+    },
+    "clarify": {
+        "en": "Happy to help! Which genres, authors or books have you enjoyed, "
+        "and what are you in the mood for?",
+        "es": "¡Con gusto! ¿Qué géneros, autores o libros te han gustado "
+        "y qué te apetece leer ahora?",
+    },
+}
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton: finds every pattern in one pass over the text,
+    whatever the number of patterns. Matches are case-insensitive and whole-word.
+    """
+
+    def __init__(self, patterns: Iterable[str]) -> None:
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+        self.patterns = sorted({p.strip().lower() for p in patterns if p.strip()})
+        for pattern in self.patterns:
+            self._insert(pattern)
+        self._build_failure_links()
+
+    def _insert(self, pattern: str) -> None:
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(pattern)
+
+    def _build_failure_links(self) -> None:
+        queue: Deque[int] = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                if self._fail[child] == child:
+                    self._fail[child] = 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text: str) -> List[str]:
+        """
+        Return the distinct patterns found in `text` as whole words.
+        """
+        if not self.patterns:
+            return []
+        lowered = text.lower()
+        found: List[str] = []
+        node = 0
+        for i, ch in enumerate(lowered):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for pattern in self._out[node]:
+                start = i - len(pattern) + 1
+                before = lowered[start - 1] if start > 0 else " "
+                after = lowered[i + 1] if i + 1 < len(lowered) else " "
+                if (
+                    not before.isalnum()
+                    and not after.isalnum()
+                    and pattern not in found
+                ):
+                    found.append(pattern)
+        return found
+
+
+class GuardrailStats:
+    """
+    Thread-safe counters of checked and short-circuited turns (upstream calls saved).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.short_circuited: Counter = Counter()
+
+    def record(self, reason: Optional[str]) -> None:
+        with self._lock:
+            self.checked += 1
+            if reason:
+                self.short_circuited[reason] += 1
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            saved = sum(self.short_circuited.values())
+            return {
+                "checked": self.checked,
+                "short_circuited": saved,
+                "saved_ratio": round(saved / self.checked, 4) if self.checked else 0.0,
+                "by_reason": dict(self.short_circuited),
+            }
+
+
+guardrail_stats = GuardrailStats()
+
+# One compiled matcher per prompt key (compiled on first use, then reused)
+_matchers: Dict[str, KeywordMatcher] = {}
+
+
+def _matcher_for(key: str, cfg: PromptConfig) -> KeywordMatcher:
+    matcher = _matchers.get(key)
+    if matcher is None:
+        matcher = _matchers[key] = KeywordMatcher(cfg.policy.avoid_topics)
+    return matcher
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token estimate (~4 characters per token) without a tokenizer.
+    """
+    return math.ceil(len(text) / 4)
+
+
+def check_input(
+    text: str, cfg: Optional[PromptConfig], key: str = ""
+) -> Tuple[Optional[str], str]:
+    """
+    Run the local checks in cost order. Return (reason, language); reason is None
+    when the turn may proceed to the model.
+    """
+    stripped = text.strip()
+    if not stripped:
+        return "empty", "en"
+    language = detect_language(stripped)
+    if len(stripped) > settings.guardrail_max_input_chars:
+        return "too_long", language
+    if estimate_tokens(stripped) > settings.guardrail_max_input_tokens:
+        return "too_long", language
+    if cfg is None:
+        return None, language
+    if _matcher_for(key, cfg).find(stripped):
+        return "avoid_topic", language
+    # Only trust the language guess when there are enough words to go on
+    if len(stripped.split()) >= 4 and language not in ("unknown", *cfg.language):
+        return "language", language
+    if cfg.policy.missing_info == "ask_clarifying_questions":
+        normalized = stripped.lower().strip(" ?!¿¡.,")
+        if normalized in VAGUE_REQUESTS:
+            return "clarify", VAGUE_REQUESTS[normalized]
+    return None, language
+
+
+def render_reply(reason: str, language: str, cfg: Optional[PromptConfig]) -> str:
+    """
+    Fill the template for a reason in the user's language (falls back to English).
+    """
+    templates = TEMPLATES[reason]
+    lang = language if language in templates else "en"
+    languages = ", ".join(cfg.language) if cfg else "es, en"
+    return templates[lang].format(languages=languages)
+
+
+def guardrail_node(state: ChatbotState) -> ChatbotState:
+    """
+    LangGraph node: run local checks and, if one fires, answer without the model.
+    """
+    if not settings.enable_guardrails:
+        return {"guardrail": None}
+
+    cfg: Optional[PromptConfig] = None
+    key = ""
+    try:
+        compiled = prompt_registry.get(
+            state.get("prompt_name"), state.get("prompt_version")
+        )
+        cfg, key = compiled.config, compiled.key
+    except KeyError:
+        pass
+
+    reason, language = check_input(state.get("current_input", "") or "", cfg, key)
+    guardrail_stats.record(reason)
+    if reason is None:
+        return {"guardrail": None}
+
+    reply = render_reply(reason, language, cfg)
+    logger.info(f"Node: Guardrail short-circuit ({reason}); model call skipped.")
+    return {
+        "guardrail": reason,
+        "messages": [AIMessage(content=reply)],
+        "llm_response": reply,
+        "model_tier": "guardrail",
+        "model_name": "guardrail",
+        "route_reason": f"guardrail:{reason}",
+    }
+
+
+def select_guardrail_outcome(state: ChatbotState) -> str:
+    """
+    Conditional-edge selector: stop the graph when a guardrail answered the turn.
+    """
+    return BLOCKED if state.get("guardrail") else PASS
@@ -0,0 +1,205 @@
+"""
+Idempotency-Key support: a retry with the same (user, key) reuses the first
+execution instead of generating (and storing) the turn again.
+
+- Completed responses (body and the headers that describe it) live in a bounded
+  in-memory LRU and in SQLite, both with a TTL.
+- A retry that arrives while the original request is still running awaits the
+  same in-flight task instead of starting a new one. In-flight runs are tracked
+  per worker process: with several uvicorn workers, a retry routed to another
+  worker before the first run is stored runs the turn again, and the unique
+  (user, key) row keeps whichever response is stored first.
+- Failed executions are not stored, so the client may retry them.
+"""
+
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.models.idempotency_record import IdempotencyRecord
+from app.db.session import ReadSessionLocal
+from app.services.standard_logger import logger
+
+StoreKey = Tuple[int, str]
+# What one execution produces: the response body and headers to send with it
+Execution = Tuple[Dict[str, Any], Dict[str, str]]
+
+# How often expired rows are deleted (piggybacks on writes)
+PURGE_INTERVAL = timedelta(minutes=10)
+
+
+class IdempotencyConflict(ValueError):
+    """
+    The key was already used for a request with different parameters.
+    """
+
+
+@dataclass
+class StoredResponse:
+    fingerprint: str
+    body: Dict[str, Any]
+    expires_at: datetime
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+def request_fingerprint(*parts: Any) -> str:
+    """
+    Stable hash of the request parameters bound to an idempotency key.
+    """
+    raw = json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Two-level TTL store (memory LRU, then SQLite) plus the table of in-flight runs.
+    Used from the event loop only; the SQLite lookup runs in a worker thread.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int) -> None:
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[StoreKey, StoredResponse]" = OrderedDict()
+        self._in_flight: Dict[StoreKey, Tuple[str, "asyncio.Future[Execution]"]] = {}
+        self._last_purge = datetime.utcnow()
+
+    def _remember(self, key: StoreKey, stored: StoredResponse) -> None:
+        self._memory[key] = stored
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _cached(self, key: StoreKey, now: datetime) -> Optional[StoredResponse]:
+        stored = self._memory.get(key)
+        if stored is not None:
+            if stored.expires_at > now:
+                self._memory.move_to_end(key)
+                return stored
+            del self._memory[key]
+        return None
+
+    def _load(self, key: StoreKey, now: datetime) -> Optional[StoredResponse]:
+        # Runs in a worker thread: touches the database only, not the LRU
+        db = ReadSessionLocal()
+        try:
+            record = (
+                db.query(IdempotencyRecord)
+                .filter_by(user_id=key[0], key=key[1])
+                .filter(IdempotencyRecord.expires_at > now)
+                .first()
+            )
+            if record is None:
+                return None
+            return StoredResponse(
+                record.fingerprint,
+                json.loads(record.response_body),
+                record.expires_at,
+                json.loads(record.response_headers or "{}"),
+            )
+        finally:
+            db.close()
+
+    async def _lookup(self, key: StoreKey, now: datetime) -> Optional[StoredResponse]:
+        stored = self._cached(key, now)
+        if stored is None:
+            stored = await asyncio.to_thread(self._load, key, now)
+            if stored is None:
+                # A run of this key may have completed while the query ran
+                return self._cached(key, now)
+            self._remember(key, stored)
+        return stored
+
+    def _persist(self, db: Session, key: StoreKey, stored: StoredResponse) -> None:
+        # Uses the request's session, so the row commits right after the turn
+        try:
+            # Replace an expired row for the same key, if any
+            db.query(IdempotencyRecord).filter_by(user_id=key[0], key=key[1]).delete()
+            db.add(
+                IdempotencyRecord(
+                    user_id=key[0],
+                    key=key[1],
+                    fingerprint=stored.fingerprint,
+                    response_body=json.dumps(stored.body, ensure_ascii=False),
+                    response_headers=json.dumps(stored.headers),
+                    expires_at=stored.expires_at,
+                )
+            )
+            now = datetime.utcnow()
+            if now - self._last_purge > PURGE_INTERVAL:
+                db.query(IdempotencyRecord).filter(
+                    IdempotencyRecord.expires_at <= now
+                ).delete(synchronize_session=False)
+                self._last_purge = now
+            db.commit()
+        except IntegrityError:
+            # Another worker stored the same key first; its response wins
+            db.rollback()
+
+    async def run(
+        self,
+        user_id: int,
+        key: str,
+        fingerprint: str,
+        execute: Callable[[], Awaitable[Execution]],
+        db: Session,
+    ) -> Tuple[Dict[str, Any], Dict[str, str], bool]:
+        """
+        Return (body, headers, replayed). `execute` returns (body, headers) and
+        runs at most once per live key; attached and replayed retries get the
+        same body and headers. Raise IdempotencyConflict if the key was used
+        with other parameters.
+        """
+        store_key = (user_id, key)
+        now = datetime.utcnow()
+
+        stored = await self._lookup(store_key, now)
+        if stored is not None:
+            if stored.fingerprint != fingerprint:
+                raise IdempotencyConflict(key)
+            return stored.body, stored.headers, True
+
+        running = self._in_flight.get(store_key)
+        if running is not None:
+            if running[0] != fingerprint:
+                raise IdempotencyConflict(key)
+            logger.info(f"Idempotency key {key!r} in flight; attaching to it.")
+            # shield: a retry that disconnects must not cancel the original run
+            body, headers = await asyncio.shield(running[1])
+            return body, headers, True
+
+        future: "asyncio.Future[Execution]" = asyncio.get_running_loop().create_future()
+        self._in_flight[store_key] = (fingerprint, future)
+        try:
+            body, headers = await execute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody is attached
+            raise
+        finally:
+            self._in_flight.pop(store_key, None)
+
+        stored = StoredResponse(
+            fingerprint, body, datetime.utcnow() + self.ttl, headers
+        )
+        self._remember(store_key, stored)
+        try:
+            await asyncio.to_thread(self._persist, db, store_key, stored)
+        except Exception as e:
+            logger.warning(f"Could not persist idempotency key {key!r}: {e}")
+        future.set_result((body, headers))
+        return body, headers, False
+
+
+idempotency_store = IdempotencyStore(
+    settings.idempotency_ttl_seconds, settings.idempotency_max_entries
+)
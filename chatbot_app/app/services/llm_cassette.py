@@ -0,0 +1,317 @@
+"""
+Record/replay of Gemini calls for reproducible offline performance runs.
+
+- record: every call made through `GeminiClient` is stored in a cassette
+  (request fingerprint, model, response text, token usage, observed latency).
+- replay: the key pool is backed by `CassetteChatModel`, which answers from the
+  cassette with the recorded latency (scaled by `llm_cassette_time_scale`) and
+  streams the text over that time, so whole-system load tests see realistic
+  payload sizes and timing without network access.
+
+The cassette is gzip NDJSON, one recording per line; every flush appends a gzip
+member, which readers treat as one stream. Requests not in the cassette replay a
+recording of the same model chosen from the fingerprint (deterministic), or fail
+with `llm_cassette_on_miss=error`.
+"""
+
+from __future__ import annotations
+import asyncio
+import atexit
+import gzip
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, AsyncIterator, List, Optional
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.messages.ai import UsageMetadata
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from app.core.config import settings
+from app.services.standard_logger import logger
+
+MODES = ("off", "record", "replay")
+# Recordings buffered in memory before a gzip member is appended to the file
+FLUSH_EVERY = 50
+
+
+def request_fingerprint(model: str, messages: Any, params: Dict[str, Any]) -> str:
+    """
+    Stable hash of a model call: model, message roles/contents and generation params.
+    """
+    if isinstance(messages, str):
+        parts = [["human", messages]]
+    else:
+        parts = [[m.type, m.content] for m in messages]
+    raw = json.dumps(
+        [model, parts, params], ensure_ascii=False, sort_keys=True, default=str
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def _last_human_text(messages: Any) -> str:
+    if isinstance(messages, str):
+        return messages
+    for message in reversed(messages):
+        if message.type == "human":
+            return str(message.content)
+    return ""
+
+
+@dataclass
+class Recording:
+    fingerprint: str
+    model: str
+    content: str
+    usage: Dict[str, Any] = field(default_factory=dict)
+    latency_ms: int = 0
+    input: str = ""  # last user message, for inspection and load-test inputs
+
+
+class Cassette:
+    """
+    Recordings by fingerprint (replayed in recorded order, cycling) plus a
+    buffered appender for record mode. Thread-safe.
+    """
+
+    def __init__(self, path: str | Path, on_miss: str = "sample") -> None:
+        if on_miss not in ("sample", "error"):
+            raise ValueError(f"Unknown cassette miss policy: {on_miss!r}")
+        self.path = Path(path)
+        self.on_miss = on_miss
+        self._lock = threading.Lock()
+        self._pending: List[Recording] = []
+        self._by_fingerprint: Dict[str, List[Recording]] = defaultdict(list)
+        self._by_model: Dict[str, List[Recording]] = defaultdict(list)
+        self._cursors: Dict[str, Iterator[Recording]] = {}
+        self.stats: Counter = Counter()
+
+    def __len__(self) -> int:
+        return sum(len(recs) for recs in self._by_fingerprint.values())
+
+    def load(self) -> "Cassette":
+        if not self.path.exists():
+            raise FileNotFoundError(f"Cassette not found: {self.path}")
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self._index(Recording(**json.loads(line)))
+        logger.info(f"Loaded {len(self)} recording(s) from cassette {self.path}.")
+        return self
+
+    def _index(self, recording: Recording) -> None:
+        self._by_fingerprint[recording.fingerprint].append(recording)
+        self._by_model[recording.model].append(recording)
+
+    def recordings(self) -> List[Recording]:
+        return [rec for recs in self._by_fingerprint.values() for rec in recs]
+
+    def record(
+        self,
+        model: str,
+        messages: Any,
+        params: Dict[str, Any],
+        response: Any,
+        latency_s: float,
+    ) -> None:
+        """
+        Add one observed call (record mode); flushed to disk in batches.
+        """
+        content = getattr(response, "content", response)
+        recording = Recording(
+            fingerprint=request_fingerprint(model, messages, params),
+            model=model,
+            content=content if isinstance(content, str) else json.dumps(content),
+            usage=dict(getattr(response, "usage_metadata", None) or {}),
+            latency_ms=int(latency_s * 1000),
+            input=_last_human_text(messages),
+        )
+        with self._lock:
+            self._index(recording)
+            self._pending.append(recording)
+            self.stats["recorded"] += 1
+            if len(self._pending) >= FLUSH_EVERY:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            for recording in self._pending:
+                f.write(json.dumps(asdict(recording), ensure_ascii=False) + "\n")
+        self._pending.clear()
+
+    def lookup(self, model: str, messages: Any, params: Dict[str, Any]) -> Recording:
+        """
+        Recording for a call: exact fingerprint match (cycling through repeats),
+        else a recording of the same model picked from the fingerprint.
+        """
+        fingerprint = request_fingerprint(model, messages, params)
+        with self._lock:
+            if fingerprint in self._by_fingerprint:
+                cursor = self._cursors.get(fingerprint)
+                if cursor is None:
+                    cursor = self._cursors[fingerprint] = itertools.cycle(
+                        self._by_fingerprint[fingerprint]
+                    )
+                self.stats["hits"] += 1
+                return next(cursor)
+            self.stats["misses"] += 1
+            pool = self._by_model.get(model) or self.recordings()
+        if self.on_miss == "error" or not pool:
+            raise KeyError(f"No cassette recording for {model} call {fingerprint}")
+        return random.Random(fingerprint).choice(pool)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "path": str(self.path),
+                "recordings": len(self),
+                **dict(self.stats),
+            }
+
+
+def _usage_metadata(usage: Dict[str, Any]) -> Optional[UsageMetadata]:
+    if not usage:
+        return None
+    metadata = UsageMetadata(
+        input_tokens=int(usage.get("input_tokens", 0) or 0),
+        output_tokens=int(usage.get("output_tokens", 0) or 0),
+        total_tokens=int(usage.get("total_tokens", 0) or 0),
+    )
+    for details in ("input_token_details", "output_token_details"):
+        if usage.get(details):
+            metadata[details] = usage[details]
+    return metadata
+
+
+def _split_stream(text: str) -> List[str]:
+    """
+    Word-sized pieces (whitespace kept) that concatenate back to `text`.
+    """
+    return re.findall(r"\S+\s*|\s+", text) or [""]
+
+
+class CassetteChatModel(BaseChatModel):
+    """
+    Chat model answering from a cassette with the recorded (scaled) latency;
+    streaming spreads the tokens over that time.
+    """
+
+    cassette: Any
+    model_name: str
+    time_scale: float = 1.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    def _recording(self, messages: List[BaseMessage], kwargs: Dict[str, Any]):
+        recording = self.cassette.lookup(self.model_name, messages, kwargs)
+        return recording, recording.latency_ms / 1000 * self.time_scale
+
+    def _result(self, recording: Recording) -> ChatResult:
+        message = AIMessage(
+            content=recording.content,
+            usage_metadata=_usage_metadata(recording.usage),
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, recording: Recording) -> List[ChatGenerationChunk]:
+        pieces = _split_stream(recording.content)
+        usage = _usage_metadata(recording.usage)
+        return [
+            ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content=piece,
+                    usage_metadata=usage if i == len(pieces) - 1 else None,
+                )
+            )
+            for i, piece in enumerate(pieces)
+        ]
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        recording, delay = self._recording(messages, kwargs)
+        time.sleep(delay)
+        return self._result(recording)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        recording, delay = self._recording(messages, kwargs)
+        await asyncio.sleep(delay)
+        return self._result(recording)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        recording, delay = self._recording(messages, kwargs)
+        chunks = self._chunks(recording)
+        for chunk in chunks:
+            time.sleep(delay / len(chunks))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        recording, delay = self._recording(messages, kwargs)
+        chunks = self._chunks(recording)
+        for chunk in chunks:
+            await asyncio.sleep(delay / len(chunks))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def _cassette_from_settings() -> Optional[Cassette]:
+    mode = settings.llm_cassette_mode
+    if mode not in MODES:
+        raise ValueError(f"Unknown LLM cassette mode: {mode!r}")
+    if mode == "off":
+        return None
+    cassette = Cassette(settings.llm_cassette_path, settings.llm_cassette_on_miss)
+    if mode == "replay":
+        cassette.load()
+    else:
+        atexit.register(cassette.flush)
+    logger.warning(f"LLM cassette mode '{mode}' ({settings.llm_cassette_path}).")
+    return cassette
+
+
+# Shared by every model tier; None when record/replay is off
+cassette = _cassette_from_settings()
@@ -0,0 +1,124 @@
+"""
+Content-based model routing: classify each turn with cheap local features
+(length, language, intent keywords, history size) and pick a model tier.
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, Tuple
+from app.core.config import settings
+from app.services.degradation import FAST_MODEL, LEVEL_NAMES, load_monitor
+from app.services.gemini_client import GeminiClient, gemini_client
+from app.services.state import ChatbotState
+from app.services.standard_logger import logger
+from app.utils.language import detect_language
+
+FAST_TIER = "fast"
+FULL_TIER = "full"
+MODEL_TIERS = (FAST_TIER, FULL_TIER)
+
+# Keywords that signal analytical or multi-step requests (Spanish + English)
+HARD_INTENT_KEYWORDS = (
+    "compare",
+    "comparison",
+    "contrast",
+    "analyze",
+    "analyse",
+    "analysis",
+    "essay",
+    "narrative structure",
+    "in depth",
+    "step by step",
+    "why does",
+    "compara",
+    "comparación",
+    "contrasta",
+    "analiza",
+    "análisis",
+    "ensayo",
+    "estructura narrativa",
+    "en profundidad",
+    "paso a paso",
+    "por qué",
+)
+
+# Lazily created clients, one per tier; the full tier reuses the shared client
+_tier_clients: Dict[str, GeminiClient] = {FULL_TIER: gemini_client}
+
+
+def classify_turn(text: str, history_size: int = 0) -> Tuple[str, str]:
+    """
+    Return (tier, reason) for a user turn using only local features.
+    """
+    if not settings.enable_model_routing:
+        return FULL_TIER, "routing_disabled"
+
+    lowered = text.lower()
+    if len(text) > settings.routing_fast_max_chars:
+        return FULL_TIER, f"length>{settings.routing_fast_max_chars}"
+    if history_size > settings.routing_fast_max_history:
+        return FULL_TIER, f"history>{settings.routing_fast_max_history}"
+    for keyword in HARD_INTENT_KEYWORDS:
+        if keyword in lowered:
+            return FULL_TIER, f"intent:{keyword}"
+    if len(text.split()) > 4:
+        language = detect_language(text)
+        if language not in ("es", "en"):
+            # Languages outside the prompt's es/en pair are handled better by the full model
+            return FULL_TIER, f"language:{language}"
+    return FAST_TIER, "simple_turn"
+
+
+def get_tier_client(tier: str) -> GeminiClient:
+    """
+    Return the GeminiClient bound to a tier, creating it on first use.
+    """
+    client = _tier_clients.get(tier)
+    if client is not None:
+        return client
+    if tier != FAST_TIER:
+        raise ValueError(f"Unknown model tier: {tier}")
+    client = GeminiClient(
+        model=settings.gemini_fast_model,
+        temperature=settings.gemini_fast_temperature,
+        max_output_tokens=settings.gemini_fast_max_output_tokens,
+    )
+    _tier_clients[tier] = client
+    return client
+
+
+def pool_status() -> Dict[str, Any]:
+    """
+    Return the API key pool state of every instantiated tier client.
+    """
+    return {tier: client.pool.snapshot() for tier, client in _tier_clients.items()}
+
+
+def route_model_node(state: ChatbotState) -> ChatbotState:
+    """
+    LangGraph node: classify the current turn and record the chosen tier in the state.
+    """
+    text = state.get("current_input", "") or ""
+    # History excludes the prompt prefix (system + few-shot) and the current human message
+    prefix_size = state.get("prefix_size", 1)
+    history_size = max(len(state.get("messages", []) or []) - prefix_size - 1, 0)
+    tier, reason = classify_turn(text, history_size)
+    # The degradation level is fixed here for the rest of the turn
+    level = load_monitor.level
+    if level >= FAST_MODEL and tier != FAST_TIER:
+        tier, reason = FAST_TIER, f"degraded:{LEVEL_NAMES[level]}"
+    model = get_tier_client(tier).model
+    logger.info(f"Node: Routing turn to tier={tier} model={model} ({reason}).")
+    return {
+        "model_tier": tier,
+        "model_name": model,
+        "route_reason": reason,
+        "degradation_level": level,
+    }
+
+
+def select_model_tier(state: ChatbotState) -> str:
+    """
+    Conditional-edge selector: return the tier chosen by `route_model_node`.
+    """
+    tier = state.get("model_tier") or FULL_TIER
+    return tier if tier in MODEL_TIERS else FULL_TIER
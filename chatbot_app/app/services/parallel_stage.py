@@ -0,0 +1,185 @@
+"""
+Parallel fan-out stages for the LangGraph pipeline: independent preparation nodes
+declared as branches run concurrently inside one graph node, and their state
+updates are joined into `ChatbotState` in declaration order.
+
+- Async runs (API) gather the branches on the event loop (sync nodes in the
+  default executor); sync runs (console) use one thread pool shared by all stages,
+  so a branch stuck past its timeout never starves later turns of workers.
+- A branch may have its own timeout (also bounded by the request deadline). An
+  optional branch that times out or fails is skipped for the turn; a required one
+  fails the turn. A skipped sync branch finishes in its thread, unused.
+- Joining is deterministic: `messages` lists are concatenated in branch order and,
+  for any other key written by two branches, the later-declared branch wins.
+"""
+
+from __future__ import annotations
+import asyncio
+import inspect
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, cast
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from app.services.deadline import DeadlineExceeded, check_deadline, remaining
+from app.services.state import ChatbotState
+from app.services.standard_logger import logger
+
+
+@dataclass(frozen=True)
+class Branch:
+    """
+    One preparation node of a stage: `node(state)` returns a partial state update.
+    """
+
+    name: str
+    node: Callable[[ChatbotState], Any]
+    timeout_s: Optional[float] = None  # None = bounded only by the request deadline
+    optional: bool = False  # skip the branch (instead of failing) on timeout/error
+
+
+class StageStats:
+    """
+    Thread-safe per-branch outcome counters (ok, timeout, error) and time spent.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._elapsed_ms: Dict[str, float] = defaultdict(float)
+
+    def record(self, stage: str, branch: str, outcome: str, elapsed_s: float) -> None:
+        key = f"{stage}.{branch}"
+        with self._lock:
+            self._counts[key][outcome] += 1
+            self._elapsed_ms[key] += elapsed_s * 1000
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                key: {
+                    **counts,
+                    "avg_ms": round(self._elapsed_ms[key] / sum(counts.values()), 2),
+                }
+                for key, counts in self._counts.items()
+            }
+
+
+stage_stats = StageStats()
+
+# Shared by every stage and graph (default size: min(32, CPU count + 4))
+_executor = ThreadPoolExecutor(thread_name_prefix="stage")
+
+
+def merge_updates(
+    stage: str, branches: Sequence[Branch], updates: Sequence[Optional[Dict[str, Any]]]
+) -> ChatbotState:
+    """
+    Join branch updates in declaration order (skipped branches contribute nothing).
+    """
+    merged: Dict[str, Any] = {}
+    owners: Dict[str, str] = {}
+    for branch, update in zip(branches, updates):
+        for key, value in (update or {}).items():
+            if key == "messages":
+                merged.setdefault("messages", []).extend(value or [])
+                continue
+            if key in owners:
+                logger.warning(
+                    f"Stage {stage}: '{key}' set by {owners[key]} and {branch.name}; "
+                    f"keeping {branch.name}."
+                )
+            merged[key] = value
+            owners[key] = branch.name
+    # Every key comes from a branch's (partial) ChatbotState update
+    return cast(ChatbotState, merged)
+
+
+def _call_sync(node: Callable[[ChatbotState], Any], state: ChatbotState) -> Any:
+    if inspect.iscoroutinefunction(node):
+        update = asyncio.run(node(state))  # own loop in the worker thread
+    else:
+        update = node(state)
+    return update, time.perf_counter()
+
+
+def parallel_stage(name: str, branches: Sequence[Branch]) -> RunnableLambda:
+    """
+    Return a graph node that runs `branches` concurrently and joins their updates.
+    """
+    branches = list(branches)
+
+    def _budget(
+        branch: Branch, config: RunnableConfig, started: float
+    ) -> Optional[float]:
+        # The deadline is absolute (already net of elapsed time); the branch
+        # timeout counts from the start of the stage
+        left = remaining(config)
+        if branch.timeout_s is not None:
+            branch_left = branch.timeout_s - (time.perf_counter() - started)
+            left = branch_left if left is None else min(branch_left, left)
+        return None if left is None else max(left, 0)
+
+    def _settle(
+        branch: Branch, result: Any, config: RunnableConfig, started: float
+    ) -> Optional[Dict[str, Any]]:
+        if not isinstance(result, BaseException):
+            update, finished = result
+            stage_stats.record(name, branch.name, "ok", finished - started)
+            return update
+        elapsed = time.perf_counter() - started
+        timed_out = isinstance(result, TimeoutError)
+        stage_stats.record(
+            name, branch.name, "timeout" if timed_out else "error", elapsed
+        )
+        if timed_out and (remaining(config) or 1) <= 0:
+            raise DeadlineExceeded(f"Deadline exceeded during {name}.{branch.name}")
+        if not branch.optional:
+            raise result
+        logger.warning(
+            f"Stage {name}: skipping {branch.name} for this turn "
+            f"({'timed out' if timed_out else f'failed: {result}'})."
+        )
+        return None
+
+    def run(state: ChatbotState, config: RunnableConfig) -> ChatbotState:
+        check_deadline(config, name)
+        started = time.perf_counter()
+        futures = [
+            _executor.submit(_call_sync, branch.node, state) for branch in branches
+        ]
+        updates: List[Optional[Dict[str, Any]]] = []
+        for branch, future in zip(branches, futures):
+            try:
+                result = future.result(timeout=_budget(branch, config, started))
+            except Exception as e:  # includes the wait timing out
+                result = e
+            updates.append(_settle(branch, result, config, started))
+        return merge_updates(name, branches, updates)
+
+    async def arun(state: ChatbotState, config: RunnableConfig) -> ChatbotState:
+        check_deadline(config, name)
+        started = time.perf_counter()
+
+        async def one(branch: Branch) -> Any:
+            if inspect.iscoroutinefunction(branch.node):
+                call = branch.node(state)
+            else:
+                call = asyncio.to_thread(branch.node, state)
+            update = await asyncio.wait_for(
+                call, timeout=_budget(branch, config, started)
+            )
+            return update, time.perf_counter()
+
+        results = await asyncio.gather(
+            *(one(branch) for branch in branches), return_exceptions=True
+        )
+        updates = [
+            _settle(branch, result, config, started)
+            for branch, result in zip(branches, results)
+        ]
+        return merge_updates(name, branches, updates)
+
+    return RunnableLambda(run, afunc=arun, name=name)
@@ -1,13 +1,31 @@
 """
-Defines LangGraph nodes for the chatbot and injects a system prompt from YAML (with fallback).
+Defines LangGraph nodes for the chatbot and injects a precompiled prompt prefix (with fallback).
 """
 
-from typing import List
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from app.services.deadline import DeadlineExceeded, check_deadline, remaining
+from app.services.degradation import (
+    NO_FEW_SHOT,
+    STATIC,
+    answer_cache,
+    load_monitor,
+    static_reply,
+)
 from app.services.state import ChatbotState
-from app.services.gemini_client import gemini_client
+from app.services.model_router import FULL_TIER, get_tier_client
 from app.services.standard_logger import logger
-from app.utils.prompt_loader import load_prompt
+from app.utils.prompt_registry import prompt_registry
+
+FALLBACK_SYSTEM_PROMPT = (
+    "You are a well-read literary advisor. Detect the user's language (Spanish or English) "
+    "and respond in the same language. Provide book recommendations, short summaries, "
+    "and related titles in a formal yet enthusiastic tone. Keep answers concise but "
+    "well-explained. Use bullet lists (book + brief context). Warn about spoilers."
+)
 
 
 def process_user_input(state: ChatbotState) -> ChatbotState:
@@ -15,58 +33,246 @@ def process_user_input(state: ChatbotState) -> ChatbotState:
     Convert raw user input into chat messages and attach them to the graph state.
 
     Steps:
-    - Load system prompt from `prompts/assistant.yaml`.
-    - If YAML is missing or invalid, use a fallback prompt.
-    - Add SystemMessage and HumanMessage to the message list.
+    - Select the compiled prompt from the registry (by `prompt_name`/`prompt_version`).
+    - If no prompt is available, use a fallback system prompt.
+    - Add the immutable prefix (system + few-shot) and the HumanMessage to the list.
+    - Expose the prompt's generation profile so the LLM node enforces it.
     """
     current_input = state.get("current_input", "")
     if not current_input:
         logger.warning("Node: current_input is empty or missing.")
         return {}
 
+    logger.info(f"Node: Processing user input: {current_input[:120]}...")
+
     try:
-        prompt_cfg = load_prompt()
-        system_text = prompt_cfg.persona
-    except Exception as e:
-        logger.warning(
-            f"Prompt YAML not available or invalid; using fallback. Detail: {e}"
+        compiled = prompt_registry.get(
+            state.get("prompt_name"), state.get("prompt_version")
         )
-        system_text = (
-            "You are a well-read literary advisor. Detect the user's language (Spanish or English) "
-            "and respond in the same language. Provide book recommendations, short summaries, "
-            "and related titles in a formal yet enthusiastic tone. Keep answers concise but "
-            "well-explained. Use bullet lists (book + brief context). Warn about spoilers."
-        )
-
-    logger.info(f"Node: Processing user input: {current_input[:120]}...")
+    except KeyError as e:
+        logger.warning(f"Prompt not available; using fallback. Detail: {e}")
+        return {
+            "messages": [
+                SystemMessage(content=FALLBACK_SYSTEM_PROMPT),
+                HumanMessage(content=current_input),
+            ],
+            "prefix_size": 1,
+            "generation_params": {},
+        }
 
-    new_messages = [
-        SystemMessage(content=system_text),
-        HumanMessage(content=current_input),
-    ]
-    return {"messages": new_messages}
+    new_messages = [*compiled.prefix, HumanMessage(content=current_input)]
+    return {
+        "messages": new_messages,
+        "prefix_size": len(compiled.prefix),
+        "prompt_name": compiled.name,
+        "prompt_version": compiled.version,
+        "generation_params": dict(compiled.generation),
+    }
 
 
-def llm_response_node(state: ChatbotState) -> ChatbotState:
+def llm_response_node(
+    state: ChatbotState, tier: str | None = None, config: RunnableConfig | None = None
+) -> ChatbotState:
     """
     Call the Gemini chat model with accumulated messages and attach the AI reply.
 
     Steps:
-    - Use `gemini_client` to invoke the model.
+    - Use the client of the routed model tier (full tier by default) to invoke the model.
+    - Apply the prompt's generation profile, capped by the tier's output limit.
+    - Append retrieved catalog snippets to the current message (call only, not history).
     - Store AIMessage and plain text response in the state.
+    - Record token usage (from the AIMessage usage metadata) and call latency.
+    - Pass the prompt prefix size so the client can reuse a cached prefix.
+    - Under load, degrade per the turn's level (no few-shot examples; at the
+      static level, a cached or static answer without calling the model).
     - On error, log the exception and return a fallback message.
     """
-    messages: List[BaseMessage] = state.get("messages", []) or []
-    logger.info(f"Node: Generating LLM response using {len(messages)} message(s).")
-
     try:
-        ai_msg: AIMessage = gemini_client.get_llm_instance().invoke(messages)  # type: ignore
-        text = ai_msg.content if hasattr(ai_msg, "content") else str(ai_msg)
+        degraded = _degraded_answer(state)
+        if degraded is not None:
+            return degraded
+        client, messages, params = _prepare_llm_call(state, tier)
+        check_deadline(config, "the model call")
+        started = time.perf_counter()
+        ai_msg: AIMessage = client.invoke(messages, **params)  # type: ignore
+        return _llm_result(state, ai_msg, started)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        return _llm_error(e)
 
-        logger.info("LLM response received successfully.")
-        return {"messages": [AIMessage(content=text)], "llm_response": text}
 
+async def allm_response_node(
+    state: ChatbotState, tier: str | None = None, config: RunnableConfig | None = None
+) -> ChatbotState:
+    """
+    Async variant of `llm_response_node`: the model call is bounded by the
+    request deadline and is cancelled with the request.
+    """
+    try:
+        degraded = _degraded_answer(state)
+        if degraded is not None:
+            return degraded
+        client, messages, params = _prepare_llm_call(state, tier)
+        check_deadline(config, "the model call")
+        started = time.perf_counter()
+        ai_msg: AIMessage = await asyncio.wait_for(
+            client.ainvoke(messages, **params), timeout=remaining(config)
+        )
+        return _llm_result(state, ai_msg, started)
+    except DeadlineExceeded:
+        raise
+    except asyncio.TimeoutError:
+        logger.warning("Node: Model call cancelled at the request deadline.")
+        raise DeadlineExceeded("Deadline exceeded during the model call")
     except Exception as e:
-        logger.exception(f"Error invoking LLM: {e}")
-        err = "Sorry, an error occurred while processing your request."
-        return {"messages": [AIMessage(content=err)], "llm_response": err}
+        return _llm_error(e)
+
+
+def _prepare_llm_call(
+    state: ChatbotState, tier: str | None
+) -> Tuple[Any, List[BaseMessage], Dict[str, Any]]:
+    """
+    Resolve the tier client, the messages to send and the generation parameters.
+    """
+    messages: List[BaseMessage] = state.get("messages", []) or []
+    tier = tier or state.get("model_tier") or FULL_TIER
+    logger.info(
+        f"Node: Generating LLM response using {len(messages)} message(s) on tier={tier}."
+    )
+    client = get_tier_client(tier)
+    params = dict(state.get("generation_params") or {})
+    if client.max_output_tokens and params.get("max_output_tokens"):
+        params["max_output_tokens"] = min(
+            params["max_output_tokens"], client.max_output_tokens
+        )
+    prefix_size = state.get("prefix_size", 1)
+    level = _turn_level(state)
+    if level >= NO_FEW_SHOT:
+        messages = _without_few_shot(messages, prefix_size)
+        prefix_size = sum(
+            1 for m in messages[:prefix_size] if isinstance(m, SystemMessage)
+        )
+    # The static prefix can be served from the provider's context cache
+    params["prefix_size"] = prefix_size
+    # The client degrades the call to the turn's level, not the live one
+    params["degradation_level"] = level
+    return client, _with_catalog_context(messages, state), params
+
+
+def _turn_level(state: ChatbotState) -> int:
+    """
+    Degradation level fixed by the router for this turn (live level otherwise).
+    """
+    level = state.get("degradation_level")
+    return load_monitor.level if level is None else level
+
+
+def _answer_cache_key(
+    state: ChatbotState,
+) -> Tuple[Optional[int], Optional[str], str] | None:
+    """
+    (user, prompt, question) of a first turn; None when earlier turns of the
+    conversation may shape the answer, so it must not be cached or served.
+    """
+    messages = state.get("messages", []) or []
+    if len(messages) - state.get("prefix_size", 1) > 1:
+        return None
+    return (
+        state.get("user_id"),
+        state.get("prompt_name"),
+        state.get("current_input", "") or "",
+    )
+
+
+def _degraded_answer(state: ChatbotState) -> ChatbotState | None:
+    """
+    At the static level, answer without the model: the user's cached answer to the
+    same first-turn question if there is one, else a static "busy" reply.
+    """
+    if _turn_level(state) < STATIC:
+        return None
+    question = state.get("current_input", "") or ""
+    key = _answer_cache_key(state)
+    cached = answer_cache.get(*key) if key is not None else None
+    source = "cached" if cached is not None else "static"
+    text = cached if cached is not None else static_reply(question)
+    logger.warning(f"Node: Degraded to a {source} answer; model call skipped.")
+    return {
+        "messages": [AIMessage(content=text)],
+        "llm_response": text,
+        "model_name": f"degraded:{source}",
+        "usage": {},
+        "latency_ms": 0,
+    }
+
+
+def _without_few_shot(
+    messages: List[BaseMessage], prefix_size: int
+) -> List[BaseMessage]:
+    """
+    Drop the few-shot examples from the prompt prefix (keep the system message).
+    """
+    system = [m for m in messages[:prefix_size] if isinstance(m, SystemMessage)]
+    return [*system, *messages[prefix_size:]]
+
+
+def _llm_result(state: ChatbotState, ai_msg: AIMessage, started: float) -> ChatbotState:
+    latency_ms = int((time.perf_counter() - started) * 1000)
+    # `content` may be a list of blocks (text, thinking, ...); keep the text only
+    text = ai_msg.text if isinstance(ai_msg, BaseMessage) else str(ai_msg)
+    key = _answer_cache_key(state)
+    if key is not None:
+        answer_cache.put(*key, text)
+
+    usage = dict(getattr(ai_msg, "usage_metadata", None) or {})
+    cache_read = (usage.get("input_token_details") or {}).get("cache_read") or 0
+    logger.info(
+        f"LLM response received successfully in {latency_ms} ms "
+        f"(in={usage.get('input_tokens', 0)}, out={usage.get('output_tokens', 0)})."
+    )
+    return {
+        "messages": [AIMessage(content=text)],
+        "llm_response": text,
+        "usage": usage,
+        "latency_ms": latency_ms,
+        "cache_hit": cache_read > 0,
+    }
+
+
+def _llm_error(e: Exception) -> ChatbotState:
+    logger.exception(f"Error invoking LLM: {e}")
+    err = "Sorry, an error occurred while processing your request."
+    return {"messages": [AIMessage(content=err)], "llm_response": err}
+
+
+def _with_catalog_context(
+    messages: List[BaseMessage], state: ChatbotState
+) -> List[BaseMessage]:
+    """
+    Return the messages to send, with catalog snippets attached to the last user turn.
+    """
+    context = state.get("catalog_context")
+    if not context or not messages or not isinstance(messages[-1], HumanMessage):
+        return messages
+    last = messages[-1]
+    return [*messages[:-1], HumanMessage(content=f"{last.content}\n\n{context}")]
+
+
+def build_llm_node(tier: str) -> RunnableLambda:
+    """
+    Return an LLM node bound to a fixed model tier (one node per tier in the graph).
+    Sync runs (console) use the blocking call; async runs (API) the cancellable one.
+    """
+
+    def _tier_llm_node(state: ChatbotState, config: RunnableConfig) -> ChatbotState:
+        return llm_response_node(state, tier=tier, config=config)
+
+    async def _atier_llm_node(
+        state: ChatbotState, config: RunnableConfig
+    ) -> ChatbotState:
+        return await allm_response_node(state, tier=tier, config=config)
+
+    return RunnableLambda(
+        _tier_llm_node, afunc=_atier_llm_node, name=f"llm_{tier}_node"
+    )
@@ -0,0 +1,282 @@
+"""
+Conversation retention pipeline: archive expired rows in chunks to compressed files,
+delete them in short write transactions, then reclaim space with incremental vacuum.
+
+Retention windows come from settings: a global window (`retention_days`) and optional
+per-user overrides (`retention_user_days`, e.g. "alice=30,bob=7"). 0 keeps forever.
+
+CLI, from chatbot_app/:
+    python -m app.services.retention --dry-run
+    python -m app.services.retention --enable-incremental-vacuum   # one-time VACUUM
+"""
+
+from __future__ import annotations
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from sqlalchemy import RowMapping, and_, or_, select, text
+from app.core.config import settings
+from app.db.models.conversation import Conversation
+from app.db.models.user import User
+from app.db.session import ReadSessionLocal, SessionLocal, engine, is_sqlite
+from app.services.standard_logger import logger
+
+ARCHIVE_COLUMNS = list(Conversation.__table__.columns)
+
+
+def parse_user_days(raw: str) -> Dict[str, int]:
+    """
+    Parse "alice=30,bob=7" into {"alice": 30, "bob": 7}.
+    """
+    overrides: Dict[str, int] = {}
+    for item in filter(None, (part.strip() for part in raw.split(","))):
+        username, _, days = item.partition("=")
+        overrides[username.strip()] = int(days)
+    return overrides
+
+
+def _expired_filter(db, now: datetime):
+    """
+    Build the WHERE clause selecting expired conversations (None if nothing expires).
+    """
+    overrides = parse_user_days(settings.retention_user_days)
+    user_ids = dict(
+        db.query(User.username, User.id).filter(User.username.in_(overrides)).all()
+        if overrides
+        else []
+    )
+    clauses = []
+    for username, days in overrides.items():
+        uid = user_ids.get(username)
+        if uid is not None and days > 0:
+            clauses.append(
+                and_(
+                    Conversation.user_id == uid,
+                    Conversation.created_at < now - timedelta(days=days),
+                )
+            )
+    if settings.retention_days > 0:
+        global_clause = Conversation.created_at < now - timedelta(
+            days=settings.retention_days
+        )
+        if user_ids:
+            # Users with an override follow their own window only
+            global_clause = and_(
+                global_clause, Conversation.user_id.notin_(list(user_ids.values()))
+            )
+        clauses.append(global_clause)
+    return or_(*clauses) if clauses else None
+
+
+def _row_to_dict(row: RowMapping) -> Dict[str, Any]:
+    return {
+        name: value.isoformat() if isinstance(value, datetime) else value
+        for name, value in row.items()
+    }
+
+
+def write_archive(records: List[Dict[str, Any]], archive_dir: Path, stem: str) -> Path:
+    """
+    Write one chunk to Parquet (if pyarrow is installed and selected) or gzip NDJSON.
+    The file is fsynced before returning, so rows are only deleted once archived.
+    """
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    if settings.retention_archive_format == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            path = archive_dir / f"{stem}.parquet"
+            table = pa.Table.from_pylist(records)
+            pq.write_table(table, path, compression="zstd")
+            with open(path, "rb") as f:
+                os.fsync(f.fileno())
+            return path
+        except ImportError:
+            logger.warning("pyarrow not installed; archiving as gzip NDJSON instead.")
+
+    path = archive_dir / f"{stem}.ndjson.gz"
+    with open(path, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as gz:
+            for record in records:
+                gz.write(
+                    (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+                )
+        raw.flush()
+        os.fsync(raw.fileno())
+    return path
+
+
+def _vacuum_step(max_pages: int) -> int:
+    """
+    Free up to `max_pages` pages on a freshly checked-out connection, then hand
+    it back to the pool. Returns the number of pages freed.
+    """
+    raw = engine.raw_connection()
+    try:
+        # Raw driver connection: the pragma frees one page per step, and only
+        # executescript() steps it to completion
+        sqlite_conn = raw.driver_connection
+        free_pages = sqlite_conn.execute("PRAGMA freelist_count").fetchone()[0]
+        step = min(free_pages, max_pages)
+        if step:
+            sqlite_conn.executescript(f"PRAGMA incremental_vacuum({int(step)})")
+        return step
+    finally:
+        raw.close()
+
+
+def incremental_vacuum(max_pages: int, pause_s: float) -> int:
+    """
+    Free pages in bounded steps so the write lock is never held for long: each
+    step checks a connection out and returns it, and the pause between steps
+    holds no connection, so live writers get the lock in between.
+    Returns the number of pages released (0 unless auto_vacuum=INCREMENTAL).
+    """
+    if not is_sqlite:
+        return 0
+    with engine.connect() as conn:
+        mode = conn.execute(text("PRAGMA auto_vacuum")).scalar()
+    if mode != 2:
+        logger.info("auto_vacuum is not INCREMENTAL; skipping incremental vacuum.")
+        return 0
+    freed = 0
+    while True:
+        step = _vacuum_step(max_pages)
+        freed += step
+        if step < max_pages:  # the freelist is drained
+            break
+        time.sleep(pause_s)
+    return freed
+
+
+def enable_incremental_vacuum() -> None:
+    """
+    One-time conversion of an existing database to auto_vacuum=INCREMENTAL.
+    Runs a full VACUUM, so schedule it in a maintenance window.
+    """
+    with engine.connect() as conn:
+        conn.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+        conn.execute(text("VACUUM"))
+        mode = conn.execute(text("PRAGMA auto_vacuum")).scalar()
+    logger.info(f"auto_vacuum is now {mode} (2 = INCREMENTAL).")
+
+
+def run_retention(
+    dry_run: bool = False, now: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Archive and delete expired conversations chunk by chunk, then vacuum.
+    """
+    now = now or datetime.utcnow()
+    chunk_size = settings.retention_chunk_size
+    pause_s = settings.retention_batch_pause_ms / 1000
+    archive_dir = Path(settings.retention_archive_dir)
+    stem = f"conversations-{now:%Y%m%dT%H%M%S}"
+    report: Dict[str, Any] = {
+        "archived": 0,
+        "deleted": 0,
+        "files": [],
+        "freed_pages": 0,
+    }
+
+    read_db = ReadSessionLocal()
+    try:
+        where = _expired_filter(read_db, now)
+        if where is None:
+            logger.info("Retention disabled (no global or per-user window).")
+            return report
+        if dry_run:
+            report["expired"] = read_db.query(Conversation.id).filter(where).count()
+            return report
+
+        last_id = 0
+        part = 0
+        while True:
+            # Plain column values (Core select, no ORM instances): nothing is
+            # deferred or expired, so the chunk is fetched by this one query
+            rows = read_db.execute(
+                select(*ARCHIVE_COLUMNS)
+                .where(where, Conversation.id > last_id)
+                .order_by(Conversation.id)
+                .limit(chunk_size)
+            ).mappings()
+            records = [_row_to_dict(r) for r in rows]
+            read_db.rollback()  # end the read snapshot so WAL checkpoints can progress
+            if not records:
+                break
+            ids = [record["id"] for record in records]
+            last_id = ids[-1]
+            path = write_archive(records, archive_dir, f"{stem}-{part:04d}")
+
+            # Short write transaction per chunk, then yield the lock to other writers
+            write_db = SessionLocal()
+            try:
+                deleted = (
+                    write_db.query(Conversation)
+                    .filter(Conversation.id.in_(ids))
+                    .delete(synchronize_session=False)
+                )
+                write_db.commit()
+            finally:
+                write_db.close()
+
+            report["archived"] += len(records)
+            report["deleted"] += deleted
+            report["files"].append(str(path))
+            part += 1
+            time.sleep(pause_s)
+    finally:
+        read_db.close()
+
+    if report["deleted"]:
+        report["freed_pages"] = incremental_vacuum(
+            settings.retention_vacuum_pages, pause_s
+        )
+    logger.info(
+        f"Retention run: archived={report['archived']} deleted={report['deleted']} "
+        f"files={len(report['files'])} freed_pages={report['freed_pages']}."
+    )
+    return report
+
+
+async def retention_scheduler() -> None:
+    """
+    Background loop for the FastAPI app: run the pipeline every N hours.
+    """
+    interval = settings.retention_interval_hours * 3600
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(run_retention)
+        except Exception as e:
+            logger.exception(f"Scheduled retention run failed: {e}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Archive and delete expired conversations."
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Only count expired rows"
+    )
+    parser.add_argument(
+        "--enable-incremental-vacuum",
+        action="store_true",
+        help="Convert the database to auto_vacuum=INCREMENTAL (runs a full VACUUM)",
+    )
+    args = parser.parse_args()
+
+    if args.enable_incremental_vacuum:
+        enable_incremental_vacuum()
+    print(json.dumps(run_retention(dry_run=args.dry_run), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ Typed state container used by LangGraph to carry inputs, messages, and outputs.
 """
 
 from typing import (
+    Any,
+    Dict,
     TypedDict,
     Annotated,
     List,
@@ -23,3 +25,31 @@ class ChatbotState(TypedDict, total=False):
 
     # Final LLM-produced text for the turn (printed to console)
     llm_response: Optional[str]
+
+    # Prompt selection (name/version from the caller) and the resolved prompt's profile
+    prompt_name: Optional[str]
+    prompt_version: Optional[str]
+    prefix_size: int
+    generation_params: Dict[str, Any]
+
+    # Guardrail that short-circuited the turn (None when the model is called)
+    guardrail: Optional[str]
+
+    # Compact catalog snippets retrieved for the turn (added to the model call only)
+    catalog_context: Optional[str]
+
+    # Model routing decision for the turn (tier name, concrete model and why)
+    model_tier: Optional[str]
+    model_name: Optional[str]
+    route_reason: Optional[str]
+
+    # Degradation level applied to the turn (see app.services.degradation)
+    degradation_level: int
+
+    # Authenticated user of the turn (API/WebSocket; None for local runs)
+    user_id: Optional[int]
+
+    # Usage accounting for the turn (AIMessage usage metadata + model call latency)
+    usage: Dict[str, Any]
+    latency_ms: int
+    cache_hit: bool
@@ -0,0 +1,461 @@
+"""
+In-process background task queue for work that does not need to finish before
+the response is sent (rollups, trace finalization, summaries, ...).
+
+- Task types are registered with `@task_queue.task(name, ...)`, each with its own
+  concurrency limit and retry budget.
+- Durable types are stored in the `background_tasks` table, so they survive
+  restarts; claims are atomic UPDATEs with a lease, so several workers can share
+  the table. Non-durable types live in memory only.
+- Failures are retried with exponential backoff and jitter; tasks that exhaust
+  their attempts are kept as "dead".
+- Handlers are either `def handler(payload, db)` (run in a thread; for durable
+  tasks the task row is deleted in the same transaction, so the work commits
+  exactly once) or `async def handler(payload)`.
+
+The dispatcher runs on the app's event loop between startup and shutdown.
+"""
+
+from __future__ import annotations
+import asyncio
+import heapq
+import inspect
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+from sqlalchemy import and_, event, func, or_, select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.models.background_task import BackgroundTask
+from app.db.session import ReadSessionLocal, SessionLocal
+from app.services.standard_logger import logger
+
+PENDING = "pending"
+RUNNING = "running"
+DEAD = "dead"
+
+
+@dataclass
+class TaskType:
+    name: str
+    handler: Callable[..., Any]
+    concurrency: int
+    max_attempts: int
+    durable: bool
+
+    @property
+    def is_async(self) -> bool:
+        return inspect.iscoroutinefunction(self.handler)
+
+
+@dataclass(order=True)
+class _Task:
+    run_at: float  # time.monotonic() for memory tasks (heap order)
+    seq: int
+    payload: Dict[str, Any] = field(compare=False)
+    attempts: int = field(compare=False, default=0)
+    row_id: Optional[int] = field(compare=False, default=None)
+
+
+def retry_delay(attempts: int) -> float:
+    """
+    Exponential backoff with jitter: base * 2^(attempts-1), capped, times 0.5-1.0.
+    """
+    delay = min(
+        settings.background_retry_base_seconds * 2 ** max(attempts - 1, 0),
+        settings.background_retry_max_seconds,
+    )
+    return delay * random.uniform(0.5, 1.0)
+
+
+class TaskQueue:
+    """
+    Registry, dispatcher and metrics for background tasks.
+    """
+
+    def __init__(self) -> None:
+        self._types: Dict[str, TaskType] = {}
+        self._memory: Dict[str, List[_Task]] = defaultdict(list)
+        self._memory_lock = threading.Lock()
+        self._seq = itertools.count()
+        self._running: Counter = Counter()
+        self._metrics: Dict[str, Counter] = defaultdict(Counter)
+        self._latency_ms: Counter = Counter()
+        self._inflight: set = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._dispatcher is not None and not self._dispatcher.done()
+
+    def task(
+        self,
+        name: str,
+        concurrency: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        durable: bool = True,
+    ) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        """
+        Decorator registering a handler for a task type.
+        """
+
+        def register(handler: Callable[..., Any]) -> Callable[..., Any]:
+            self._types[name] = TaskType(
+                name=name,
+                handler=handler,
+                concurrency=concurrency or settings.background_task_concurrency,
+                max_attempts=max_attempts or settings.background_task_max_attempts,
+                durable=durable,
+            )
+            return handler
+
+        return register
+
+    # ---- producer side ----
+
+    def enqueue(
+        self,
+        name: str,
+        payload: Dict[str, Any],
+        delay: float = 0.0,
+        db: Optional[Session] = None,
+    ) -> None:
+        """
+        Queue a task. Pass the caller's session to store a durable task in the
+        same transaction as the caller's own writes (it runs after that commit).
+        """
+        spec = self._types.get(name)
+        if spec is None:
+            raise KeyError(f"Unknown task type: {name}")
+        self._metrics[name]["enqueued"] += 1
+
+        if not spec.durable:
+            with self._memory_lock:
+                heapq.heappush(
+                    self._memory[name],
+                    _Task(time.monotonic() + delay, next(self._seq), payload),
+                )
+            self.notify()
+            return
+
+        row = BackgroundTask(
+            task_type=name,
+            payload=json.dumps(payload, ensure_ascii=False),
+            status=PENDING,
+            attempts=0,
+            run_at=datetime.utcnow() + timedelta(seconds=delay),
+        )
+        if db is not None:
+            db.add(row)
+            event.listen(db, "after_commit", lambda _: self.notify(), once=True)
+            return
+        own = SessionLocal()
+        try:
+            own.add(row)
+            own.commit()
+        finally:
+            own.close()
+        self.notify()
+
+    def notify(self) -> None:
+        """
+        Wake the dispatcher (safe from any thread).
+        """
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    # ---- lifecycle ----
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._dispatcher = asyncio.create_task(self._dispatch(self._wake))
+        logger.info(f"Background task queue started ({len(self._types)} task type(s)).")
+
+    async def stop(self) -> None:
+        """
+        Stop claiming work, give running tasks a short drain window, then cancel
+        them (durable ones are released and run again after restart).
+        """
+        if self._dispatcher is None:
+            return
+        # The flag also ends the loop if wait_for() swallows the cancellation
+        # (Python < 3.12 does when the wake event fires at the same moment)
+        self._stopping = True
+        self._dispatcher.cancel()
+        await asyncio.gather(self._dispatcher, return_exceptions=True)
+        self._dispatcher = None
+        if self._inflight:
+            _, pending = await asyncio.wait(
+                self._inflight, timeout=settings.background_drain_seconds
+            )
+            for t in pending:
+                t.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        self._loop = self._wake = None
+        logger.info("Background task queue stopped.")
+
+    # ---- dispatcher ----
+
+    async def _dispatch(self, wake: asyncio.Event) -> None:
+        while not self._stopping:
+            wake.clear()
+            try:
+                ready = await asyncio.to_thread(self._ready_durable_types)
+                for spec in self._types.values():
+                    free = spec.concurrency - self._running[spec.name]
+                    if free <= 0:
+                        continue
+                    if spec.durable:
+                        if spec.name not in ready:
+                            continue
+                        batch = await asyncio.to_thread(self._claim, spec.name, free)
+                    else:
+                        batch = self._pop_memory(spec.name, free)
+                    for task in batch:
+                        self._start(spec, task)
+            except Exception as e:
+                logger.error(f"Background task dispatcher error: {e}")
+            try:
+                await asyncio.wait_for(
+                    wake.wait(), timeout=settings.background_poll_interval_seconds
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    def _ready_filter(self, now: datetime):
+        return or_(
+            and_(BackgroundTask.status == PENDING, BackgroundTask.run_at <= now),
+            and_(BackgroundTask.status == RUNNING, BackgroundTask.locked_until < now),
+        )
+
+    def _ready_durable_types(self) -> set:
+        """
+        Cheap read-pool check, so idle polling never takes the write lock.
+        """
+        durable = [t.name for t in self._types.values() if t.durable]
+        if not durable:
+            return set()
+        db = ReadSessionLocal()
+        try:
+            rows = (
+                db.query(BackgroundTask.task_type)
+                .filter(BackgroundTask.task_type.in_(durable))
+                .filter(self._ready_filter(datetime.utcnow()))
+                .distinct()
+                .all()
+            )
+            return {row[0] for row in rows}
+        finally:
+            db.close()
+
+    def _claim(self, name: str, limit: int) -> List[_Task]:
+        """
+        Atomically mark up to `limit` ready rows as running (with a lease).
+        """
+        now = datetime.utcnow()
+        ready_ids = (
+            select(BackgroundTask.id)
+            .where(BackgroundTask.task_type == name, self._ready_filter(now))
+            .order_by(BackgroundTask.run_at)
+            .limit(limit)
+            .scalar_subquery()
+        )
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                update(BackgroundTask)
+                .where(BackgroundTask.id.in_(ready_ids))
+                .values(
+                    status=RUNNING,
+                    attempts=BackgroundTask.attempts + 1,
+                    locked_until=now
+                    + timedelta(seconds=settings.background_task_lease_seconds),
+                )
+                .returning(
+                    BackgroundTask.id, BackgroundTask.payload, BackgroundTask.attempts
+                )
+            ).all()
+            db.commit()
+        finally:
+            db.close()
+        return [
+            _Task(0.0, next(self._seq), json.loads(payload), attempts, row_id)
+            for row_id, payload, attempts in rows
+        ]
+
+    def _pop_memory(self, name: str, limit: int) -> List[_Task]:
+        batch: List[_Task] = []
+        now = time.monotonic()
+        with self._memory_lock:
+            heap = self._memory[name]
+            while heap and len(batch) < limit and heap[0].run_at <= now:
+                task = heapq.heappop(heap)
+                task.attempts += 1
+                batch.append(task)
+        return batch
+
+    # ---- execution ----
+
+    def _start(self, spec: TaskType, task: _Task) -> None:
+        self._running[spec.name] += 1
+        runner = asyncio.create_task(self._execute(spec, task))
+        self._inflight.add(runner)
+        runner.add_done_callback(self._inflight.discard)
+
+    async def _execute(self, spec: TaskType, task: _Task) -> None:
+        started = time.perf_counter()
+        try:
+            if spec.is_async:
+                await spec.handler(task.payload)
+                if task.row_id is not None:
+                    await asyncio.to_thread(self._complete, task.row_id)
+            else:
+                await asyncio.to_thread(self._run_sync, spec, task)
+        except asyncio.CancelledError:
+            if task.row_id is not None:
+                self._release(task.row_id)
+            raise
+        except Exception as e:
+            await asyncio.to_thread(self._fail, spec, task, e)
+        else:
+            self._metrics[spec.name]["succeeded"] += 1
+            self._latency_ms[spec.name] += int((time.perf_counter() - started) * 1000)
+        finally:
+            self._running[spec.name] -= 1
+            self.notify()
+
+    def _run_sync(self, spec: TaskType, task: _Task) -> None:
+        db = SessionLocal()
+        try:
+            spec.handler(task.payload, db)
+            if task.row_id is not None:
+                db.query(BackgroundTask).filter_by(id=task.row_id).delete()
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _complete(self, row_id: int) -> None:
+        db = SessionLocal()
+        try:
+            db.query(BackgroundTask).filter_by(id=row_id).delete()
+            db.commit()
+        finally:
+            db.close()
+
+    def _release(self, row_id: int) -> None:
+        """
+        Return a cancelled durable task to the queue (the attempt is not counted).
+        """
+        db = SessionLocal()
+        try:
+            db.query(BackgroundTask).filter_by(id=row_id).update(
+                {
+                    "status": PENDING,
+                    "attempts": BackgroundTask.attempts - 1,
+                    "locked_until": None,
+                }
+            )
+            db.commit()
+        except Exception as e:
+            logger.warning(f"Could not release background task {row_id}: {e}")
+        finally:
+            db.close()
+
+    def _fail(self, spec: TaskType, task: _Task, error: Exception) -> None:
+        metrics = self._metrics[spec.name]
+        metrics["failed"] += 1
+        dead = task.attempts >= spec.max_attempts
+        delay = 0.0 if dead else retry_delay(task.attempts)
+        if dead:
+            metrics["dead"] += 1
+            logger.error(
+                f"Background task {spec.name} failed {task.attempts} time(s); giving up: {error}"
+            )
+        else:
+            metrics["retried"] += 1
+            logger.warning(
+                f"Background task {spec.name} failed (attempt {task.attempts}); "
+                f"retrying in {delay:.1f}s: {error}"
+            )
+
+        if task.row_id is None:
+            if not dead:
+                task.run_at = time.monotonic() + delay
+                with self._memory_lock:
+                    heapq.heappush(self._memory[spec.name], task)
+            return
+
+        db = SessionLocal()
+        try:
+            db.query(BackgroundTask).filter_by(id=task.row_id).update(
+                {
+                    "status": DEAD if dead else PENDING,
+                    "run_at": datetime.utcnow() + timedelta(seconds=delay),
+                    "locked_until": None,
+                    "last_error": str(error)[:2000],
+                }
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    # ---- metrics ----
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Per-type counters plus current queue depth (pending/dead rows, memory heap).
+        """
+        depth: Dict[str, Counter] = defaultdict(Counter)
+        db = ReadSessionLocal()
+        try:
+            for task_type, status, count in (
+                db.query(BackgroundTask.task_type, BackgroundTask.status, func.count())
+                .group_by(BackgroundTask.task_type, BackgroundTask.status)
+                .all()
+            ):
+                depth[task_type][status] = count
+        finally:
+            db.close()
+        with self._memory_lock:
+            for name, heap in self._memory.items():
+                depth[name][PENDING] += len(heap)
+
+        types = {}
+        for name, spec in self._types.items():
+            metrics = self._metrics[name]
+            types[name] = {
+                "durable": spec.durable,
+                "concurrency": spec.concurrency,
+                "running": self._running[name],
+                "queued": depth[name][PENDING],
+                "dead": depth[name][DEAD] if spec.durable else metrics["dead"],
+                **{
+                    key: metrics[key]
+                    for key in ("enqueued", "succeeded", "failed", "retried")
+                },
+                "avg_ms": (
+                    round(self._latency_ms[name] / metrics["succeeded"], 1)
+                    if metrics["succeeded"]
+                    else 0
+                ),
+            }
+        return {"running": self.running, "types": types}
+
+
+task_queue = TaskQueue()
@@ -0,0 +1,255 @@
+"""
+Maintenance for compressed conversation text (see `app.db.compressed_text`):
+train a zstd dictionary from stored turns, rewrite existing rows in batches, and
+report storage size and read/write cost.
+
+CLI, from chatbot_app/:
+    python -m app.services.text_compression report
+    python -m app.services.text_compression train      # then set TEXT_COMPRESSION_DICT_ID
+    python -m app.services.text_compression migrate    # prints the report before/after
+    python -m app.services.text_compression migrate --all   # re-encode compressed rows too
+    python -m app.services.text_compression migrate --vacuum   # then shrink the file
+
+Rewritten rows shrink in place, so the database file only gets smaller after a VACUUM
+(pages that become entirely free are returned by incremental vacuum, if enabled).
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import time
+from typing import Any, Dict, List, Optional, Union
+from sqlalchemy import text
+from sqlalchemy.orm import undefer_group
+from app.core.config import settings
+from app.db.compressed_text import dictionary_path, text_codec, zstandard
+from app.db.models.conversation import Conversation
+from app.db.session import ReadSessionLocal, SessionLocal, is_sqlite, read_engine
+from app.services.retention import enable_incremental_vacuum, incremental_vacuum
+from app.services.standard_logger import logger
+
+TEXT_COLUMNS = ("message", "response")
+
+
+def _stored_sizes(db) -> Dict[str, int]:
+    """
+    Bytes stored for the text columns and how many values are compressed BLOBs.
+    """
+    if not is_sqlite:  # typeof() is SQLite-specific
+        return {}
+    row = db.execute(
+        text(
+            "SELECT COUNT(*),"
+            " COALESCE(SUM(LENGTH(CAST(message AS BLOB))"
+            " + LENGTH(CAST(response AS BLOB))), 0),"
+            " COALESCE(SUM((typeof(message) = 'blob') + (typeof(response) = 'blob')), 0)"
+            " FROM conversations"
+        )
+    ).one()
+    return {"rows": row[0], "text_bytes": row[1], "compressed_values": row[2]}
+
+
+def _file_sizes(db) -> Dict[str, int]:
+    if not is_sqlite:
+        return {}
+    page_size = db.execute(text("PRAGMA page_size")).scalar()
+    return {
+        "db_bytes": db.execute(text("PRAGMA page_count")).scalar() * page_size,
+        "free_bytes": db.execute(text("PRAGMA freelist_count")).scalar() * page_size,
+    }
+
+
+def measure_cost(sample: int = 200) -> Dict[str, Any]:
+    """
+    Per-row cost on the newest `sample` turns: reading them through the ORM
+    (query + decompression) and encoding them with the current codec.
+    """
+    db = ReadSessionLocal()
+    try:
+        started = time.perf_counter()
+        rows = (
+            db.query(Conversation)
+            .options(undefer_group("text"))
+            .order_by(Conversation.id.desc())
+            .limit(sample)
+            .all()
+        )
+        read_s = time.perf_counter() - started
+        values = [getattr(row, col) for row in rows for col in TEXT_COLUMNS]
+    finally:
+        db.close()
+    if not rows:
+        return {"sample_rows": 0}
+
+    started = time.perf_counter()
+    for value in values:
+        text_codec.encode(value)
+    encode_s = time.perf_counter() - started
+    return {
+        "sample_rows": len(rows),
+        "read_us_per_row": round(read_s / len(rows) * 1e6, 1),
+        "encode_us_per_row": round(encode_s / len(rows) * 1e6, 1),
+    }
+
+
+def size_report(sample: int = 200) -> Dict[str, Any]:
+    """
+    Storage and cost snapshot for the conversations table.
+    """
+    db = ReadSessionLocal()
+    try:
+        report: Dict[str, Any] = {
+            "codec": text_codec.codec,
+            "dict_id": text_codec.dict_id,
+            **_stored_sizes(db),
+            **_file_sizes(db),
+        }
+    finally:
+        db.close()
+    report.update(measure_cost(sample))
+    return report
+
+
+def train_dictionary(sample_rows: int = 5000, dict_size: Optional[int] = None) -> int:
+    """
+    Train a zstd dictionary on the newest turns and save it to the dictionary
+    directory. Returns its id; set TEXT_COMPRESSION_DICT_ID to use it.
+    """
+    if zstandard is None:
+        raise RuntimeError("zstandard is required to train a dictionary")
+    db = ReadSessionLocal()
+    try:
+        rows = (
+            db.query(Conversation)
+            .options(undefer_group("text"))
+            .order_by(Conversation.id.desc())
+            .limit(sample_rows)
+            .all()
+        )
+        samples: List[bytes] = [
+            getattr(row, col).encode("utf-8") for row in rows for col in TEXT_COLUMNS
+        ]
+    finally:
+        db.close()
+    if not samples:
+        raise ValueError("No conversations to train a dictionary from")
+
+    dictionary = zstandard.train_dictionary(
+        dict_size or settings.text_compression_dict_size, samples
+    )
+    path = dictionary_path(settings.text_compression_dict_dir, dictionary.dict_id())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(dictionary.as_bytes())
+    text_codec.reload_dictionaries()
+    logger.info(
+        f"Trained zstd dictionary {dictionary.dict_id()} from {len(samples)} values: {path}"
+    )
+    return dictionary.dict_id()
+
+
+def migrate(rewrite_all: bool = False) -> Dict[str, Any]:
+    """
+    Re-encode stored text with the current codec, one short write transaction per
+    batch. Plain values are always considered; already compressed ones only with
+    `rewrite_all` (e.g. after training a dictionary, or with TEXT_COMPRESSION=none
+    to decompress everything).
+    """
+    report = {"scanned": 0, "rewritten": 0, "freed_pages": 0}
+    if not is_sqlite:
+        logger.warning("Text compression migration is SQLite only; skipping.")
+        return report
+    batch_size = settings.text_compression_batch_size
+    pause_s = settings.retention_batch_pause_ms / 1000
+
+    last_id = 0
+    while True:
+        # Raw stored values (no type processing), to tell TEXT from compressed BLOBs
+        with read_engine.connect() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT id, message, response FROM conversations"
+                    " WHERE id > :last_id ORDER BY id LIMIT :limit"
+                ),
+                {"last_id": last_id, "limit": batch_size},
+            ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        report["scanned"] += len(rows)
+
+        updates = []
+        for row_id, *stored in rows:
+            new_values: Dict[str, Union[str, bytes]] = {}
+            for col, value in zip(TEXT_COLUMNS, stored):
+                if isinstance(value, bytes) and not rewrite_all:
+                    new_values[col] = value
+                    continue
+                new_values[col] = text_codec.encode(text_codec.decode(value))
+            if [new_values[col] for col in TEXT_COLUMNS] != stored:
+                updates.append({"id": row_id, **new_values})
+        if updates:
+            write_db = SessionLocal()
+            try:
+                write_db.execute(
+                    text(
+                        "UPDATE conversations SET message = :message,"
+                        " response = :response WHERE id = :id"
+                    ),
+                    updates,
+                )
+                write_db.commit()
+            finally:
+                write_db.close()
+            report["rewritten"] += len(updates)
+        time.sleep(pause_s)
+
+    if report["rewritten"]:
+        report["freed_pages"] = incremental_vacuum(
+            settings.retention_vacuum_pages, pause_s
+        )
+    logger.info(
+        f"Text compression migration: scanned={report['scanned']} "
+        f"rewritten={report['rewritten']} freed_pages={report['freed_pages']}."
+    )
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compressed conversation text maintenance."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    report_cmd = sub.add_parser("report", help="Storage size and read/write cost")
+    report_cmd.add_argument("--sample", type=int, default=200)
+    train_cmd = sub.add_parser("train", help="Train a zstd dictionary")
+    train_cmd.add_argument("--sample-rows", type=int, default=5000)
+    train_cmd.add_argument("--dict-size", type=int, default=None)
+    migrate_cmd = sub.add_parser("migrate", help="Rewrite existing rows in batches")
+    migrate_cmd.add_argument(
+        "--all",
+        action="store_true",
+        help="Also re-encode values that are already compressed",
+    )
+    migrate_cmd.add_argument(
+        "--vacuum",
+        action="store_true",
+        help="Run a full VACUUM afterwards (also enables incremental auto_vacuum)",
+    )
+    migrate_cmd.add_argument("--sample", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.command == "report":
+        result: Dict[str, Any] = size_report(args.sample)
+    elif args.command == "train":
+        result = {"dict_id": train_dictionary(args.sample_rows, args.dict_size)}
+    else:
+        before = size_report(args.sample)
+        migration = migrate(rewrite_all=args.all)
+        if args.vacuum:
+            enable_incremental_vacuum()
+        result = {"before": before, **migration, "after": size_report(args.sample)}
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
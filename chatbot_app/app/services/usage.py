@@ -0,0 +1,170 @@
+"""
+Per-turn usage accounting: persist a conversation turn with its token counts,
+model and latency, and update the hourly rollup in the same transaction.
+"""
+
+from __future__ import annotations
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.db.models.conversation import Conversation
+from app.db.models.usage_rollup import UsageRollup
+from app.services.task_queue import task_queue
+
+# Additive counters kept per (user, model, hour) bucket
+ROLLUP_COUNTERS = (
+    "turns",
+    "input_tokens",
+    "output_tokens",
+    "latency_ms_total",
+    "cache_hits",
+)
+
+
+def hour_bucket(moment: Optional[datetime] = None) -> datetime:
+    """
+    Truncate a UTC timestamp to the start of its hour.
+    """
+    moment = moment or datetime.utcnow()
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def usage_from_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract the usage fields recorded by the graph for one turn.
+    """
+    usage = result.get("usage") or {}
+    return {
+        "model": result.get("model_name"),
+        "input_tokens": int(usage.get("input_tokens", 0) or 0),
+        "output_tokens": int(usage.get("output_tokens", 0) or 0),
+        "latency_ms": int(result.get("latency_ms", 0) or 0),
+        "cache_hit": bool(result.get("cache_hit", False)),
+    }
+
+
+def _increment_rollup(db: Session, convo: Conversation) -> None:
+    """
+    Add one turn to its (user, model, hour) bucket with a single upsert.
+    """
+    values = {
+        "user_id": convo.user_id,
+        "model": convo.model or "unknown",
+        "bucket_start": hour_bucket(convo.created_at),
+        "turns": 1,
+        "input_tokens": convo.input_tokens or 0,
+        "output_tokens": convo.output_tokens or 0,
+        "latency_ms_total": convo.latency_ms or 0,
+        "cache_hits": 1 if convo.cache_hit else 0,
+    }
+    if db.get_bind().dialect.name == "sqlite":
+        stmt = sqlite_insert(UsageRollup).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "model", "bucket_start"],
+            set_={
+                col: getattr(UsageRollup, col) + getattr(stmt.excluded, col)
+                for col in ROLLUP_COUNTERS
+            },
+        )
+        db.execute(stmt)
+        return
+
+    # Portable fallback for other databases
+    row = (
+        db.query(UsageRollup)
+        .filter_by(
+            user_id=values["user_id"],
+            model=values["model"],
+            bucket_start=values["bucket_start"],
+        )
+        .with_for_update()
+        .first()
+    )
+    if row is None:
+        db.add(UsageRollup(**values))
+    else:
+        for col in ROLLUP_COUNTERS:
+            setattr(row, col, getattr(row, col) + values[col])
+
+
+def record_turn(
+    db: Session, user_id: int, message: str, result: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Store the turn and its usage and commit once. The rollup is updated in the
+    same transaction, or deferred to the background queue when it is running.
+    Returns the usage and "conversation_id" as plain values read before the
+    commit, so nothing reloads the row afterwards. Blocking: call it from a
+    worker thread in async code.
+    """
+    usage = usage_from_result(result)
+    convo = Conversation(
+        user_id=user_id,
+        message=message,
+        response=result.get("llm_response") or "",
+        **usage,
+    )
+    db.add(convo)
+    db.flush()
+    stored = {"conversation_id": convo.id, **usage}
+    if task_queue.running:
+        # Rollup off the response path: the task row commits with the turn
+        task_queue.enqueue("usage.rollup", {"conversation_id": convo.id}, db=db)
+    else:
+        _increment_rollup(db, convo)
+    db.commit()
+    return stored
+
+
+@task_queue.task("usage.rollup")
+def apply_rollup(payload: Dict[str, Any], db: Session) -> None:
+    """
+    Background handler: add a stored turn to its hourly rollup.
+    """
+    convo = db.get(Conversation, payload["conversation_id"])
+    if convo is not None:  # may have been removed by retention meanwhile
+        _increment_rollup(db, convo)
+
+
+def usage_summary(
+    db: Session,
+    user_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    model: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Read hourly rollups for a user (O(buckets), no scan of conversations).
+    """
+    query = db.query(UsageRollup).filter(UsageRollup.user_id == user_id)
+    if since:
+        query = query.filter(UsageRollup.bucket_start >= hour_bucket(since))
+    if until:
+        query = query.filter(UsageRollup.bucket_start <= until)
+    if model:
+        query = query.filter(UsageRollup.model == model)
+
+    buckets: List[Dict[str, Any]] = []
+    totals: Dict[str, float] = dict.fromkeys(ROLLUP_COUNTERS, 0)
+    for row in query.order_by(UsageRollup.bucket_start, UsageRollup.model).all():
+        bucket = {
+            "bucket_start": row.bucket_start.isoformat(),
+            "model": row.model,
+            "turns": row.turns,
+            "input_tokens": row.input_tokens,
+            "output_tokens": row.output_tokens,
+            "avg_latency_ms": (
+                round(row.latency_ms_total / row.turns, 1) if row.turns else 0
+            ),
+            "cache_hits": row.cache_hits,
+        }
+        buckets.append(bucket)
+        for key in totals:
+            totals[key] += getattr(row, key)
+
+    latency_total = totals.pop("latency_ms_total")
+    totals["avg_latency_ms"] = (
+        round(latency_total / totals["turns"], 1) if totals["turns"] else 0
+    )
+    return {"totals": totals, "buckets": buckets}
@@ -0,0 +1,285 @@
+"""
+Bulk user provisioning from CSV or JSONL (columns/keys: username, password, email).
+
+Rows are processed in chunks:
+- validate each row with the `UserCreate` schema and drop duplicates within the upload;
+- check usernames with one `IN (...)` query per chunk (read pool);
+- hash the new passwords in parallel (Argon2 releases the GIL, so threads use every core);
+- insert the chunk with one multi-row INSERT ... ON CONFLICT DO NOTHING in its own
+  short transaction; a username taken meanwhile is reported as a conflict.
+
+Chunks already inserted stay committed if a later one fails; running the same file
+again reports them as conflicts.
+
+CLI, from chatbot_app/:
+    python -m app.services.user_provisioning users.csv
+    python -m app.services.user_provisioning users.jsonl --report results.jsonl
+    cat users.csv | python -m app.services.user_provisioning - --format csv
+"""
+
+from __future__ import annotations
+import argparse
+import csv
+import io
+import itertools
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from pydantic import ValidationError
+from sqlalchemy import Insert, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from app.core.config import settings
+from app.db.models.user import User
+from app.db.session import ReadSessionLocal, SessionLocal
+from app.schemas.user import UserCreate
+from app.services.security import hash_password
+from app.services.standard_logger import logger
+
+FORMATS = ("csv", "jsonl")
+# Dialects whose INSERT supports ON CONFLICT DO NOTHING ... RETURNING
+_UPSERT_INSERTS: Dict[str, Callable[[Any], sqlite.Insert | postgresql.Insert]] = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+def detect_format(name: str | None) -> Optional[str]:
+    """
+    Guess the format from a file name or Content-Type ("csv"/"jsonl"), else None.
+    """
+    name = (name or "").lower()
+    if "csv" in name:
+        return "csv"
+    if any(token in name for token in ("jsonl", "ndjson", "json")):
+        return "jsonl"
+    return None
+
+
+def read_rows(lines: Iterable[str], fmt: str) -> Iterator[Dict[str, Any]]:
+    """
+    Parse CSV (header row) or JSONL lines into row dicts. Unparseable JSONL lines
+    become rows with an `_error`, so they are reported instead of aborting the run.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown user file format: {fmt!r}")
+    if fmt == "csv":
+        yield from csv.DictReader(lines)
+        return
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield {"_error": f"Invalid JSON: {e.msg}"}
+            continue
+        yield row if isinstance(row, dict) else {"_error": "Expected a JSON object"}
+
+
+def _validate(row: Dict[str, Any]) -> Tuple[Optional[UserCreate], Optional[str]]:
+    if "_error" in row:
+        return None, row["_error"]
+    fields = {k: v for k, v in row.items() if k in UserCreate.model_fields}
+    if not fields.get("email"):
+        fields["email"] = None  # empty CSV cells mean "no email"
+    try:
+        return UserCreate(**fields), None
+    except ValidationError as e:
+        problems = [
+            f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()
+        ]
+        return None, "; ".join(problems)
+
+
+def _hash(password: str) -> Tuple[Optional[str], Optional[str]]:
+    try:
+        return hash_password(password), None
+    except ValueError as e:
+        return None, str(e)
+
+
+def _result(row_no: int, username: Any, status: str, **extra: Any) -> Dict[str, Any]:
+    return {"row": row_no, "username": username, "status": status, **extra}
+
+
+def _insert_chunk(values: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Insert one chunk in a single transaction; return {username: id} of inserted rows.
+    """
+    db = SessionLocal()
+    try:
+        dialect_insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+        stmt: Insert
+        if dialect_insert is None:
+            stmt = insert(User).values(values)
+        else:
+            stmt = (
+                dialect_insert(User)
+                .values(values)
+                .on_conflict_do_nothing(index_elements=["username"])
+            )
+        rows: List[Any] = list(db.execute(stmt.returning(User.id, User.username)))
+        inserted: Dict[str, int] = {username: user_id for user_id, username in rows}
+        db.commit()
+        return inserted
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _provision_chunk(
+    chunk: List[Tuple[int, Dict[str, Any]]],
+    seen: set,
+    executor: ThreadPoolExecutor,
+) -> List[Dict[str, Any]]:
+    results: Dict[int, Dict[str, Any]] = {}
+    candidates: List[Tuple[int, UserCreate]] = []
+    for row_no, row in chunk:
+        user, error = _validate(row)
+        username = user.username if user else row.get("username")
+        if user is None:
+            results[row_no] = _result(row_no, username, "invalid", detail=error)
+        elif user.username in seen:
+            results[row_no] = _result(
+                row_no, username, "conflict", detail="Duplicate username in upload"
+            )
+        else:
+            seen.add(user.username)
+            candidates.append((row_no, user))
+
+    # One set-based uniqueness check for the whole chunk
+    existing: Set[str] = set()
+    if candidates:
+        db = ReadSessionLocal()
+        try:
+            names = [user.username for _, user in candidates]
+            existing = set(
+                db.scalars(select(User.username).where(User.username.in_(names)))
+            )
+        finally:
+            db.close()
+    new_users = []
+    for row_no, user in candidates:
+        if user.username in existing:
+            results[row_no] = _result(
+                row_no, user.username, "conflict", detail="Username is already taken"
+            )
+        else:
+            new_users.append((row_no, user))
+
+    # Hash outside any transaction, so the write lock is only held for the insert
+    hashes = executor.map(_hash, [user.password for _, user in new_users])
+    values, pending = [], []
+    for (row_no, user), (hashed, error) in zip(new_users, hashes):
+        if error:
+            results[row_no] = _result(row_no, user.username, "invalid", detail=error)
+            continue
+        values.append(
+            {
+                "username": user.username,
+                "email": user.email,
+                "hashed_password": hashed,
+                "is_active": True,
+            }
+        )
+        pending.append((row_no, user.username))
+
+    inserted = _insert_chunk(values) if values else {}
+    for row_no, username in pending:
+        if username in inserted:
+            results[row_no] = _result(
+                row_no, username, "created", id=inserted[username]
+            )
+        else:
+            results[row_no] = _result(
+                row_no, username, "conflict", detail="Username is already taken"
+            )
+    return [results[row_no] for row_no, _ in chunk]
+
+
+def provision_users(
+    rows: Iterable[Dict[str, Any]],
+    chunk_size: int | None = None,
+    workers: int | None = None,
+) -> Dict[str, Any]:
+    """
+    Register users in chunks; return per-row results (created/conflict/invalid)
+    and totals.
+    """
+    chunk_size = max(chunk_size or settings.bulk_register_chunk_size, 1)
+    workers = workers or settings.bulk_register_hash_workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    seen: set = set()
+    results: List[Dict[str, Any]] = []
+    numbered = enumerate(rows, start=1)
+    with ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="pwhash"
+    ) as executor:
+        while chunk := list(itertools.islice(numbered, chunk_size)):
+            results.extend(_provision_chunk(chunk, seen, executor))
+    counts = Counter(result["status"] for result in results)
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Bulk registration: {len(results)} row(s), {counts['created']} created, "
+        f"{counts['conflict']} conflict(s), {counts['invalid']} invalid in {elapsed:.1f}s."
+    )
+    return {
+        "rows": len(results),
+        "created": counts["created"],
+        "conflicts": counts["conflict"],
+        "invalid": counts["invalid"],
+        "elapsed_s": round(elapsed, 3),
+        "results": results,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("source", help="CSV or JSONL file ('-' for stdin)")
+    parser.add_argument(
+        "--format", choices=FORMATS, help="Defaults to the file extension"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=settings.bulk_register_chunk_size
+    )
+    parser.add_argument(
+        "--workers", type=int, help="Hashing threads (default: CPU count)"
+    )
+    parser.add_argument("--report", help="Write per-row results to this JSONL file")
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.source)
+    if fmt is None:
+        parser.error("Cannot tell the format from the file name; use --format")
+
+    from app.db.init_db import init_db
+
+    init_db()
+    if args.source == "-":
+        stream = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig")
+        report = provision_users(read_rows(stream, fmt), args.chunk_size, args.workers)
+    else:
+        with open(args.source, encoding="utf-8-sig", newline="") as f:
+            report = provision_users(read_rows(f, fmt), args.chunk_size, args.workers)
+
+    results = report.pop("results")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+    else:
+        report["failed_rows"] = [r for r in results if r["status"] != "created"]
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
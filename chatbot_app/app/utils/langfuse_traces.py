@@ -63,5 +63,21 @@ def setup_langfuse_tracer():
         return None
 
 
+def get_langfuse_callback_handler(lf_client=None):
+    """
+    Return a LangChain callback handler bound to the Langfuse client (v3).
+    Return None when tracing is disabled or the integration is unavailable.
+    """
+    if not (lf_client or langfuse_client):
+        return None
+    try:
+        from langfuse.langchain import CallbackHandler
+
+        return CallbackHandler()
+    except Exception as e:
+        logger.warning(f"Langfuse LangChain handler unavailable ({e}).")
+        return None
+
+
 # Global Langfuse client instance (None if disabled)
 langfuse_client = setup_langfuse_tracer()
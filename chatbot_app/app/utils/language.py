@@ -0,0 +1,56 @@
+# app/utils/language.py
+# Purpose: Fast, dependency-free language guess from stopwords and accented characters.
+
+import re
+from typing import Dict
+
+# Very common stopwords per language (small on purpose: only used for a cheap guess)
+_LANGUAGE_MARKERS: Dict[str, frozenset] = {
+    "es": frozenset(
+        "el los las de del que y en un una por para con es qué libro libros me recomiendas "
+        "cuál sobre como pero muy".split()
+    ),
+    "en": frozenset(
+        "the a an of and in to is are what which book books me recommend for with "
+        "about how but very".split()
+    ),
+    "fr": frozenset(
+        "le les des est une pour avec qui dans livre livres je vous sur mais très".split()
+    ),
+    "de": frozenset(
+        "der die das und ist nicht ein eine mit für ich buch bücher über wie aber sehr".split()
+    ),
+    "pt": frozenset(
+        "o os um uma não para com você livro livros é sobre mas muito".split()
+    ),
+    "it": frozenset("il gli una per con che non sono libro libri sul ma molto".split()),
+}
+
+# Characters that strongly hint at a language
+_CHAR_HINTS = {"es": "¿¡ñ", "pt": "ãõç", "de": "ßäöü", "fr": "èêàùœ"}
+
+_WORD_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+
+def detect_language(text: str) -> str:
+    """
+    Guess an ISO 639-1 code ("es", "en", "fr", ...) or "unknown" when there is
+    no clear winner.
+    """
+    lowered = text.lower()
+    scores = dict.fromkeys(_LANGUAGE_MARKERS, 0)
+    for word in _WORD_RE.findall(lowered):
+        for lang, markers in _LANGUAGE_MARKERS.items():
+            if word in markers:
+                scores[lang] += 1
+    for lang, chars in _CHAR_HINTS.items():
+        if any(ch in lowered for ch in chars):
+            scores[lang] += 2
+    if any(ch in lowered for ch in "áéíóú"):
+        scores["es"] += 1
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    (best, best_score), (_, runner_up) = ranked[0], ranked[1]
+    if best_score == 0 or best_score == runner_up:
+        return "unknown"
+    return best
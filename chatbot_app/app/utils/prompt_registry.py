@@ -0,0 +1,145 @@
+# app/utils/prompt_registry.py
+# Purpose: Load every prompt YAML once and precompile it into an immutable message prefix
+#          (system prompt + few-shot pairs) plus the generation profile bound to the LLM.
+
+from __future__ import annotations
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from app.models.prompt_config import PromptConfig
+from app.services.standard_logger import logger
+from app.utils.prompt_loader import DEFAULT_PROMPT_PATH, load_prompt
+
+DEFAULT_PROMPT_DIR = DEFAULT_PROMPT_PATH.parent
+DEFAULT_PROMPT_NAME = "assistant"
+
+# Generation fields forwarded to the model on each call (response_mime_type is not
+# a valid Gemini text MIME type for markdown, so it stays informational)
+GENERATION_FIELDS = ("max_output_tokens", "top_p", "top_k")
+
+
+@dataclass(frozen=True)
+class CompiledPrompt:
+    """
+    Immutable, ready-to-use prompt: the message prefix and generation profile.
+    """
+
+    name: str
+    version: str
+    config: PromptConfig
+    prefix: Tuple[BaseMessage, ...]
+    generation: Mapping[str, Any]
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}@{self.version}"
+
+
+def compile_prompt(cfg: PromptConfig) -> CompiledPrompt:
+    """
+    Build the message prefix and generation profile for a validated prompt config.
+
+    Messages get stable ids so `add_messages` keeps a single copy of the prefix
+    when the same prompt is applied on later turns of a conversation.
+    """
+    key = f"{cfg.name}@{cfg.version}"
+    prefix: List[BaseMessage] = [SystemMessage(content=cfg.persona, id=f"{key}:system")]
+    for i, example in enumerate(cfg.few_shot):
+        prefix.append(HumanMessage(content=example.user, id=f"{key}:shot{i}:user"))
+        prefix.append(AIMessage(content=example.assistant, id=f"{key}:shot{i}:ai"))
+    generation = {field: getattr(cfg.generation, field) for field in GENERATION_FIELDS}
+    return CompiledPrompt(
+        name=cfg.name,
+        version=cfg.version,
+        config=cfg,
+        prefix=tuple(prefix),
+        generation=MappingProxyType(generation),
+    )
+
+
+def _version_key(version: str) -> Tuple[Tuple[int, Any], ...]:
+    """
+    Sort versions numerically when possible ("1.10.0" > "1.9.2").
+
+    Every part is a (kind, value) pair so ints and strings are never compared
+    with each other; the end marker ranks pre-releases ("1.0.1-beta") below the
+    release ("1.0.1") and shorter versions below longer ones ("1.0" < "1.0.1").
+    """
+    parts = [
+        (1, int(p)) if p.isdigit() else (0, p)
+        for p in re.split(r"[.\-+]", version)
+        if p
+    ]
+    return (*parts, (1, -1))
+
+
+class PromptRegistry:
+    """
+    In-memory registry of compiled prompts, keyed by name and version.
+    """
+
+    def __init__(self, prompt_dir: Path = DEFAULT_PROMPT_DIR) -> None:
+        self.prompt_dir = Path(prompt_dir)
+        self._prompts: Dict[str, Dict[str, CompiledPrompt]] = {}
+        self.load()
+
+    def load(self) -> None:
+        """
+        (Re)load all YAML files from the prompt directory; invalid files are skipped.
+        """
+        prompts: Dict[str, Dict[str, CompiledPrompt]] = {}
+        for path in sorted(self.prompt_dir.glob("*.y*ml")):
+            try:
+                compiled = compile_prompt(load_prompt(str(path)))
+            except Exception as e:
+                logger.warning(f"Skipping invalid prompt file {path.name}: {e}")
+                continue
+            prompts.setdefault(compiled.name, {})[compiled.version] = compiled
+        self._prompts = prompts
+        logger.info(
+            f"Prompt registry loaded: {', '.join(self.keys()) or 'no prompts'}."
+        )
+
+    def keys(self) -> List[str]:
+        return [p.key for versions in self._prompts.values() for p in versions.values()]
+
+    def get(
+        self, name: Optional[str] = None, version: Optional[str] = None
+    ) -> CompiledPrompt:
+        """
+        Return a compiled prompt; defaults to the latest version of the default prompt.
+        Raises KeyError when the name or version is unknown.
+        """
+        versions = self._prompts.get(name or DEFAULT_PROMPT_NAME)
+        if not versions:
+            raise KeyError(f"Unknown prompt: {name or DEFAULT_PROMPT_NAME}")
+        if version is None:
+            return versions[max(versions, key=_version_key)]
+        if version not in versions:
+            raise KeyError(
+                f"Unknown version {version} for prompt {name or DEFAULT_PROMPT_NAME}"
+            )
+        return versions[version]
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """
+        List available prompts (for the API).
+        """
+        return [
+            {
+                "name": p.name,
+                "version": p.version,
+                "language": p.config.language,
+                "few_shot": len(p.config.few_shot),
+                "generation": dict(p.generation),
+            }
+            for versions in self._prompts.values()
+            for p in versions.values()
+        ]
+
+
+# Global registry, loaded once per process
+prompt_registry = PromptRegistry()
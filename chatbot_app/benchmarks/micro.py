@@ -0,0 +1,338 @@
+"""
+Microbenchmarks for the hot paths, runnable offline (fake LLM, temporary SQLite DB).
+
+Each case is timed separately (median/p95 per call). Results can be saved as a JSON
+baseline and later compared against it; a case regresses when its median grows by
+more than the threshold (default 25%, overridable per case).
+
+Usage (from chatbot_app/):
+    python -m benchmarks.micro --save benchmarks/baselines/micro.json
+    python -m benchmarks.micro --compare benchmarks/baselines/micro.json
+    python -m benchmarks.micro --only graph_turn jwt_roundtrip --threshold hash_password=0.5
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_THRESHOLD = 0.25
+
+
+@dataclass
+class Case:
+    """
+    One benchmarked operation: `fn` is called `number` times per sample.
+    """
+
+    name: str
+    fn: Callable[[], Any]
+    number: int = 100
+    teardown: Optional[Callable[[], None]] = None
+
+
+def _offline_env(tmp_dir: Path) -> None:
+    """
+    Settings for an offline run; must happen before any `app` import.
+    """
+    for key, value in {
+        "SECRET_KEY": "benchmark-secret",
+        "GEMINI_API_KEY": "offline",
+        "GEMINI_MODEL": "gemini-2.5-pro",
+        "LLM_TEMPERATURE": "0.7",
+        "LOG_CONSOLE_LEVEL": "WARNING",
+        "SILENCE_WARNINGS": "true",
+        "QUIET_THIRD_PARTY": "true",
+        "APP_VERSION": "benchmark",
+        "LANGFUSE_PUBLIC_KEY": "",
+        "LANGFUSE_SECRET_KEY": "",
+        "LANGFUSE_BASE_URL": "",
+        "LANGFUSE_TRACING_ENVIRONMENT": "benchmark",
+        "LANGFUSE_DEBUG": "false",
+        "LANGFUSE_SAMPLE_RATE": "0",
+    }.items():
+        os.environ.setdefault(key, value)
+    # Never touch the real database or send traces from a benchmark
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_dir / 'micro.db'}"
+    os.environ["ENABLE_LANGFUSE"] = "false"
+    os.environ["RETENTION_INTERVAL_HOURS"] = "0"
+
+
+def _use_fake_llm() -> None:
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from app.services import model_router
+
+    reply = "- **Dune** (Frank Herbert): politics, ecology and religion on Arrakis."
+    for tier in model_router.MODEL_TIERS:
+        for slot in model_router.get_tier_client(tier).pool.slots:
+            slot.llm = FakeListChatModel(responses=[reply])
+
+
+def build_cases(tmp_dir: Path) -> List[Case]:
+    """
+    Create the benchmark cases (imports the app lazily, after `_offline_env`).
+    """
+    from fastapi.security import HTTPAuthorizationCredentials
+    from app.api.v1.auth import create_access_token
+    from app.api.v1.chatbot import verify_token
+    from app.db.compressed_text import text_codec
+    from app.db.init_db import init_db
+    from app.db.models.conversation import Conversation
+    from app.db.models.user import User
+    from app.db.session import SessionLocal
+    from app.services.graph_builder import build_graph
+    from app.services.security import hash_password, verify_password
+    from app.services.standard_logger import logger
+    from app.utils.prompt_loader import load_prompt
+
+    # Keep node/startup logging out of the timings (the logger case re-enables it)
+    saved_handlers, saved_level = logger.handlers[:], logger.level
+    logger.setLevel(logging.WARNING)
+
+    _use_fake_llm()
+    init_db()
+    graph = build_graph()
+
+    db = SessionLocal()
+    user = User(username="bench", hashed_password="x")
+    db.add(user)
+    db.commit()
+    user_id = user.id
+
+    def graph_turn() -> None:
+        graph.invoke(
+            {
+                "current_input": "Recommend me a science fiction novel about first contact",
+                "messages": [],
+            }
+        )
+
+    def jwt_roundtrip() -> None:
+        token = create_access_token("bench")
+        verify_token(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+
+    hashed = hash_password("correct horse battery")
+
+    def conversation_insert() -> None:
+        db.add(
+            Conversation(
+                user_id=user_id,
+                message="Recommend me a sci-fi book",
+                response="- **Dune** (Frank Herbert)",
+            )
+        )
+        db.commit()
+
+    # Compressed text column codec on a typical markdown answer (~1 KB)
+    answer = "Here are a few picks:\n\n" + "\n".join(
+        f"- **Title {i}** (Author {i}): why it fits your request, in one sentence."
+        for i in range(12)
+    )
+    packed = text_codec.encode(answer)
+
+    # Logger throughput through the app's formatter, into a throwaway rotating file
+    log_handler = RotatingFileHandler(
+        tmp_dir / "bench.log", maxBytes=5_000_000, backupCount=1, encoding="utf-8"
+    )
+    log_handler.setFormatter(saved_handlers[0].formatter if saved_handlers else None)
+
+    def log_line() -> None:
+        logger.info("Node: Generating LLM response using 10 message(s) on tier=fast.")
+
+    def restore_logger() -> None:
+        logger.handlers[:] = saved_handlers
+        logger.setLevel(saved_level)
+        log_handler.close()
+
+    def start_logger_case() -> None:
+        logger.handlers[:] = [log_handler]
+        logger.setLevel(logging.INFO)
+
+    return [
+        Case("build_graph", build_graph, number=20),
+        Case("load_prompt", load_prompt, number=50),
+        Case("graph_turn", graph_turn, number=50),
+        Case("jwt_roundtrip", jwt_roundtrip, number=200),
+        Case("hash_password", lambda: hash_password("correct horse battery"), number=3),
+        Case(
+            "verify_password",
+            lambda: verify_password("correct horse battery", hashed),
+            number=3,
+        ),
+        Case("conversation_insert", conversation_insert, number=50, teardown=db.close),
+        Case("text_encode", lambda: text_codec.encode(answer), number=500),
+        Case("text_decode", lambda: text_codec.decode(packed), number=500),
+        Case(
+            "logger_info",
+            _with_setup(start_logger_case, log_line),
+            number=2000,
+            teardown=restore_logger,
+        ),
+    ]
+
+
+def _with_setup(setup: Callable[[], None], fn: Callable[[], Any]) -> Callable[[], Any]:
+    """
+    Run `setup` once, the first time the case is called.
+    """
+    state = {"ready": False}
+
+    def wrapped() -> Any:
+        if not state["ready"]:
+            setup()
+            state["ready"] = True
+        return fn()
+
+    return wrapped
+
+
+def measure(case: Case, repeat: int) -> Dict[str, float]:
+    """
+    One warm-up sample, then `repeat` samples; statistics are per call.
+    """
+    samples: List[float] = []
+    for i in range(repeat + 1):
+        start = time.perf_counter()
+        for _ in range(case.number):
+            case.fn()
+        elapsed = (time.perf_counter() - start) / case.number
+        if i:
+            samples.append(elapsed)
+    samples.sort()
+    median = statistics.median(samples)
+    p95 = samples[min(len(samples) - 1, round(0.95 * (len(samples) - 1)))]
+    return {
+        "median_us": round(median * 1e6, 2),
+        "p95_us": round(p95 * 1e6, 2),
+        "min_us": round(samples[0] * 1e6, 2),
+        "ops_per_s": round(1 / median, 1) if median else 0.0,
+        "calls": case.number * repeat,
+    }
+
+
+def compare(
+    current: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float,
+    overrides: Dict[str, float],
+) -> List[Dict[str, Any]]:
+    """
+    Median-vs-median comparison; a case regresses when it is slower than the
+    baseline by more than its threshold.
+    """
+    rows: List[Dict[str, Any]] = []
+    for name, stats in current.items():
+        base = baseline.get(name)
+        if not base or not base.get("median_us"):
+            rows.append({"name": name, "change": None, "regressed": False})
+            continue
+        change = stats["median_us"] / base["median_us"] - 1
+        limit = overrides.get(name, threshold)
+        rows.append(
+            {
+                "name": name,
+                "baseline_us": base["median_us"],
+                "current_us": stats["median_us"],
+                "change": round(change, 4),
+                "threshold": limit,
+                "regressed": change > limit,
+            }
+        )
+    return rows
+
+
+def _parse_overrides(items: List[str]) -> tuple[float, Dict[str, float]]:
+    threshold, overrides = DEFAULT_THRESHOLD, {}
+    for item in items:
+        if "=" in item:
+            name, _, value = item.partition("=")
+            overrides[name.strip()] = float(value)
+        else:
+            threshold = float(item)
+    return threshold, overrides
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--repeat", type=int, default=7, help="Samples per case")
+    parser.add_argument("--only", nargs="*", help="Run only these cases")
+    parser.add_argument("--save", help="Write results to this JSON baseline")
+    parser.add_argument("--compare", help="Compare against this JSON baseline")
+    parser.add_argument(
+        "--threshold",
+        nargs="*",
+        default=[],
+        help="Allowed slowdown as a fraction: '0.3' for all cases, 'name=0.5' per case",
+    )
+    args = parser.parse_args()
+
+    tmp_dir = Path(tempfile.mkdtemp(prefix="micro_bench_"))
+    _offline_env(tmp_dir)
+    cases = build_cases(tmp_dir)
+    if args.only:
+        unknown = set(args.only) - {c.name for c in cases}
+        if unknown:
+            parser.error(f"Unknown case(s): {', '.join(sorted(unknown))}")
+
+    results: Dict[str, Dict[str, float]] = {}
+    print(f"{'case':<22}{'median µs':>14}{'p95 µs':>14}{'ops/s':>14}")
+    for case in cases:
+        try:
+            if not args.only or case.name in args.only:
+                results[case.name] = stats = measure(case, args.repeat)
+                print(
+                    f"{case.name:<22}{stats['median_us']:>14}{stats['p95_us']:>14}{stats['ops_per_s']:>14}"
+                )
+        finally:
+            if case.teardown:
+                case.teardown()
+
+    if args.save:
+        path = Path(args.save)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "meta": {
+                "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "repeat": args.repeat,
+            },
+            "results": results,
+        }
+        path.write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline saved to {path}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        threshold, overrides = _parse_overrides(args.threshold)
+        rows = compare(results, baseline.get("results", {}), threshold, overrides)
+        print(f"\n{'case':<22}{'baseline µs':>14}{'current µs':>14}{'change':>10}")
+        for row in rows:
+            if row["change"] is None:
+                print(f"{row['name']:<22}{'(new)':>14}")
+                continue
+            flag = "  REGRESSION" if row["regressed"] else ""
+            print(
+                f"{row['name']:<22}{row['baseline_us']:>14}{row['current_us']:>14}"
+                f"{row['change']:>+10.1%}{flag}"
+            )
+        if any(row["regressed"] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
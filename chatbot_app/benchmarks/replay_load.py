@@ -0,0 +1,196 @@
+"""
+Whole-system load test against a recorded cassette (no network, no API keys).
+
+Turns run concurrently through the compiled graph (guardrails, retrieval, routing,
+key pool, degradation) while the model calls replay recorded Gemini answers with
+their recorded latency, scaled by --time-scale. Inputs default to the user
+messages stored in the cassette.
+
+Record a cassette first by running the app with LLM_CASSETTE_MODE=record, then
+(from chatbot_app/):
+    python -m benchmarks.replay_load --cassette cassettes/gemini.ndjson.gz --concurrency 16
+    python -m benchmarks.replay_load --cassette ... --save benchmarks/baselines/replay.json
+    python -m benchmarks.replay_load --cassette ... --compare benchmarks/baselines/replay.json
+"""
+
+from __future__ import annotations
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+from benchmarks.micro import _offline_env
+
+DEFAULT_THRESHOLD = 0.25
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+async def run_load(inputs: List[str], turns: int, concurrency: int) -> Dict[str, Any]:
+    """
+    Run `turns` single-turn conversations with `concurrency` in flight.
+    """
+    from app.services.graph_builder import build_graph
+    from app.services.llm_cassette import cassette
+
+    if cassette is None:
+        raise RuntimeError("Load tests need LLM_CASSETTE_MODE=replay")
+    graph = build_graph()
+    queue = itertools.islice(itertools.cycle(inputs), turns)
+    latencies: List[float] = []
+    response_chars: List[int] = []
+    levels: Counter = Counter()
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        for text in queue:
+            started = time.perf_counter()
+            try:
+                result = await graph.ainvoke({"current_input": text, "messages": []})
+            except Exception:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            response_chars.append(len(result.get("llm_response") or ""))
+            levels[str(result.get("degradation_level", 0))] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall_s = time.perf_counter() - started
+    if not latencies:
+        raise RuntimeError("Every turn failed")
+    return {
+        "turns": len(latencies),
+        "errors": errors,
+        "concurrency": concurrency,
+        "wall_s": round(wall_s, 3),
+        "turns_per_s": round(len(latencies) / wall_s, 2),
+        "p50_ms": round(_percentile(latencies, 0.50), 1),
+        "p95_ms": round(_percentile(latencies, 0.95), 1),
+        "p99_ms": round(_percentile(latencies, 0.99), 1),
+        "mean_response_chars": round(statistics.mean(response_chars), 1),
+        "degradation_levels": dict(levels),
+        "cassette": cassette.snapshot(),
+    }
+
+
+def compare(
+    current: Dict[str, Any], baseline: Dict[str, Any], threshold: float
+) -> List[Dict[str, Any]]:
+    """
+    A run regresses when p95 latency grows, or throughput drops, by more than
+    the threshold.
+    """
+    rows = []
+    for metric, worse_if_higher in (("p95_ms", True), ("turns_per_s", False)):
+        base, now = baseline.get(metric), current[metric]
+        if not base:
+            rows.append({"metric": metric, "change": None, "regressed": False})
+            continue
+        change = now / base - 1
+        rows.append(
+            {
+                "metric": metric,
+                "baseline": base,
+                "current": now,
+                "change": round(change, 4),
+                "regressed": (
+                    change > threshold if worse_if_higher else change < -threshold
+                ),
+            }
+        )
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--cassette", required=True, help="Recorded cassette to replay")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--time-scale",
+        type=float,
+        default=1.0,
+        help="Recorded latency multiplier (0 = no delay)",
+    )
+    parser.add_argument("--inputs", help="File with one user message per line")
+    parser.add_argument("--save", help="Write results to this JSON baseline")
+    parser.add_argument("--compare", help="Compare against this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    tmp_dir = Path(tempfile.mkdtemp(prefix="replay_load_"))
+    _offline_env(tmp_dir)
+    os.environ["LLM_CASSETTE_MODE"] = "replay"
+    os.environ["LLM_CASSETTE_PATH"] = str(Path(args.cassette).resolve())
+    os.environ["LLM_CASSETTE_TIME_SCALE"] = str(args.time_scale)
+
+    from app.db.init_db import init_db
+    from app.services.llm_cassette import cassette
+
+    init_db()
+    if cassette is None:
+        parser.error("Cassette replay is not active (check LLM_CASSETTE_MODE)")
+    if args.inputs:
+        lines = Path(args.inputs).read_text(encoding="utf-8").splitlines()
+        inputs = [line for line in lines if line.strip()]
+    else:
+        inputs = [rec.input for rec in cassette.recordings() if rec.input]
+    if not inputs:
+        parser.error("No inputs: the cassette has no user messages; use --inputs")
+
+    results = asyncio.run(run_load(inputs, args.turns, args.concurrency))
+    print(json.dumps(results, indent=2))
+
+    if args.save:
+        path = Path(args.save)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "meta": {
+                "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cassette": args.cassette,
+                "time_scale": args.time_scale,
+            },
+            "results": results,
+        }
+        path.write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline saved to {path}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        rows = compare(results, baseline.get("results", {}), args.threshold)
+        print(f"\n{'metric':<14}{'baseline':>12}{'current':>12}{'change':>10}")
+        for row in rows:
+            if row["change"] is None:
+                print(f"{row['metric']:<14}{'(none)':>12}")
+                continue
+            flag = "  REGRESSION" if row["regressed"] else ""
+            print(
+                f"{row['metric']:<14}{row['baseline']:>12}{row['current']:>12}"
+                f"{row['change']:>+10.1%}{flag}"
+            )
+        if any(row["regressed"] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
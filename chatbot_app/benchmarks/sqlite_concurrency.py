@@ -0,0 +1,133 @@
+"""
+Concurrency benchmark: default SQLite setup vs. the tuned profile
+(WAL + pragmas, single-writer engine and a separate read pool).
+
+Usage (from chatbot_app/):
+    python -m benchmarks.sqlite_concurrency --writers 4 --readers 8 --seconds 5
+"""
+
+from __future__ import annotations
+import argparse
+import tempfile
+import threading
+import time
+from dataclasses import replace
+from pathlib import Path
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from app.db.sqlite_tuning import DEFAULT_PROFILE, SQLiteProfile, apply_pragmas
+
+SCHEMA = (
+    "CREATE TABLE conversations (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+    "message TEXT NOT NULL, response TEXT NOT NULL, created_at TEXT DEFAULT CURRENT_TIMESTAMP)"
+)
+INDEX = "CREATE INDEX ix_conversations_user_id ON conversations (user_id)"
+RESPONSE = "- **Dune** (Frank Herbert): politics, religion and ecology.\n" * 20
+
+
+def _engine(url: str, profile: SQLiteProfile, pool_size: int):
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        pool_size=pool_size,
+        max_overflow=0,
+        pool_timeout=30,
+    )
+    event.listen(engine, "connect", lambda conn, _: apply_pragmas(conn, profile))
+    return engine
+
+
+def run(setup: str, writers: int, readers: int, seconds: float) -> dict:
+    """
+    Run mixed writer/reader threads against a fresh database and count operations.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix="sqlite_bench_")
+    url = f"sqlite:///{Path(tmp_dir) / 'bench.db'}"
+
+    if setup == "default":
+        # Baseline: one shared engine, rollback journal, no pragmas
+        write_engine = read_engine = _engine(url, DEFAULT_PROFILE, writers + readers)
+    else:
+        profile = SQLiteProfile()
+        write_engine = _engine(url, profile, 1)
+        read_engine = _engine(url, replace(profile, query_only=True), readers)
+
+    with write_engine.begin() as conn:
+        conn.execute(text(SCHEMA))
+        conn.execute(text(INDEX))
+
+    counts = {"writes": 0, "reads": 0, "errors": 0}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + seconds
+
+    def writer(worker: int) -> None:
+        while time.perf_counter() < stop_at:
+            try:
+                with write_engine.begin() as conn:
+                    conn.execute(
+                        text(
+                            "INSERT INTO conversations (user_id, message, response) VALUES (:u, :m, :r)"
+                        ),
+                        {"u": worker, "m": "Recommend me a sci-fi book", "r": RESPONSE},
+                    )
+                key = "writes"
+            except OperationalError:
+                key = "errors"
+            with lock:
+                counts[key] += 1
+
+    def reader(worker: int) -> None:
+        while time.perf_counter() < stop_at:
+            try:
+                with read_engine.connect() as conn:
+                    conn.execute(
+                        text(
+                            "SELECT id, message FROM conversations WHERE user_id = :u ORDER BY id DESC LIMIT 20"
+                        ),
+                        {"u": worker % max(writers, 1)},
+                    ).fetchall()
+                key = "reads"
+            except OperationalError:
+                key = "errors"
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    write_engine.dispose()
+    read_engine.dispose()
+
+    return {
+        "setup": setup,
+        "writes_per_s": round(counts["writes"] / seconds, 1),
+        "reads_per_s": round(counts["reads"] / seconds, 1),
+        "errors": counts["errors"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    results = [
+        run(setup, args.writers, args.readers, args.seconds)
+        for setup in ("default", "tuned")
+    ]
+    print(f"{'setup':<10}{'writes/s':>12}{'reads/s':>12}{'errors':>10}")
+    for r in results:
+        print(
+            f"{r['setup']:<10}{r['writes_per_s']:>12}{r['reads_per_s']:>12}{r['errors']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
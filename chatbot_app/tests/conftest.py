@@ -0,0 +1,110 @@
+"""
+Shared fixtures: the app runs against a throwaway SQLite file with fake models.
+Settings are read at import time, so the environment is set before `app` loads.
+"""
+
+import os
+import tempfile
+import time
+import pytest
+
+_tmp_dir = tempfile.mkdtemp(prefix="chatbot-tests-")
+for _name, _value in {
+    "SECRET_KEY": "test-secret",
+    "GEMINI_API_KEY": "test-key-0000",
+    "GEMINI_MODEL": "gemini-2.5-pro",
+    "LLM_TEMPERATURE": "0.7",
+    "LOG_CONSOLE_LEVEL": "WARNING",
+    "SILENCE_WARNINGS": "true",
+    "QUIET_THIRD_PARTY": "true",
+    "APP_VERSION": "test",
+    "ENABLE_LANGFUSE": "false",
+    "LANGFUSE_PUBLIC_KEY": "x",
+    "LANGFUSE_SECRET_KEY": "x",
+    "LANGFUSE_BASE_URL": "http://localhost",
+    "LANGFUSE_TRACING_ENVIRONMENT": "test",
+    "LANGFUSE_DEBUG": "false",
+    "LANGFUSE_SAMPLE_RATE": "1.0",
+    "DATABASE_URL": f"sqlite:///{_tmp_dir}/chatbot.db",
+    "RETENTION_ARCHIVE_DIR": f"{_tmp_dir}/archive",
+    "LLM_CASSETTE_MODE": "off",
+}.items():
+    os.environ[_name] = _value
+
+from fastapi.testclient import TestClient  # noqa: E402
+from langchain_core.language_models.fake_chat_models import (  # noqa: E402
+    FakeListChatModel,
+)
+
+
+class SlowChatModel(FakeListChatModel):
+    """
+    Fake chat model that takes `delay` seconds per call (runs in a worker thread).
+    """
+
+    delay: float = 0.0
+
+    def _call(self, *args, **kwargs) -> str:
+        time.sleep(self.delay)
+        return super()._call(*args, **kwargs)
+
+
+@pytest.fixture
+def fake_model():
+    """
+    Back every key of every model tier with a fake model; yields a setter for
+    the per-call delay.
+    """
+    from app.services import model_router
+
+    slots = [
+        slot
+        for tier in model_router.MODEL_TIERS
+        for slot in model_router.get_tier_client(tier).pool.slots
+    ]
+    originals = [slot.llm for slot in slots]
+    model = SlowChatModel(responses=["A fine book to read."])
+    for slot in slots:
+        slot.llm = model
+
+    def set_delay(seconds: float) -> None:
+        model.delay = seconds
+
+    yield set_delay
+    for slot, llm in zip(slots, originals):
+        slot.llm = llm
+
+
+@pytest.fixture
+def client(fake_model):
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def auth_headers(client):
+    """
+    Register a fresh user and return its Bearer token headers.
+    """
+    username = f"user{time.monotonic_ns()}"
+    client.post(
+        "/api/v1/users/register", json={"username": username, "password": "secret1"}
+    )
+    token = client.post(
+        "/auth/api/v1/auth/token", json={"username": username, "password": "secret1"}
+    ).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def user_id(auth_headers) -> int:
+    """
+    Database id of the user behind `auth_headers`.
+    """
+    from jose import jwt
+    from app.api.v1.chatbot import _lookup_user_id
+
+    token = auth_headers["Authorization"].split()[1]
+    return _lookup_user_id(jwt.get_unverified_claims(token)["sub"])
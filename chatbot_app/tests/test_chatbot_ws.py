@@ -0,0 +1,60 @@
+"""
+WebSocket channel: the token expiry is enforced per turn and waiting for a turn
+slot is bounded by the turn's deadline.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+import pytest
+from jose import jwt
+from starlette.websockets import WebSocketDisconnect
+from app.api.v1 import chatbot_ws
+from app.core.config import settings
+
+
+def _token(username: str, ttl_seconds: float) -> str:
+    expire = datetime.utcnow() + timedelta(seconds=ttl_seconds)
+    return jwt.encode(
+        {"sub": username, "exp": expire}, settings.secret_key, settings.algorithm
+    )
+
+
+def _bearer(headers) -> str:
+    return headers["Authorization"].split()[1]
+
+
+def _turn(ws, message, **extra):
+    ws.send_json({"message": message, **extra})
+    while True:
+        frame = ws.receive_json()
+        if frame["type"] != "token":
+            return frame
+
+
+def test_expired_token_closes_connection(client, auth_headers):
+    username = jwt.get_unverified_claims(_bearer(auth_headers))["sub"]
+    token = _token(username, ttl_seconds=2)
+    with client.websocket_connect(f"/api/v1/chatbot/ws?token={token}") as ws:
+        assert ws.receive_json()["type"] == "ready"
+        assert _turn(ws, "Recommend a novel")["type"] == "done"
+
+        time.sleep(2.5)
+        ws.send_json({"message": "And another one"})
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+    assert closed.value.code == 1008
+
+
+def test_waiting_for_a_turn_slot_respects_the_deadline(
+    client, auth_headers, monkeypatch
+):
+    # Every slot is taken: the turn must give up at its deadline, not wait forever
+    monkeypatch.setattr(chatbot_ws, "_turn_slots", asyncio.Semaphore(0))
+    token = _bearer(auth_headers)
+    with client.websocket_connect(f"/api/v1/chatbot/ws?token={token}") as ws:
+        assert ws.receive_json()["type"] == "ready"
+        started = time.monotonic()
+        frame = _turn(ws, "Recommend a novel", timeout=1)
+    assert frame == {"type": "error", "detail": "Request deadline exceeded"}
+    assert time.monotonic() - started < 5
@@ -0,0 +1,30 @@
+"""
+Concurrent chat turns must all be stored: writers wait for the SQLite write lock
+instead of failing while another turn is being recorded, and turns waiting on the
+model hold no pooled connection (more turns than SQLITE_READ_POOL_SIZE run here).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _chat(client, headers, message, **extra):
+    return client.post(
+        "/api/v1/chatbot/", params={"message": message}, headers=headers, **extra
+    )
+
+
+def test_concurrent_chats_all_succeed(client, auth_headers, fake_model):
+    fake_model(1.0)
+    turns = 8
+
+    with ThreadPoolExecutor(max_workers=turns) as pool:
+        responses = list(
+            pool.map(
+                lambda i: _chat(client, auth_headers, f"Recommend book number {i}"),
+                range(turns),
+            )
+        )
+
+    assert [r.status_code for r in responses] == [200] * turns
+    ids = {r.json()["conversation_id"] for r in responses}
+    assert len(ids) == turns
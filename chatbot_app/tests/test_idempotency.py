@@ -0,0 +1,126 @@
+"""
+Idempotency store: a key runs its turn once; retries attach to the running turn
+or replay the stored body and headers.
+"""
+
+import asyncio
+import pytest
+from app.db.session import SessionLocal
+from app.services.idempotency import IdempotencyConflict, IdempotencyStore
+
+HEADERS = {"X-Degradation-Level": "1", "X-Degradation-Mode": "reduced"}
+
+
+class Turn:
+    """
+    Counts executions; each one returns a new body after `delay` seconds.
+    """
+
+    def __init__(self, delay: float = 0.0, error: Exception | None = None) -> None:
+        self.calls = 0
+        self.delay = delay
+        self.error = error
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return {"answer": self.calls}, dict(HEADERS)
+
+
+def _run(store, user_id, key, turn, fingerprint="fp"):
+    db = SessionLocal()
+    try:
+        return asyncio.run(store.run(user_id, key, fingerprint, turn, db))
+    finally:
+        db.close()
+
+
+def test_retry_replays_body_and_headers(user_id):
+    store = IdempotencyStore(ttl_seconds=60, max_entries=10)
+    turn = Turn()
+
+    first = _run(store, user_id, "key-1", turn)
+    retry = _run(store, user_id, "key-1", turn)
+
+    assert first == ({"answer": 1}, HEADERS, False)
+    assert retry == ({"answer": 1}, HEADERS, True)
+    assert turn.calls == 1
+
+
+def test_replay_survives_a_restart(user_id):
+    turn = Turn()
+    _run(IdempotencyStore(ttl_seconds=60, max_entries=10), user_id, "key-2", turn)
+
+    # A new store has an empty memory level: the response comes from SQLite
+    replay = _run(IdempotencyStore(60, 10), user_id, "key-2", turn)
+
+    assert replay == ({"answer": 1}, HEADERS, True)
+    assert turn.calls == 1
+
+
+def test_concurrent_retry_attaches_to_the_running_turn(user_id):
+    store = IdempotencyStore(ttl_seconds=60, max_entries=10)
+    turn = Turn(delay=0.2)
+
+    async def both():
+        db = SessionLocal()
+        try:
+            return await asyncio.gather(
+                store.run(user_id, "key-3", "fp", turn, db),
+                store.run(user_id, "key-3", "fp", turn, db),
+            )
+        finally:
+            db.close()
+
+    # Either call may reach the key first; the other one attaches
+    first, attached = sorted(asyncio.run(both()), key=lambda result: result[2])
+
+    assert turn.calls == 1
+    assert first == ({"answer": 1}, HEADERS, False)
+    assert attached == ({"answer": 1}, HEADERS, True)
+
+
+def test_key_reused_with_other_parameters_conflicts(user_id):
+    store = IdempotencyStore(ttl_seconds=60, max_entries=10)
+    _run(store, user_id, "key-4", Turn())
+
+    with pytest.raises(IdempotencyConflict):
+        _run(store, user_id, "key-4", Turn(), fingerprint="other")
+
+
+def test_failed_turn_is_not_stored(user_id):
+    store = IdempotencyStore(ttl_seconds=60, max_entries=10)
+
+    with pytest.raises(RuntimeError):
+        _run(store, user_id, "key-5", Turn(error=RuntimeError("model down")))
+    turn = Turn()
+    body, _, replayed = _run(store, user_id, "key-5", turn)
+
+    assert (body, replayed, turn.calls) == ({"answer": 1}, False, 1)
+
+
+def test_expired_key_runs_again(user_id):
+    store = IdempotencyStore(ttl_seconds=0, max_entries=10)
+    turn = Turn()
+
+    _run(store, user_id, "key-6", turn)
+    body, _, replayed = _run(store, user_id, "key-6", turn)
+
+    assert (body, replayed, turn.calls) == ({"answer": 2}, False, 2)
+
+
+def test_chat_endpoint_replays_degradation_headers(client, auth_headers):
+    headers = {**auth_headers, "Idempotency-Key": "chat-1"}
+    params = {"message": "Recommend a novel"}
+
+    first = client.post("/api/v1/chatbot/", params=params, headers=headers)
+    retry = client.post("/api/v1/chatbot/", params=params, headers=headers)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert first.headers["Idempotency-Replayed"] == "false"
+    assert retry.headers["Idempotency-Replayed"] == "true"
+    for name in ("X-Degradation-Level", "X-Degradation-Mode"):
+        assert retry.headers[name] == first.headers[name]
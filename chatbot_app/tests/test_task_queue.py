@@ -0,0 +1,192 @@
+"""
+Background task queue: atomic claims with a lease, retries with backoff, dead
+rows once attempts run out, and sync handlers that commit exactly once.
+"""
+
+import asyncio
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pytest
+from app.core.config import settings
+from app.db.models.background_task import BackgroundTask
+from app.db.models.conversation import Conversation
+from app.db.models.usage_rollup import UsageRollup
+from app.db.session import SessionLocal
+from app.services.task_queue import DEAD, PENDING, RUNNING, TaskQueue
+from app.services.usage import apply_rollup
+
+_names = itertools.count()
+
+
+@pytest.fixture
+def queue(client, monkeypatch):
+    # `client` creates the tables; short delays keep retries fast
+    monkeypatch.setattr(settings, "background_poll_interval_seconds", 0.05)
+    monkeypatch.setattr(settings, "background_retry_base_seconds", 0.01)
+    return TaskQueue()
+
+
+@pytest.fixture
+def name():
+    """
+    Task type name unique to the test, so rows of other tests never match.
+    """
+    return f"test.task{next(_names)}"
+
+
+def _rows(name):
+    db = SessionLocal()
+    try:
+        return db.query(BackgroundTask).filter_by(task_type=name).all()
+    finally:
+        db.close()
+
+
+def _run_until(queue, done, timeout=10.0):
+    """
+    Run the dispatcher until `done()` holds (fails after `timeout` seconds).
+    """
+
+    async def run():
+        await queue.start()
+        try:
+            deadline = time.monotonic() + timeout
+            while not done():
+                assert time.monotonic() < deadline, "queue did not settle in time"
+                await asyncio.sleep(0.05)
+        finally:
+            await queue.stop()
+
+    asyncio.run(run())
+
+
+def test_claims_are_exclusive_and_leased(queue, name):
+    queue.task(name)(lambda payload, db: None)
+    for i in range(10):
+        queue.enqueue(name, {"i": i})
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        batches = list(pool.map(lambda _: queue._claim(name, 3), range(4)))
+
+    claimed = [task.row_id for batch in batches for task in batch]
+    assert len(claimed) == len(set(claimed)) == 10
+    rows = _rows(name)
+    assert {row.status for row in rows} == {RUNNING}
+    assert all(row.attempts == 1 for row in rows)
+    assert all(row.locked_until > datetime.utcnow() for row in rows)
+    assert queue._claim(name, 3) == []
+
+
+def test_expired_lease_is_claimed_again(queue, name):
+    queue.task(name)(lambda payload, db: None)
+    queue.enqueue(name, {})
+    (task,) = queue._claim(name, 1)
+
+    # The worker holding the lease crashed: once it expires, the task is retried
+    db = SessionLocal()
+    try:
+        db.query(BackgroundTask).filter_by(id=task.row_id).update(
+            {"locked_until": datetime.utcnow() - timedelta(seconds=1)}
+        )
+        db.commit()
+    finally:
+        db.close()
+    (again,) = queue._claim(name, 1)
+
+    assert (again.row_id, again.attempts) == (task.row_id, 2)
+
+
+def test_failed_task_is_retried_until_it_succeeds(queue, name):
+    calls = []
+
+    @queue.task(name, max_attempts=5)
+    def flaky(payload, db):
+        calls.append(payload["n"])
+        if len(calls) < 3:
+            raise RuntimeError("transient")
+
+    queue.enqueue(name, {"n": 1})
+    _run_until(queue, lambda: not _rows(name))
+
+    assert calls == [1, 1, 1]
+    metrics = queue.snapshot()["types"][name]
+    assert (metrics["retried"], metrics["succeeded"], metrics["dead"]) == (2, 1, 0)
+
+
+def test_exhausted_task_is_kept_dead(queue, name):
+    @queue.task(name, max_attempts=2)
+    def broken(payload, db):
+        raise RuntimeError("always fails")
+
+    queue.enqueue(name, {})
+    _run_until(queue, lambda: [row.status for row in _rows(name)] == [DEAD])
+
+    (row,) = _rows(name)
+    assert row.attempts == 2
+    assert "always fails" in row.last_error
+    assert queue.snapshot()["types"][name]["dead"] == 1
+
+
+def test_memory_task_is_retried(queue, name):
+    calls = []
+
+    @queue.task(name, durable=False)
+    async def flaky(payload):
+        calls.append(payload)
+        if len(calls) < 2:
+            raise RuntimeError("transient")
+
+    queue.enqueue(name, {"n": 1})
+    _run_until(queue, lambda: queue.snapshot()["types"][name]["succeeded"] == 1)
+
+    assert calls == [{"n": 1}, {"n": 1}]
+    assert queue.snapshot()["types"][name]["queued"] == 0
+
+
+def test_rollup_is_applied_exactly_once(queue, name, user_id):
+    model = f"model-{name}"
+    db = SessionLocal()
+    try:
+        convo = Conversation(
+            user_id=user_id, message="hi", response="hello", model=model
+        )
+        db.add(convo)
+        db.commit()
+        conversation_id = convo.id
+    finally:
+        db.close()
+    attempts = []
+
+    @queue.task(name, max_attempts=3)
+    def crash_after_rollup(payload, db):
+        apply_rollup(payload, db)
+        attempts.append(1)
+        if len(attempts) == 1:
+            # The rollup write and the task row delete commit together or not at all
+            raise RuntimeError("crashed before commit")
+
+    queue.enqueue(name, {"conversation_id": conversation_id})
+    _run_until(queue, lambda: not _rows(name))
+
+    db = SessionLocal()
+    try:
+        turns = [row.turns for row in db.query(UsageRollup).filter_by(model=model)]
+    finally:
+        db.close()
+    assert len(attempts) == 2
+    assert turns == [1]
+
+
+def test_durable_task_waits_for_the_callers_commit(queue, name):
+    queue.task(name)(lambda payload, db: None)
+    db = SessionLocal()
+    try:
+        queue.enqueue(name, {}, db=db)
+        assert _rows(name) == []  # not visible before the caller commits
+        db.commit()
+    finally:
+        db.close()
+
+    assert [row.status for row in _rows(name)] == [PENDING]
@@ -1,62 +1,33 @@
 """
-Application entrypoint: initializes logging, tracing, builds the LangGraph,
-and runs the interactive chat loop powered by the Gemini model.
+Console entrypoint: streams Gemini replies token by token through the LangGraph
+flow of the `app` package (chatbot_app/app) and keeps the conversation across turns.
+
+Heavy initialization (model clients, prompt registry, graph compilation, Langfuse)
+runs in a background thread while the user types the first message.
 """
 
-import warnings  # controls Python warnings (optionally silenced via settings)
+import sys  # lets us import the `app` package that lives under chatbot_app/
 import logging  # configures log levels and handlers for the running process
+from concurrent.futures import Future, ThreadPoolExecutor  # background warm start
+from pathlib import Path  # locate chatbot_app/ relative to this file
 from uuid import uuid4  # creates a simple session identifier per run
 
-# Centralized configuration (loaded from .env by pydantic-settings)
-from config import settings
-
-# App logger (console + rotating file), created in services/standard_logger.py
-from services.standard_logger import logger
-
-# LangGraph builder and state definition for the conversation flow
-from flow.graph_builder import build_chat_graph
-from flow.state import ChatbotState
-
-# Langfuse integration helpers (safe setup + optional callback handler)
-from utils.langfuse_traces import setup_langfuse_tracer, get_langfuse_callback_handler
-
-# Try to import Langfuse SDK helpers; if unavailable, define safe no-ops.
-try:
-    # observe/get_client are convenient helpers to create root/child spans
-    from langfuse import observe, get_client
-except Exception:
-
-    def observe(*args, **kwargs):
-        """Fallback no-op decorator when Langfuse is not available."""
+sys.path.insert(0, str(Path(__file__).resolve().parent / "chatbot_app"))
 
-        def wrap(fn):
-            return fn
+# Centralized configuration (loaded from .env by pydantic-settings); cheap to import
+from app.core.config import settings  # noqa: E402
 
-        return wrap
+# App logger (console + rotating file); also silences warnings/noisy libraries
+from app.services.standard_logger import setup_logger  # noqa: E402
 
-    def get_client():
-        """Fallback no-op client getter when Langfuse is not available."""
-        return None
+logger = setup_logger(
+    quiet_third_party=settings.quiet_third_party,
+    silence_warnings=settings.silence_warnings,
+)
 
-
-# --- Warnings and third‑party log noise control (driven by settings) ---
-# Keep the logic minimal: only toggle if explicitly requested via .env.
-if settings.SILENCE_WARNINGS:
-    warnings.filterwarnings("ignore")
-
-if settings.QUIET_THIRD_PARTY:
-    for _noisy in (
-        "google",
-        "google.api_core",
-        "grpc",
-        "opentelemetry",
-        "opentelemetry.sdk",
-        "tenacity",
-        "httpx",
-        "urllib3",
-        "langchain_core._api.deprecation",
-    ):
-        logging.getLogger(_noisy).setLevel(logging.ERROR)
+EXIT_COMMANDS = {"exit", "quit", "close", "bye"}
+# Graph nodes whose streamed tokens are printed to the terminal
+LLM_NODES = {"llm_executor", "llm_fast_executor"}
 
 
 def _lower_console_handler_level(
@@ -66,133 +37,115 @@ def _lower_console_handler_level(
     Lower ONLY the console handler level so the terminal stays clean while
     the file handler continues to capture INFO and DEBUG for troubleshooting.
     """
-    try:
-        level = getattr(logging, level_name.upper(), logging.WARNING)
-    except Exception:
-        level = logging.WARNING
+    level = getattr(logging, level_name.upper(), logging.WARNING)
     for h in log.handlers:
-        if isinstance(h, logging.StreamHandler):
+        if isinstance(h, logging.StreamHandler) and not isinstance(
+            h, logging.FileHandler
+        ):
             h.setLevel(level)
 
 
 # Apply the console downscaling (e.g., show WARNING+ in terminal; keep INFO in file)
-_lower_console_handler_level(logger, settings.LOG_CONSOLE_LEVEL)
+_lower_console_handler_level(logger, settings.log_console_level)
 
 
-@observe(name="chat.turn")
-def _observed_turn_invoke(
-    chat_graph, state: ChatbotState, callbacks=None
-) -> ChatbotState:
+def initialize_application():
     """
-    Execute a single chat turn under an observed span (if Langfuse is active).
-    Also updates the trace with the user input and the model output.
+    Import and build everything expensive: Gemini clients, prompt registry,
+    the compiled graph and the optional Langfuse client + callback handler.
+    Runs in a background thread (see `start_warmup`).
     """
-    lf = get_client()
-
-    # Attach user input to the current trace (safe-guarded)
-    try:
-        if lf:
-            lf.update_current_trace(
-                input={"user_input": state.get("current_input", "")}
-            )
-    except Exception:
-        # Never break the chat on observability issues
-        pass
-
-    # Invoke the graph with an optional Langfuse callback handler
-    result = chat_graph.invoke(
-        state, config={"callbacks": [callbacks]} if callbacks else {}
-    )
+    logger.info("Starting Chatbot initialization...")
+    logger.info(f"Using LLM Model: {settings.gemini_model}")
 
-    # Attach model output to the current trace (safe-guarded)
-    try:
-        if lf:
-            lf.update_current_trace(output={"response": result.get("llm_response", "")})
-    except Exception:
-        pass
+    from app.services.graph_builder import build_graph
+    from app.utils.langfuse_traces import (
+        langfuse_client,
+        get_langfuse_callback_handler,
+    )
 
-    return result
+    chat_graph = build_graph()
+    callback_handler = get_langfuse_callback_handler(langfuse_client)
+    logger.info("Initialization complete.")
+    return chat_graph, langfuse_client, callback_handler
 
 
-def initialize_application():
+def start_warmup() -> Future:
     """
-    Build and compile the chat graph, and set up Langfuse tracing if enabled.
-    Returns the compiled graph and the optional Langfuse client.
+    Start initialization in the background so it overlaps with the user typing.
     """
-    logger.info("Starting Chatbot initialization...")
-    logger.info(f"Using LLM Model: {settings.gemini_model}")
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warmup")
+    future = executor.submit(initialize_application)
+    executor.shutdown(wait=False)
+    return future
 
-    # Tracing setup (may return None if disabled or not available)
-    langfuse_client = setup_langfuse_tracer()
 
-    # Build the LangGraph once at startup
-    chat_graph = build_chat_graph()
-    logger.info("Initialization complete. Entering interactive loop.")
-    return chat_graph, langfuse_client
-
-
-def run_chat_loop(chat_graph, langfuse_client):
+def print_banner() -> None:
     """
-    Run the interactive console loop. When Langfuse is enabled, wrap the whole
-    session in a root span so every turn nests under it.
+    Print the session banner using only settings (no heavy imports needed).
     """
-    # Simple banner so users know the app context at a glance
     print("=" * 60)
-    print(f"      {settings.APP_NAME.upper()} - VERSION {settings.APP_VERSION}")
+    print(f"      {settings.app_name.upper()} - VERSION {settings.app_version}")
     print("=" * 60)
     print(f"Powered by: Gemini Model ({settings.gemini_model}) and LangGraph.")
     print(
         "Observability:",
-        "LangFuse Tracing ENABLED."
-        if langfuse_client
-        else "Standard Logging (LangFuse DISABLED).",
+        (
+            "LangFuse Tracing ENABLED (if keys are valid)."
+            if settings.enable_langfuse
+            else "Standard Logging (LangFuse DISABLED)."
+        ),
     )
     print("_" * 60)
     print("Welcome! Type 'exit', 'quit', 'close', bye to end the session.")
     print("_" * 60)
 
-    # Single Langfuse handler reused across invocations (recommended pattern)
-    callback_handler = get_langfuse_callback_handler(
-        langfuse_client, trace_name="chatbot_session_run"
-    )
-
-    # If Langfuse client is active, open a root span for the whole session
-    lf_client = get_client() if langfuse_client else None
-    session_id = f"session-{uuid4().hex[:8]}"
 
-    if lf_client:
-        # Root span groups all nested turns (cleaner trace in the UI)
-        with lf_client.start_as_current_span(name="chat-session") as span:
-            try:
-                # Enrich the root trace with useful identifiers
-                span.update_trace(
-                    user_id="jorge.montes",  # adjust if you support multiple users
-                    session_id=session_id,
-                    tags=["local", "dev"],
-                    metadata={"app_version": settings.APP_VERSION},
-                )
-            except Exception:
-                pass
-
-            _chat_loop_body(chat_graph, callback_handler)
-
-    else:
-        # No tracing: run the same loop with plain logging
-        _chat_loop_body(chat_graph, callback_handler)
-
-    # Ensure any buffered spans are sent before  exit
-    if langfuse_client:
-        try:
-            langfuse_client.flush()
-            logger.info("LangFuse traces flushed.")
-        except Exception as e:
-            logger.warning(f"LangFuse flush warning: {e}")
+def stream_turn(chat_graph, state: dict, config: dict) -> dict:
+    """
+    Run one turn, printing model tokens as they arrive.
+    Returns the final graph state (used as the next turn's history).
+    """
+    from langchain_core.messages import AIMessageChunk
 
+    final_state: dict = state
+    streamed = False
+    print("Chatbot: ", end="", flush=True)
 
-def _chat_loop_body(chat_graph, callback_handler):
+    for mode, payload in chat_graph.stream(
+        state, config=config, stream_mode=["messages", "values"]
+    ):
+        if mode == "values":
+            final_state = payload
+            continue
+        chunk, metadata = payload
+        # Only model token chunks; full messages in node outputs are skipped
+        if (
+            isinstance(chunk, AIMessageChunk)
+            and metadata.get("langgraph_node") in LLM_NODES
+        ):
+            text = chunk.text
+            if text:
+                print(text, end="", flush=True)
+                streamed = True
+
+    if not streamed:
+        # Nothing was streamed (e.g. fallback/error reply): print the final text
+        print(final_state.get("llm_response") or "No response generated.", end="")
+    print("\n")
+    return final_state
+
+
+def run_chat_loop(warmup: Future) -> None:
     """
-    Minimal console REPL: read user input, run the graph, print the model reply.
+    Interactive REPL. The first prompt is shown immediately; the warm-up result
+    is only awaited once the first message has been typed.
     """
+    print_banner()
+    session_id = f"session-{uuid4().hex[:8]}"
+    chat_graph = langfuse_client = callback_handler = None
+    history: list = []  # messages carried across turns
+
     while True:
         try:
             user_input = input("You: ")
@@ -202,37 +155,44 @@ def _chat_loop_body(chat_graph, callback_handler):
             break
 
         # Friendly exit commands
-        if user_input.strip().lower() in {"exit", "quit", "close", "bye"}:
+        if user_input.strip().lower() in EXIT_COMMANDS:
             logger.info("Exiting chatbot.")
             break
+        if not user_input.strip():
+            continue
 
-        # Graph state for this turn; the graph will build upon `messages`
-        initial_state: ChatbotState = {
-            "messages": [],
-            "current_input": user_input,
-            "llm_response": "",
+        if chat_graph is None:
+            try:
+                chat_graph, langfuse_client, callback_handler = warmup.result()
+            except Exception as e:
+                logger.exception(f"Initialization failed: {e}")
+                print("Chatbot: Initialization failed; see logs/app.log.")
+                return
+
+        config = {
+            "callbacks": [callback_handler] if callback_handler else [],
+            "metadata": {"langfuse_session_id": session_id},
         }
+        state = {"messages": history, "current_input": user_input}
 
         try:
-            # If the callback handler exists, use the observed function
-            if callback_handler:
-                result = _observed_turn_invoke(
-                    chat_graph, initial_state, callbacks=callback_handler
-                )
-            else:
-                result = chat_graph.invoke(initial_state)
-
-            final_response = result.get("llm_response") or "No response generated."
-            print(f"Chatbot: {final_response}")
-
+            result = stream_turn(chat_graph, state, config)
+            history = result.get("messages", history)
         except Exception as e:
             # Keep the session alive even if one turn fails
-            logger.exception(f"Error durante la ejecución del grafo: {e}")
-            print("Chatbot: An internal error prevented me from answering.")
+            logger.exception(f"Error during graph execution: {e}")
+            print("\nChatbot: An internal error prevented me from answering.\n")
+
+    # Ensure any buffered spans are sent before exit
+    if langfuse_client:
+        try:
+            langfuse_client.flush()
+            logger.info("LangFuse traces flushed.")
+        except Exception as e:
+            logger.warning(f"LangFuse flush warning: {e}")
 
 
 if __name__ == "__main__":
-    # Startup sequence: logs, graph, tracing, interactive loop
+    # Startup sequence: kick off warm-up, then hand the terminal to the user
     logger.info("Application starting.")
-    graph, langfuse = initialize_application()
-    run_chat_loop(graph, langfuse)
+    run_chat_loop(start_warmup())